@@ -37,6 +37,26 @@ def expand_parents(win):
     win._view.scene().expand_parents()
 
 
+def show_more_children(win):
+    win._view.scene().show_more_children()
+
+
+def show_more_parents(win):
+    win._view.scene().show_more_parents()
+
+
+def refresh_entries(win):
+    win._view.scene().refresh_entries()
+
+
+def cancel_refresh(win):
+    win._view.scene().cancel_refresh()
+
+
+def show_metrics(win):
+    win._view.scene().show_metrics()
+
+
 def go_left(win):
     win._view.scene().go_in_direction("l")
 
@@ -53,6 +73,22 @@ def go_down(win):
     win._view.scene().go_in_direction("d")
 
 
+def go_nearest_left(win):
+    win._view.scene().go_in_direction("l", geometric=True)
+
+
+def go_nearest_right(win):
+    win._view.scene().go_in_direction("r", geometric=True)
+
+
+def go_nearest_up(win):
+    win._view.scene().go_in_direction("u", geometric=True)
+
+
+def go_nearest_down(win):
+    win._view.scene().go_in_direction("d", geometric=True)
+
+
 def select_next(win):
     win._view.scene().select_next()
 
@@ -0,0 +1,229 @@
+from typing import Callable, Optional, Iterable
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+
+from .util import Pathlike
+from .replay import ReplayClient
+from .ratelimit import AdaptiveLimiter
+from .synthetic import generate_corpus
+from .ss import S2, PaperFields
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+
+
+def _measure(func: Callable, args: Iterable) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for arg in args:
+        op_start = time.perf_counter()
+        func(arg)
+        latencies.append(time.perf_counter() - op_start)
+    total = time.perf_counter() - start
+    latencies.sort()
+    return {"ops": len(latencies),
+            "seconds": total,
+            "ops_per_sec": len(latencies) / total if total else 0.0,
+            "p50": _percentile(latencies, 50),
+            "p99": _percentile(latencies, 99)}
+
+
+def corpus_dir(work_dir: Pathlike, size: int, seed: int) -> Path:
+    """Generate the synthetic corpus of :code:`size` papers if it doesn't exist
+
+    Corpora are kept in :code:`work_dir` and reused across runs.
+
+    Args:
+        work_dir: The working directory
+        size: Number of papers
+        seed: Seed of the corpus
+
+    """
+    path = Path(work_dir).joinpath(f"corpus-{size}-{seed}")
+    if not path.joinpath("done").exists():
+        generate_corpus(path, size, seed)
+        path.joinpath("done").touch()
+    return path
+
+
+def _s2(client: ReplayClient, data_dir: Pathlike) -> S2:
+    limiter = AdaptiveLimiter(rate=10 ** 6, max_rate=10 ** 6, min_rate=10 ** 6,
+                              max_concurrency=64)
+    return S2(client, data_dir, PaperFields(), rate_limiter=limiter, fetch_retries=0)
+
+
+def _sample(client: ReplayClient, num_ops: int, seed: int) -> list[str]:
+    paper_ids = client.all_papers
+    return random.Random(seed).sample(paper_ids, min(num_ops, len(paper_ids)))
+
+
+def bench_get_paper_data(corpus: Path, data_dir: Path, num_ops: int, seed: int) -> dict:
+    client = ReplayClient(corpus.joinpath("replay"))
+    s2 = _s2(client, data_dir)
+    paper_ids = _sample(client, num_ops, seed)
+    return {"cold": _measure(s2.get_paper_data, paper_ids),
+            "warm": _measure(s2.get_paper_data, paper_ids)}
+
+
+def bench_to_cached_data(corpus: Path, data_dir: Path, num_ops: int, seed: int) -> dict:
+    client = ReplayClient(corpus.joinpath("replay"))
+    s2 = _s2(client, data_dir)
+    data = [client.paper_data(x) for x in _sample(client, num_ops, seed)]
+    return {"": _measure(s2.to_cached_data, data)}
+
+
+def bench_format_entry(corpus: Path, data_dir: Path, num_ops: int, seed: int) -> dict:
+    client = ReplayClient(corpus.joinpath("replay"))
+    s2 = _s2(client, data_dir)
+    entries = [s2.to_light_data(s2.to_cached_data(client.paper_data(x)))
+               for x in _sample(client, num_ops, seed)]
+    return {"": _measure(s2.format_entry, entries)}
+
+
+def bench_load_cache(corpus: Path, data_dir: Path, num_ops: int, seed: int) -> dict:
+    """Import the JSON cache and build the cache from the replay client
+
+    Each is a single operation and :code:`ops_per_sec` is in papers per second.
+
+    """
+    client = ReplayClient(corpus.joinpath("replay"))
+    shutil.copy(corpus.joinpath("cache"), data_dir.joinpath("cache"))
+    s2 = _s2(client, data_dir)
+    results = {"import_json": _measure(lambda _: s2.load_or_build_citation_cache(), [None])}
+    build_dir = data_dir.joinpath("build")
+    s2 = _s2(client, build_dir)
+    results["build"] = _measure(lambda _: s2.load_or_build_citation_cache(), [None])
+    for result in results.values():
+        result["ops_per_sec"] = len(client) / result["seconds"]
+    return results
+
+
+benchmarks: dict[str, Callable[[Path, Path, int, int], dict]] = {
+    "get_paper_data": bench_get_paper_data,
+    "to_cached_data": bench_to_cached_data,
+    "format_entry": bench_format_entry,
+    "load_or_build_citation_cache": bench_load_cache,
+}
+
+
+def run_benchmark(name: str, corpus: Pathlike, work_dir: Pathlike,
+                  num_ops: int, seed: int) -> dict:
+    """Run benchmark :code:`name` on :code:`corpus` in a fresh data directory
+
+    Returns the results of each case with the peak RSS of the process.
+
+    """
+    data_dir = Path(tempfile.mkdtemp(dir=work_dir))
+    try:
+        results = benchmarks[name](Path(corpus), data_dir, num_ops, seed)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    peak_rss = _peak_rss_mb()
+    for result in results.values():
+        result["peak_rss_mb"] = peak_rss
+    return results
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(work_dir: Pathlike, sizes: list[int], names: Optional[list[str]] = None,
+                   num_ops: int = 1000, seed: int = 0, isolate: bool = True) -> dict:
+    """Run the benchmarks of the :class:`S2` data layer on synthetic corpora
+
+    Each benchmark runs on corpora of each of the :code:`sizes` with a
+    :class:`ReplayClient` without injected latency. With :code:`isolate`,
+    each runs in a fresh process so that the peak RSS is its own.
+
+    Args:
+        work_dir: Directory for the corpora and the temporary caches
+        sizes: Numbers of papers in the corpora
+        names: Names of the benchmarks to run. Defaults to all
+        num_ops: Number of operations for the per paper benchmarks
+        seed: Seed of the corpora and of the sampled papers
+        isolate: Run each benchmark in a separate process
+
+    Returns a :code:`dict` with the results and the environment.
+
+    """
+    work_dir = Path(work_dir)
+    if not work_dir.exists():
+        work_dir.mkdir(parents=True)
+    results = []
+    for size in sizes:
+        corpus = corpus_dir(work_dir, size, seed)
+        for name in names or benchmarks:
+            if isolate:
+                with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                    cases = pool.submit(run_benchmark, name, corpus, work_dir,
+                                        num_ops, seed).result()
+            else:
+                cases = run_benchmark(name, corpus, work_dir, num_ops, seed)
+            for case, result in cases.items():
+                results.append({"benchmark": f"{name}:{case}" if case else name,
+                                "size": size, **result})
+                print(format_result(results[-1]), file=sys.stderr)
+    return {"commit": _commit(),
+            "time": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results}
+
+
+def format_result(result: dict) -> str:
+    return (f"{result['benchmark']:<40} {result['size']:>8} papers "
+            f"{result['ops_per_sec']:>12.1f} ops/s "
+            f"p50 {result['p50'] * 1000:>8.3f}ms p99 {result['p99'] * 1000:>8.3f}ms "
+            f"peak RSS {result['peak_rss_mb']:.0f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the S2 data layer")
+    parser.add_argument("--work-dir", type=str, default="benchmark-data",
+                        help="Directory for the generated corpora")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="Numbers of papers in the corpora")
+    parser.add_argument("--benchmarks", nargs="+", choices=[*benchmarks], default=None,
+                        help="Benchmarks to run. Defaults to all")
+    parser.add_argument("--num-ops", type=int, default=1000,
+                        help="Number of operations for the per paper benchmarks")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--no-isolate", action="store_true",
+                        help="Run the benchmarks in this process")
+    parser.add_argument("--output", "-o", type=str, default="",
+                        help="Write the results as JSON to this file")
+    args = parser.parse_args()
+    report = run_benchmarks(args.work_dir, args.sizes, args.benchmarks, args.num_ops,
+                            args.seed, not args.no_isolate)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+from typing import Optional, Iterable
+import os
+import mmap
+import threading
+from pathlib import Path
+
+from .util import Pathlike
+
+
+class BlobStore:
+    """An append-only store of text blobs read with :mod:`mmap` on demand.
+
+    The blobs are appended to :code:`name.bin` and their byte ranges to the
+    index file :code:`name.idx` one per line as :code:`key<TAB>offset<TAB>length`.
+    Only the index is read when the store is opened, so opening it doesn't
+    depend on the size of the blobs. A blob which is written again with
+    different text is appended and the index points to the latest one. If
+    the text hasn't changed, nothing is written.
+
+    Args:
+        path: Path of the store without the suffix
+
+
+    """
+
+    def __init__(self, path: Pathlike):
+        path = Path(path)
+        self._blob_file = path.with_suffix(".bin")
+        self._index_file = path.with_suffix(".idx")
+        self._lock = threading.RLock()
+        self._offsets: dict[str, tuple[int, int]] = {}
+        self._blobs = open(self._blob_file, "ab+")
+        self._index = open(self._index_file, "a+")
+        self._buf: Optional[mmap.mmap] = None
+        self._load_index()
+
+    def _load_index(self):
+        self._index.seek(0)
+        for line in self._index:
+            key, offset, length = line.rstrip("\n").split("\t")
+            self._offsets[key] = (int(offset), int(length))
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @property
+    def size(self) -> int:
+        """Size of the blob file in bytes"""
+        return os.path.getsize(self._blob_file)
+
+    def put(self, key: str, text: str):
+        self.put_many([(key, text)])
+
+    def _unchanged(self, key: str, data: bytes) -> bool:
+        offsets = self._offsets.get(key)
+        if offsets is None or offsets[1] != len(data):
+            return False
+        offset, length = offsets
+        return not length or self._mapped(offset + length)[offset:offset+length] == data
+
+    def put_many(self, items: Iterable[tuple[str, str]]):
+        """Append the blobs which have changed and their index entries
+
+        Args:
+            items: Iterable of :code:`(key, text)` tuples
+
+        """
+        with self._lock:
+            self._blobs.seek(0, os.SEEK_END)
+            entries = []
+            for key, text in items:
+                data = text.encode()
+                if self._unchanged(key, data):
+                    continue
+                offset = self._blobs.tell()
+                self._blobs.write(data)
+                entries.append((key, offset, len(data)))
+            if not entries:
+                return
+            self._blobs.flush()
+            self._index.writelines(f"{k}\t{o}\t{n}\n" for k, o, n in entries)
+            self._index.flush()
+            for key, offset, length in entries:
+                self._offsets[key] = (offset, length)
+
+    def _mapped(self, end: int) -> mmap.mmap:
+        if self._buf is None or len(self._buf) < end:
+            if self._buf is not None:
+                self._buf.close()
+            self._buf = mmap.mmap(self._blobs.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._buf
+
+    def get(self, key: str) -> Optional[str]:
+        """Read the blob for :code:`key` if it's in the store
+
+        Args:
+            key: The key
+
+        """
+        offsets = self._offsets.get(key)
+        if offsets is None:
+            return None
+        offset, length = offsets
+        if not length:
+            return ""
+        with self._lock:
+            return self._mapped(offset + length)[offset:offset+length].decode()
+
+    def close(self):
+        with self._lock:
+            if self._buf is not None:
+                self._buf.close()
+                self._buf = None
+            self._blobs.close()
+            self._index.close()
@@ -0,0 +1,157 @@
+from typing import Optional, Any, Hashable
+import sys
+import threading
+import dataclasses
+from collections import OrderedDict, Counter
+
+
+def estimate_size(obj: Any) -> int:
+    """Roughly estimate the memory used by :code:`obj` in bytes
+
+    Dataclasses, lists, tuples and dicts are measured one level deep along with
+    their items. This is not exact but is good enough to keep a budget.
+
+    Args:
+        obj: The object
+
+    """
+    if obj is None:
+        return 0
+    if dataclasses.is_dataclass(obj):
+        return sys.getsizeof(obj) + sum(estimate_size(getattr(obj, f.name))
+                                        for f in dataclasses.fields(obj))
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(sys.getsizeof(x) for x in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sys.getsizeof(k) + sys.getsizeof(v)
+                                        for k, v in obj.items())
+    return sys.getsizeof(obj)
+
+
+class PaperCache:
+    """A thread safe LRU cache with an optional entry and byte budget.
+
+    When either budget is exceeded the least recently used entries are
+    evicted. Pinned keys are never evicted, they still count towards the
+    budget though. They're kept apart from the LRU order so that eviction
+    doesn't have to skip over them, and a key is most recently used when it's
+    unpinned.
+
+    Args:
+        max_entries: Maximum number of entries to keep
+        max_bytes: Maximum estimated size of the values in bytes
+
+
+    """
+    _missing = object()
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._pinned_data: dict[Hashable, Any] = {}
+        self._sizes: dict[Hashable, int] = {}
+        self._pinned: Counter = Counter()
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data) + len(self._pinned_data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data or key in self._pinned_data
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key, self._missing)
+        if value is self._missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._sizes:
+                self._bytes -= self._sizes[key]
+            if key in self._pinned:
+                self._pinned_data[key] = value
+            else:
+                self._data[key] = value
+                self._data.move_to_end(key)
+            self._sizes[key] = size
+            self._bytes += size
+            self._evict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get the value for :code:`key` and mark it as recently used
+
+        Hits and misses are counted.
+
+        Args:
+            key: The key
+            default: Returned if the key is not in the cache
+
+        """
+        with self._lock:
+            if key in self._pinned_data:
+                self.hits += 1
+                return self._pinned_data[key]
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._sizes:
+                return default
+            self._bytes -= self._sizes.pop(key)
+            if key in self._pinned_data:
+                return self._pinned_data.pop(key)
+            return self._data.pop(key)
+
+    def pin(self, key: Hashable):
+        """Never evict :code:`key` until it's unpinned.
+
+        Pins are counted and a key pinned :code:`n` times must be unpinned
+        :code:`n` times.
+
+        Args:
+            key: The key
+
+        """
+        with self._lock:
+            self._pinned[key] += 1
+            if key in self._data:
+                self._pinned_data[key] = self._data.pop(key)
+
+    def unpin(self, key: Hashable):
+        with self._lock:
+            if self._pinned[key] > 1:
+                self._pinned[key] -= 1
+                return
+            self._pinned.pop(key, None)
+            if key in self._pinned_data:
+                self._data[key] = self._pinned_data.pop(key)
+            self._evict()
+
+    def _over_budget(self) -> bool:
+        return ((self._max_entries is not None and len(self) > self._max_entries) or
+                (self._max_bytes is not None and self._bytes > self._max_bytes))
+
+    def _evict(self):
+        while self._data and self._over_budget():
+            key, _ = self._data.popitem(last=False)
+            self._bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit, miss and eviction counts along with the current size"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "entries": len(self),
+                    "bytes": self._bytes, "pinned": len(self._pinned)}
@@ -0,0 +1,27 @@
+from typing import Optional
+
+from s2cache.semantic_scholar import SemanticScholar
+
+
+class Client(SemanticScholar):
+    """:class:`SemanticScholar` with the paper batch endpoint used by :class:`~citemap.ss.S2`
+
+    The endpoint is only implemented privately in :code:`s2cache`, so it's
+    exposed here as :meth:`paper_batch` which the other clients, e.g.,
+    :class:`~citemap.replay.ReplayClient`, implement as well.
+
+
+    """
+
+    def paper_batch(self, IDs: list[str], fields: list[str]) -> list[Optional[dict]] | dict:
+        """Fetch only :code:`fields` of :code:`IDs` in one request
+
+        Args:
+            IDs: SSIDs of the papers
+            fields: The fields to fetch
+
+        Returns a list with the details of each paper, :code:`None` for
+        papers which don't exist, or the :code:`dict` of the error response.
+
+        """
+        return self._paper_batch(IDs, fields)
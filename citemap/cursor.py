@@ -0,0 +1,74 @@
+from typing import Callable, Iterable, Iterator
+
+
+class NeighbourCursor:
+    """A cursor over the citations or references of a paper.
+
+    The neighbours are read a page at a time with :code:`fetch_page` which is
+    called with an offset and a limit, so that the whole list is never
+    materialized for papers with tens of thousands of citations. Neighbours
+    which were shown some other way, e.g., the top ranked ones, can be
+    passed to :meth:`skip` so that the pages continue past them.
+
+    Args:
+        fetch_page: Function which returns :code:`limit` interned paper IDs from :code:`offset`
+        page_size: Default number of neighbours in a page
+
+
+    """
+
+    def __init__(self, fetch_page: Callable[[int, int], list[int]], page_size: int = 5):
+        self._fetch_page = fetch_page
+        self.page_size = page_size
+        self.offset = 0
+        self.exhausted = False
+        self._skip: set[int] = set()
+
+    def skip(self, keys: Iterable[int]):
+        """Leave out :code:`keys` from the pages after the current offset"""
+        self._skip.update(keys)
+
+    def peek(self, n: int = 0) -> tuple[list[int], tuple[int, bool]]:
+        """Return the next :code:`n` neighbours without advancing the cursor
+
+        Used when the page may be dropped, e.g., by a fetch which is aborted.
+        The cursor is moved past the page with :meth:`advance`.
+
+        Args:
+            n: Number of neighbours. Defaults to :attr:`page_size`
+
+        Returns the page and the position of the cursor after it.
+
+        """
+        n = n or self.page_size
+        offset, exhausted = self.offset, self.exhausted
+        result: list[int] = []
+        while len(result) < n and not exhausted:
+            limit = n - len(result)
+            page = self._fetch_page(offset, limit)
+            offset += len(page)
+            if len(page) < limit:
+                exhausted = True
+            result.extend(x for x in page if x not in self._skip)
+        return result, (offset, exhausted)
+
+    def advance(self, position: tuple[int, bool]):
+        """Move the cursor to a :code:`position` returned by :meth:`peek`"""
+        self.offset, self.exhausted = position
+
+    def next_page(self, n: int = 0) -> list[int]:
+        """Return the next :code:`n` neighbours and advance the cursor
+
+        Args:
+            n: Number of neighbours. Defaults to :attr:`page_size`
+
+        An empty list is returned once the neighbours are exhausted.
+
+        """
+        page, position = self.peek(n)
+        self.advance(position)
+        return page
+
+    def __iter__(self) -> Iterator[int]:
+        while not self.exhausted:
+            yield from self.next_page()
@@ -0,0 +1,212 @@
+from typing import Optional, Iterable, Iterator
+import sys
+import gzip
+import json
+import argparse
+from pathlib import Path
+from itertools import repeat
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from .util import Pathlike
+from .store import PaperStore
+from .blobs import BlobStore
+
+
+def _read_lines(shard: Pathlike) -> Iterator[dict]:
+    shard = Path(shard)
+    f = gzip.open(shard, "rt") if shard.suffix == ".gz" else open(shard)
+    with f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _paper_id(record: dict) -> Optional[str]:
+    url = record.get("url")
+    return url.rstrip("/").rsplit("/", 1)[-1] if url else None
+
+
+def _to_record(record: dict, paper_id: str) -> dict:
+    return {"paperId": paper_id,
+            "title": record.get("title") or "",
+            "authors": [{"authorId": x.get("authorId"), "name": x.get("name")}
+                        for x in record.get("authors") or []],
+            "venue": record.get("venue") or "",
+            "year": record.get("year"),
+            "citationCount": record.get("citationcount") or 0,
+            "influentialCitationCount": record.get("influentialcitationcount") or 0}
+
+
+def _scan_papers(shard: Pathlike, paper_ids: frozenset[str], corpus_ids: frozenset[int],
+                 selected: frozenset[int]) -> tuple[dict[int, str], dict[int, dict]]:
+    """Scan a shard of the :code:`papers` dataset
+
+    Args:
+        shard: The shard file
+        paper_ids: Paper IDs whose corpus IDs are required
+        corpus_ids: Corpus IDs whose paper IDs are required
+        selected: Corpus IDs whose records are required
+
+    Returns a :code:`dict` of corpus ID to paper ID for the matching papers
+    and the records of the :code:`selected` papers.
+
+    """
+    ids = {}
+    records = {}
+    for record in _read_lines(shard):
+        corpus_id = record.get("corpusid")
+        paper_id = _paper_id(record)
+        if paper_id is None:
+            continue
+        if corpus_id in corpus_ids or paper_id in paper_ids:
+            ids[corpus_id] = paper_id
+        if corpus_id in selected:
+            records[corpus_id] = _to_record(record, paper_id)
+    return ids, records
+
+
+def _scan_citations(shard: Pathlike, frontier: frozenset[int],
+                    selected: frozenset[int]) -> tuple[set[int], list[tuple[int, int]]]:
+    """Scan a shard of the :code:`citations` dataset
+
+    Args:
+        shard: The shard file
+        frontier: Corpus IDs whose neighbours are required
+        selected: Corpus IDs whose edges are required
+
+    Returns the neighbours of the :code:`frontier` and the
+    :code:`(citing, cited)` edges of the :code:`selected` papers.
+
+    """
+    neighbours = set()
+    edges = []
+    for record in _read_lines(shard):
+        citing, cited = record.get("citingcorpusid"), record.get("citedcorpusid")
+        if citing is None or cited is None:
+            continue
+        if citing in frontier:
+            neighbours.add(cited)
+        if cited in frontier:
+            neighbours.add(citing)
+        if citing in selected or cited in selected:
+            edges.append((citing, cited))
+    return neighbours, edges
+
+
+def _scan_abstracts(shard: Pathlike, selected: frozenset[int]) -> dict[int, str]:
+    return {x["corpusid"]: x["abstract"] for x in _read_lines(shard)
+            if x.get("corpusid") in selected and x.get("abstract")}
+
+
+def import_dataset(data_dir: Pathlike, seeds: Iterable[str],
+                   papers: list[Pathlike], citations: list[Pathlike],
+                   abstracts: Optional[list[Pathlike]] = None, hops: int = 1,
+                   num_workers: Optional[int] = None, batch_size: int = 1000) -> int:
+    """Import papers from Semantic Scholar dataset shards into the cache in :code:`data_dir`.
+
+    The gzipped JSONL shards of the :code:`papers`, :code:`citations` and
+    optionally :code:`abstracts` datasets are streamed in a process pool,
+    one shard per task. Only the :code:`seeds` and the papers within
+    :code:`hops` citations or references of them are imported.
+
+    Shards are read line by line, so memory depends on the size of the
+    selected neighbourhood and not on the size of the dump. The papers are
+    written to the :class:`PaperStore` and :class:`BlobStore` which
+    :class:`~citemap.ss.S2` reads from and are skipped by
+    :meth:`~citemap.ss.S2.load_or_build_citation_cache`.
+
+    Args:
+        data_dir: The data directory of :class:`~citemap.ss.S2`
+        seeds: Paper IDs or :code:`CorpusId:<id>` of the seed papers
+        papers: Shards of the :code:`papers` dataset
+        citations: Shards of the :code:`citations` dataset
+        abstracts: Optional shards of the :code:`abstracts` dataset
+        hops: Size of the neighbourhood around the seeds
+        num_workers: Number of processes
+        batch_size: Number of papers to write in one transaction
+
+    Returns the number of papers imported.
+
+    """
+    data_dir = Path(data_dir)
+    if not data_dir.exists():
+        data_dir.mkdir(parents=True)
+    seeds = [*seeds]
+    seed_ids = frozenset(x for x in seeds if not x.startswith("CorpusId:"))
+    selected = {int(x.split(":", 1)[1]) for x in seeds if x.startswith("CorpusId:")}
+    with ProcessPoolExecutor(num_workers) as pool:
+        if seed_ids:
+            for ids, _ in pool.map(_scan_papers, papers, repeat(seed_ids),
+                                   repeat(frozenset()), repeat(frozenset())):
+                selected.update(ids.keys())
+        frontier = frozenset(selected)
+        for hop in range(hops):
+            found: set[int] = set()
+            for neighbours, _ in pool.map(_scan_citations, citations, repeat(frontier),
+                                          repeat(frozenset())):
+                found.update(neighbours)
+            frontier = frozenset(found - selected)
+            selected.update(frontier)
+            print(f"Hop {hop + 1}: {len(frontier)} new papers, {len(selected)} in total")
+            if not frontier:
+                break
+        _selected = frozenset(selected)
+        references: dict[int, list[int]] = defaultdict(list)
+        cited_by: dict[int, list[int]] = defaultdict(list)
+        for _, edges in pool.map(_scan_citations, citations, repeat(frozenset()),
+                                 repeat(_selected)):
+            for citing, cited in edges:
+                if citing in _selected:
+                    references[citing].append(cited)
+                if cited in _selected:
+                    cited_by[cited].append(citing)
+        needed = frozenset(selected.union(*references.values(), *cited_by.values()))
+        id_map: dict[int, str] = {}
+        records: dict[int, dict] = {}
+        for ids, shard_records in pool.map(_scan_papers, papers, repeat(frozenset()),
+                                           repeat(needed), repeat(_selected)):
+            id_map.update(ids)
+            records.update(shard_records)
+        abstract_texts: dict[int, str] = {}
+        for shard_abstracts in pool.map(_scan_abstracts, abstracts or [], repeat(_selected)):
+            abstract_texts.update(shard_abstracts)
+    store = PaperStore(data_dir.joinpath("cache.db"))
+    blobs = BlobStore(data_dir.joinpath("abstracts"))
+    batch = []
+    for corpus_id, record in records.items():
+        record["references"] = [id_map[x] for x in references[corpus_id] if x in id_map]
+        record["citations"] = [id_map[x] for x in cited_by[corpus_id] if x in id_map]
+        batch.append((record["paperId"], record))
+        if len(batch) == batch_size:
+            store.put_many(batch, fetched_at=0)
+            batch = []
+    store.put_many(batch, fetched_at=0)
+    blobs.put_many((id_map[k], v) for k, v in abstract_texts.items() if k in id_map)
+    store.set_meta("dataset_imported", "1")
+    store.close()
+    blobs.close()
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import Semantic Scholar dataset shards")
+    parser.add_argument("data_dir", type=str, help="The data directory of the cache")
+    parser.add_argument("--seeds", nargs="+", required=True,
+                        help="Paper IDs or CorpusId:<id> of the seed papers")
+    parser.add_argument("--papers", nargs="+", required=True,
+                        help="Shards of the papers dataset")
+    parser.add_argument("--citations", nargs="+", required=True,
+                        help="Shards of the citations dataset")
+    parser.add_argument("--abstracts", nargs="*", default=[],
+                        help="Shards of the abstracts dataset")
+    parser.add_argument("--hops", type=int, default=1, help="Neighbourhood size")
+    parser.add_argument("--num-workers", type=int, default=None, help="Number of processes")
+    args = parser.parse_args()
+    num_papers = import_dataset(args.data_dir, args.seeds, args.papers, args.citations,
+                                args.abstracts, args.hops, args.num_workers)
+    print(f"Imported {num_papers} papers", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
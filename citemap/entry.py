@@ -15,7 +15,7 @@ from PyQt5.QtWidgets import (QGraphicsItem, QGraphicsTextItem, QGraphicsPixmapIt
 
 from .models import xy
 from .shape import Ellipse, Rectangle, RoundedRectangle, Circle, Shapes, Shape
-from .ss import CachePaperData
+from .ss import PaperEntry
 
 
 @dataclass
@@ -33,7 +33,7 @@ class EntryState:
     expand: str = "e"
     color: str = "red"
     pdf: str = ""
-    paper_data: Optional[CachePaperData] = None
+    paper_data: Optional[PaperEntry] = None
     family: dict = field(default_factory=dict)
     connections: dict[str, list] = field(default_factory=dict)
     font_attribs: dict = field(default_factory=dict)
@@ -111,11 +111,11 @@ class Entry(QGraphicsTextItem):
         self.state.color = val
 
     @property
-    def paper_data(self) -> Optional[CachePaperData]:
+    def paper_data(self) -> Optional[PaperEntry]:
         return self.state.paper_data
 
     @paper_data.setter
-    def paper_data(self, val: CachePaperData):
+    def paper_data(self, val: PaperEntry):
         self.state.paper_data = val
 
     @property
@@ -340,6 +340,7 @@ class Entry(QGraphicsTextItem):
         elif name == "text":
             self.setPlainText(value)
             self.state.text = value
+            self._scene.update_entry_rect(self)
         else:
             setattr(self.state, name, value)
 
@@ -474,6 +475,9 @@ class Entry(QGraphicsTextItem):
         self.mupdf_lock = False
 
     def remove(self):
+        if self.paper_data:
+            self._scene.s2.unpin(self.paper_data.paperId)
+        self._scene.grid.remove(self.index)
         self._scene.removeItem(self.shape_item)
         self._scene.removeItem(self.icon)
         self._scene.removeItem(self)
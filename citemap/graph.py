@@ -0,0 +1,165 @@
+from typing import Optional, Iterable, Callable
+from pathlib import Path
+
+import numpy as np
+
+from .util import Pathlike
+
+
+class CitationGraph:
+    """A compact compressed sparse row (CSR) index of the citation graph.
+
+    Every paper ID seen either as a paper or as a reference or citation is
+    given an :code:`int32` node ID, which is its position in the sorted
+    :attr:`ids` array. The neighbours of node :code:`i` in either direction
+    are the slice :code:`targets[offsets[i]:offsets[i+1]]`.
+
+    The arrays are saved as :code:`.npy` files in a directory and are memory
+    mapped on :meth:`load`, so loading costs almost nothing and lookups are
+    :math:`O(\\log n)` for the ID and :math:`O(degree)` for the neighbours.
+
+    Args:
+        ids: Sorted array of paper IDs as bytes
+        has_data: Mask of nodes for which references and citations are known
+        ref_offsets: Offsets into :code:`ref_targets`
+        ref_targets: Node IDs of references
+        cite_offsets: Offsets into :code:`cite_targets`
+        cite_targets: Node IDs of citations
+
+    """
+    _arrays = ["ids", "has_data", "ref_offsets", "ref_targets",
+               "cite_offsets", "cite_targets"]
+
+    def __init__(self, ids: np.ndarray, has_data: np.ndarray,
+                 ref_offsets: np.ndarray, ref_targets: np.ndarray,
+                 cite_offsets: np.ndarray, cite_targets: np.ndarray):
+        self.ids = ids
+        self.has_data = has_data
+        self.ref_offsets = ref_offsets
+        self.ref_targets = ref_targets
+        self.cite_offsets = cite_offsets
+        self.cite_targets = cite_targets
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, paper_id: str) -> bool:
+        return self.node(paper_id) is not None
+
+    @staticmethod
+    def _csr(num_nodes: int, src: np.ndarray, dst: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(src, kind="stable")
+        offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_nodes), out=offsets[1:])
+        return offsets, dst[order].astype(np.int32)
+
+    @classmethod
+    def build(cls, papers: Callable[[], Iterable[tuple[str, list[str], list[str]]]])\
+            -> "CitationGraph":
+        """Build the index
+
+        The papers are streamed twice, once to collect the IDs and then to
+        fill the offsets and targets, so they're never all held in memory.
+
+        Args:
+            papers: Function which returns an iterable of
+                    :code:`(paper_id, references, citations)`
+
+        The order of references and citations for each paper is preserved.
+
+        """
+        all_ids: set[str] = set()
+        for paper_id, references, citations in papers():
+            all_ids.add(paper_id)
+            all_ids.update(references)
+            all_ids.update(citations)
+        ids = np.array(sorted(x.encode() for x in all_ids if x))
+        del all_ids
+        if not len(ids):
+            ids = np.array([], dtype="S40")
+
+        def nodes(paper_ids):
+            return np.searchsorted(ids, np.array([x.encode() for x in paper_ids if x],
+                                                 dtype=ids.dtype)).astype(np.int32)
+
+        has_data = np.zeros(len(ids), dtype=np.bool_)
+        ref_src, ref_dst, cite_src, cite_dst = [], [], [], []
+        for paper_id, references, citations in papers():
+            node = nodes([paper_id])[0]
+            has_data[node] = True
+            refs, cites = nodes(references), nodes(citations)
+            ref_src.append(np.full(len(refs), node, dtype=np.int32))
+            ref_dst.append(refs)
+            cite_src.append(np.full(len(cites), node, dtype=np.int32))
+            cite_dst.append(cites)
+
+        def concat(arrays):
+            return np.concatenate(arrays) if arrays else np.array([], dtype=np.int32)
+
+        ref_offsets, ref_targets = cls._csr(len(ids), concat(ref_src), concat(ref_dst))
+        cite_offsets, cite_targets = cls._csr(len(ids), concat(cite_src), concat(cite_dst))
+        return cls(ids, has_data, ref_offsets, ref_targets, cite_offsets, cite_targets)
+
+    def save(self, index_dir: Pathlike):
+        index_dir = Path(index_dir)
+        if not index_dir.exists():
+            index_dir.mkdir(parents=True)
+        for name in self._arrays:
+            np.save(index_dir.joinpath(f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, index_dir: Pathlike) -> "CitationGraph":
+        """Load a saved index with all the arrays memory mapped
+
+        Args:
+            index_dir: The directory where the index was saved
+
+        """
+        index_dir = Path(index_dir)
+        return cls(**{name: np.load(index_dir.joinpath(f"{name}.npy"), mmap_mode="r")
+                      for name in cls._arrays})
+
+    @classmethod
+    def exists(cls, index_dir: Pathlike) -> bool:
+        return all(Path(index_dir).joinpath(f"{name}.npy").exists() for name in cls._arrays)
+
+    def node(self, paper_id: str) -> Optional[int]:
+        """Return the node ID for :code:`paper_id` or :code:`None` if it's not in the graph
+
+        Args:
+            paper_id: The paper ID
+
+        """
+        key = paper_id.encode()
+        i = int(np.searchsorted(self.ids, key))
+        if i < len(self.ids) and self.ids[i] == key:
+            return i
+        return None
+
+    def paper_id(self, node: int) -> str:
+        return self.ids[node].decode()
+
+    def paper_ids(self, nodes: np.ndarray) -> list[str]:
+        return [x.decode() for x in self.ids[nodes]]
+
+    def reference_nodes(self, node: int) -> np.ndarray:
+        return self.ref_targets[self.ref_offsets[node]:self.ref_offsets[node + 1]]
+
+    def citation_nodes(self, node: int) -> np.ndarray:
+        return self.cite_targets[self.cite_offsets[node]:self.cite_offsets[node + 1]]
+
+    def family(self, paper_id: str) -> Optional[tuple[list[str], list[str]]]:
+        """Return the citations and references for :code:`paper_id`
+
+        Args:
+            paper_id: The paper ID
+
+        Returns :code:`None` if the paper is not in the index or it was only
+        seen as a neighbour of some other paper.
+
+        """
+        node = self.node(paper_id)
+        if node is None or not self.has_data[node]:
+            return None
+        return (self.paper_ids(self.citation_nodes(node)),
+                self.paper_ids(self.reference_nodes(node)))
@@ -0,0 +1,159 @@
+from typing import Optional, Iterable
+import threading
+
+from .store import PaperStore
+
+
+class PaperIds:
+    """A bidirectional map between Semantic Scholar paper IDs and dense ints.
+
+    The 40 character hex paper IDs are interned once and the :code:`int`
+    is used everywhere internally. The string is only needed when talking
+    to :class:`SemanticScholar`, the persistent store or for display.
+
+    With a :class:`PaperStore`, the ints are assigned by its :code:`ids`
+    table and persist across sessions, and at most :code:`max_entries` IDs
+    are kept in memory in two generations. When the young one is full, the
+    old one is dropped and IDs which are used again are moved back to the
+    young one, so the IDs in use stay in memory and the rest are read from
+    the store when they're needed. Without a store all the IDs are kept.
+
+    Interning is thread safe. Lookups of IDs in memory don't take the lock.
+
+    Args:
+        store: Optional :class:`PaperStore` to keep the IDs in
+        max_entries: Maximum number of IDs in memory with a :code:`store`
+
+
+    """
+
+    def __init__(self, store: Optional[PaperStore] = None, max_entries: Optional[int] = None):
+        self._store = store
+        self._max_young = max(1, max_entries // 2) if store is not None and max_entries\
+            else None
+        self._ids: dict[str, int] = {}
+        self._paper_ids: dict[int, str] = {}
+        self._old_ids: dict[str, int] = {}
+        self._old_paper_ids: dict[int, str] = {}
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of IDs in memory"""
+        return len(self._ids) + len(self._old_ids)
+
+    def __contains__(self, paper_id: str) -> bool:
+        return self.get(paper_id) is not None
+
+    def _add(self, paper_id: str, key: int):
+        self._ids[paper_id] = key
+        self._paper_ids[key] = paper_id
+        if self._max_young is not None and len(self._ids) >= self._max_young:
+            self._old_ids, self._old_paper_ids = self._ids, self._paper_ids
+            self._ids, self._paper_ids = {}, {}
+
+    def _intern_missing(self, paper_ids: list[str], create: bool = True) -> dict[str, int]:
+        result = {}
+        with self._lock:
+            remaining = []
+            for paper_id in dict.fromkeys(paper_ids):
+                key = self._ids.get(paper_id)
+                if key is None:
+                    key = self._old_ids.get(paper_id)
+                    if key is not None:
+                        self._add(paper_id, key)
+                if key is None:
+                    remaining.append(paper_id)
+                else:
+                    result[paper_id] = key
+            if self._store is not None:
+                found = self._store.intern_ids(remaining, create=create) if remaining else {}
+            else:
+                found = {}
+                if create:
+                    for paper_id in remaining:
+                        found[paper_id] = self._next_key
+                        self._next_key += 1
+            for paper_id, key in found.items():
+                self._add(paper_id, key)
+            result.update(found)
+        return result
+
+    def intern(self, paper_id: str) -> int:
+        """Return the :code:`int` for :code:`paper_id`, adding it if required
+
+        Args:
+            paper_id: The paper ID
+
+        """
+        key = self._ids.get(paper_id)
+        if key is None:
+            key = self._intern_missing([paper_id])[paper_id]
+        return key
+
+    def intern_many(self, paper_ids: Iterable[str]) -> list[int]:
+        """Like :meth:`intern` for many IDs with one query for those not in memory"""
+        paper_ids = [*paper_ids]
+        ids = self._ids
+        keys = [ids.get(x) for x in paper_ids]
+        if None in keys:
+            found = self._intern_missing([x for x, k in zip(paper_ids, keys) if k is None])
+            keys = [found[x] if k is None else k for x, k in zip(paper_ids, keys)]
+        return keys  # type: ignore
+
+    def get(self, paper_id: str) -> Optional[int]:
+        """Like :meth:`intern` but return :code:`None` instead of adding the ID
+
+        Args:
+            paper_id: The paper ID
+
+        """
+        key = self._ids.get(paper_id)
+        if key is None:
+            key = self._intern_missing([paper_id], create=False).get(paper_id)
+        return key
+
+    def _lookup_missing(self, keys: list[int]) -> dict[int, str]:
+        result = {}
+        with self._lock:
+            remaining = []
+            for key in dict.fromkeys(keys):
+                paper_id = self._paper_ids.get(key)
+                if paper_id is None:
+                    paper_id = self._old_paper_ids.get(key)
+                    if paper_id is not None:
+                        self._add(paper_id, key)
+                if paper_id is None:
+                    remaining.append(key)
+                else:
+                    result[key] = paper_id
+            if remaining and self._store is not None:
+                found = self._store.lookup_ids(remaining)
+                for key, paper_id in found.items():
+                    self._add(paper_id, key)
+                result.update(found)
+        missing = [x for x in keys if x not in result]
+        if missing:
+            raise KeyError(missing[0])
+        return result
+
+    def lookup(self, key: int) -> str:
+        """Return the paper ID for :code:`key`
+
+        Args:
+            key: The interned :code:`int`
+
+        """
+        paper_id = self._paper_ids.get(key)
+        if paper_id is None:
+            paper_id = self._lookup_missing([key])[key]
+        return paper_id
+
+    def lookup_many(self, keys: Iterable[int]) -> list[str]:
+        keys = [*keys]
+        paper_ids = self._paper_ids
+        result = [paper_ids.get(x) for x in keys]
+        if None in result:
+            found = self._lookup_missing([x for x, p in zip(keys, result) if p is None])
+            result = [found[x] if p is None else p for x, p in zip(keys, result)]
+        return result  # type: ignore
@@ -0,0 +1,177 @@
+from typing import Optional, Iterator, Any
+import re
+import codecs
+import json
+import mmap
+import threading
+from pathlib import Path
+
+from .util import Pathlike
+
+
+_whitespace = re.compile(r"[ \t\n\r]*")
+
+
+class JsonCache:
+    """Incremental reader for the JSON :code:`cache` file of earlier versions.
+
+    The file is a single JSON object of :code:`paperId` to paper data. Instead
+    of :func:`json.load` on the whole file, the file is decoded in chunks of
+    :code:`chunk_size` bytes and each record is parsed on its own, so memory
+    stays close to the size of the offsets. The byte range of each record is
+    kept and a record is parsed again only when it's requested with
+    :meth:`get` after the scan.
+
+    :meth:`scan` can run in a background thread while :meth:`get` is being
+    called. Records which haven't been scanned yet are reported as missing.
+    :meth:`items` on a file which hasn't been scanned scans it and yields the
+    records as they're parsed.
+
+    Args:
+        json_file: The JSON cache file
+        chunk_size: Number of bytes to decode at a time
+
+    """
+
+    def __init__(self, json_file: Pathlike, chunk_size: int = 2 ** 20):
+        self._json_file = Path(json_file)
+        self._file = open(self._json_file, "rb")
+        self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._offsets: dict[str, tuple[int, int]] = {}
+        self._scanned = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, paper_id: str) -> bool:
+        return paper_id in self._offsets
+
+    @property
+    def scanned(self) -> bool:
+        return self._scanned.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until :meth:`scan` has finished"""
+        return self._scanned.wait(timeout)
+
+    def _scan(self) -> Iterator[tuple[str, Any]]:
+        """Parse the records in order, yield them and record their byte ranges
+
+        The text is decoded a chunk at a time. A value which reaches the end
+        of the decoded text may be cut off, so it's parsed again after
+        decoding the next chunk. Character positions are converted to byte
+        offsets incrementally, which is free for ASCII text.
+
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        text = ""
+        read = 0                # bytes read from the file
+        base = 0                # byte offset of text[0]
+        synced = 0              # position in text whose byte offset is known
+        synced_bytes = 0
+
+        def byte_offset(pos: int) -> int:
+            nonlocal synced, synced_bytes
+            if text.isascii():
+                return base + pos
+            synced_bytes += len(text[synced:pos].encode())
+            synced = pos
+            return base + synced_bytes
+
+        def refill(pos: int) -> int:
+            nonlocal text, read, base, synced, synced_bytes
+            base = byte_offset(pos)
+            chunk = self._buf[read:read + self._chunk_size]
+            read += len(chunk)
+            text = text[pos:] + decoder.decode(chunk, final=not chunk)
+            synced = synced_bytes = 0
+            return 0
+
+        def at_eof() -> bool:
+            return read >= len(self._buf)
+
+        def decode(pos: int) -> tuple[Any, int, int]:
+            while True:
+                try:
+                    value, end = self._decoder.raw_decode(text, pos)
+                    if end < len(text) or at_eof():
+                        return value, pos, end
+                except json.JSONDecodeError:
+                    if at_eof():
+                        raise
+                pos = refill(pos)
+
+        def skip_whitespace(pos: int) -> int:
+            while True:
+                pos = _whitespace.match(text, pos).end()  # type: ignore
+                if pos < len(text) or at_eof():
+                    return pos
+                pos = refill(pos)
+
+        pos = skip_whitespace(refill(0))
+        if pos == len(text):
+            return
+        if text[pos] != "{":
+            raise ValueError(f"{self._json_file} is not a JSON object")
+        pos += 1
+        while True:
+            pos = skip_whitespace(pos)
+            char = text[pos:pos+1]
+            if char in {"}", ""}:
+                return
+            if char == ",":
+                pos += 1
+                continue
+            paper_id, _, pos = decode(pos)
+            pos = skip_whitespace(pos)
+            pos = skip_whitespace(pos + 1)  # skip the ":"
+            record, pos, end = decode(pos)
+            self._offsets[paper_id] = (byte_offset(pos), byte_offset(end))
+            pos = end
+            yield paper_id, record
+
+    def scan(self):
+        """Find the byte range of every record in the file"""
+        try:
+            for _ in self._scan():
+                pass
+        finally:
+            self._scanned.set()
+
+    def get(self, paper_id: str) -> Optional[dict]:
+        """Parse and return the record for :code:`paper_id`
+
+        Args:
+            paper_id: The paper ID
+
+        Returns :code:`None` if the record hasn't been scanned or is :code:`null`
+
+        """
+        offsets = self._offsets.get(paper_id)
+        if offsets is None:
+            return None
+        return json.loads(self._buf[offsets[0]:offsets[1]])
+
+    def items(self) -> Iterator[tuple[str, dict]]:
+        """Iterate over all the non-null records
+
+        If the file hasn't been scanned, the records are parsed only once
+        while it's being scanned.
+
+        """
+        if not self.scanned:
+            try:
+                yield from ((k, v) for k, v in self._scan() if v)
+            finally:
+                self._scanned.set()
+            return
+        for paper_id in [*self._offsets.keys()]:
+            record = self.get(paper_id)
+            if record:
+                yield paper_id, record
+
+    def close(self):
+        self._buf.close()
+        self._file.close()
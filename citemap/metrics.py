@@ -0,0 +1,123 @@
+from typing import Optional
+import time
+import bisect
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+
+# Bucket bounds in seconds from 10us to about 100s, four per decade
+_bounds = [10 ** (x / 4) for x in range(-20, 9)]
+
+
+class Histogram:
+    """A latency histogram with fixed logarithmic buckets.
+
+    Percentiles are estimated as the upper bound of the bucket in which they
+    fall, so they're accurate to within a bucket.
+
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(_bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(_bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """Estimate the :code:`q` th percentile
+
+        Args:
+            q: The percentile between 0 and 100
+
+        """
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(_bounds[i], self.max) if i < len(_bounds) else self.max
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        return {"count": self.count,
+                "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.percentile(50), "p99": self.percentile(99),
+                "max": self.max}
+
+
+class Metrics:
+    """Thread safe counters and latency histograms of named operations.
+
+    Use :meth:`timer` or :meth:`observe` to record latencies and :meth:`incr`
+    to count events. :meth:`snapshot` returns all of them as a :code:`dict`.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: dict[str, Histogram] = {}
+        self._counters: Counter = Counter()
+        self._started = time.time()
+
+    def observe(self, name: str, seconds: float):
+        """Record a latency of :code:`seconds` for operation :code:`name`"""
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram()
+            self._histograms[name].observe(seconds)
+
+    def incr(self, name: str, value: int = 1):
+        """Increment the counter :code:`name` by :code:`value`"""
+        with self._lock:
+            self._counters[name] += value
+
+    @contextmanager
+    def timer(self, name: str):
+        """Record the time taken by the block as a latency of :code:`name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def counter(self, name: str) -> int:
+        return self._counters[name]
+
+    def latency(self, name: str) -> Optional[dict[str, float]]:
+        """Return the summary of the latencies of :code:`name` if there are any"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            return histogram.summary() if histogram else None
+
+    def snapshot(self) -> dict:
+        """Return the counters and the latency summaries in seconds"""
+        with self._lock:
+            return {"uptime": time.time() - self._started,
+                    "counters": dict(self._counters),
+                    "latency": {k: v.summary() for k, v in self._histograms.items()}}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._started = time.time()
+
+    def format(self) -> str:
+        """Format a one line summary, e.g., for a status bar"""
+        snapshot = self.snapshot()
+        counters = snapshot["counters"]
+        parts = [f"hits {counters.get('hits', 0)}", f"misses {counters.get('misses', 0)}",
+                 f"errors {counters.get('errors', 0)}"]
+        for name, summary in snapshot["latency"].items():
+            parts.append(f"{name} p50 {summary['p50'] * 1000:.1f}ms "
+                         f"p99 {summary['p99'] * 1000:.1f}ms")
+        return ", ".join(parts)
@@ -0,0 +1,90 @@
+from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from . import ss
+from .scheduler import Priority, CancelToken
+
+
+class Prefetcher:
+    """Warm the :class:`ss.S2` cache with the neighbours of the selected paper.
+
+    When an entry is selected, the top :code:`per_hop` references and
+    citations of the paper, as ranked by :meth:`ss.S2.top_neighbours`, are
+    fetched in the background, and then theirs up to :code:`depth` hops. At
+    most :code:`max_requests` papers which are not already in the cache are
+    fetched for one selection.
+
+    The fetches are queued with :code:`prefetch` priority on the
+    :attr:`ss.S2.scheduler`. A new selection or :meth:`cancel` drops the
+    queued fetches of the current prefetch and stops it.
+
+    Args:
+        s2: The :class:`ss.S2` instance
+        max_requests: Maximum uncached papers to fetch for one selection
+        per_hop: Number of references and citations to follow for each paper
+        depth: Number of hops from the selected paper
+
+    """
+
+    def __init__(self, s2: ss.S2, max_requests: int = 20, per_hop: int = 5, depth: int = 2):
+        self._s2 = s2
+        self.max_requests = max_requests
+        self.per_hop = per_hop
+        self.depth = depth
+        self._generation = 0
+        self._token = CancelToken()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self.fetched = 0
+
+    def _is_stale(self, generation: int) -> bool:
+        return generation != self._generation
+
+    def cancel(self):
+        """Cancel the current prefetch"""
+        with self._lock:
+            self._generation += 1
+            self._s2.scheduler.cancel(self._token)
+            self._token = CancelToken()
+
+    def prefetch(self, paper_id: str | int) -> Optional[Future]:
+        """Start prefetching the neighbourhood of :code:`paper_id`
+
+        Any earlier prefetch is cancelled.
+
+        Args:
+            paper_id: The paper ID
+
+        """
+        if not self.max_requests:
+            return None
+        self.cancel()
+        with self._lock:
+            generation, token = self._generation, self._token
+        return self._executor.submit(self._run, paper_id, generation, token)
+
+    def _run(self, paper_id: str | int, generation: int, token: CancelToken):
+        budget = self.max_requests
+        frontier = [self._s2.ids.intern(paper_id) if isinstance(paper_id, str) else paper_id]
+        seen = set(frontier)
+        for _ in range(self.depth):
+            next_frontier = []
+            for data in self._s2.get_papers_data(frontier, Priority.prefetch, token):
+                if data is None:
+                    continue
+                key = self._s2.ids.intern(data.paperId)
+                neighbours = [x for kind in ("references", "citations")
+                              for x in self._s2.top_neighbours(key, kind)[:self.per_hop]
+                              if x not in seen]
+                seen.update(neighbours)
+                next_frontier.extend(neighbours)
+            uncached = [x for x in next_frontier if not self._s2.is_cached(x)]
+            to_fetch = uncached[:budget]
+            if self._is_stale(generation):
+                return
+            if to_fetch:
+                self._s2.get_papers_data(to_fetch, Priority.prefetch, token)
+                budget -= len(to_fetch)
+                self.fetched += len(to_fetch)
+            frontier = [x for x in next_frontier if self._s2.is_cached(x)]
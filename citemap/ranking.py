@@ -0,0 +1,162 @@
+from typing import Optional, Iterable
+import heapq
+import threading
+
+
+class TopNeighbours:
+    """The top :code:`k` citations and references of papers by a score.
+
+    For each paper and kind of neighbour a min-heap of at most :code:`k`
+    :code:`(score, key)` pairs is kept. A heap is built with partial
+    selection over the neighbours of a paper and is then updated
+    incrementally with :meth:`offer` as the scores of more papers become
+    known, without looking at the other neighbours again.
+
+    Scores of papers are collected with :meth:`set_scores`, usually from the
+    neighbour details in the responses of the client, so that the
+    neighbours don't have to be fetched to rank them.
+
+    With :code:`max_entries`, at most about that many scores and as many
+    heaps are kept, in two generations like :class:`~citemap.interner.PaperIds`.
+    Heaps which are dropped are not in the index any more and have to be set
+    again, e.g., from the store, and dropped scores are :code:`0`.
+
+    Args:
+        k: Number of neighbours to keep for each paper
+        max_entries: Maximum number of scores and of heaps to keep
+
+
+    """
+
+    def __init__(self, k: int = 5, max_entries: Optional[int] = None):
+        self.k = k
+        self._max_young = max(1, max_entries // 2) if max_entries else None
+        self._scores: dict[int, int] = {}
+        self._old_scores: dict[int, int] = {}
+        self._heaps: dict[tuple[int, str], list[tuple[int, int]]] = {}
+        self._old_heaps: dict[tuple[int, str], list[tuple[int, int]]] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, item: tuple[int, str]) -> bool:
+        return item in self._heaps or item in self._old_heaps
+
+    def __len__(self) -> int:
+        """Number of heaps in memory"""
+        return len(self._heaps) + len(self._old_heaps)
+
+    @property
+    def num_scores(self) -> int:
+        return len(self._scores) + len(self._old_scores)
+
+    def score(self, key: int) -> int:
+        score = self._scores.get(key)
+        return self._old_scores.get(key, 0) if score is None else score
+
+    def _rotate_scores(self):
+        if self._max_young is not None and len(self._scores) >= self._max_young:
+            self._old_scores, self._scores = self._scores, {}
+
+    def _get_heap(self, item: tuple[int, str]) -> Optional[list[tuple[int, int]]]:
+        heap = self._heaps.get(item)
+        if heap is None:
+            heap = self._old_heaps.pop(item, None)
+            if heap is not None:
+                self._set_heap(item, heap)
+        return heap
+
+    def _set_heap(self, item: tuple[int, str], heap: list[tuple[int, int]]):
+        self._heaps[item] = heap
+        self._old_heaps.pop(item, None)
+        if self._max_young is not None and len(self._heaps) >= self._max_young:
+            self._old_heaps, self._heaps = self._heaps, {}
+
+    def set_scores(self, scores: Iterable[tuple[int, Optional[int]]]):
+        """Record the scores of papers. Scores which are :code:`None` are ignored
+
+        Args:
+            scores: Iterable of :code:`(key, score)`
+
+        """
+        with self._lock:
+            for k, v in scores:
+                if v is not None:
+                    self._scores[k] = v
+                    self._rotate_scores()
+
+    def build(self, key: int, kind: str, neighbours: Iterable[int]) -> list[tuple[int, int]]:
+        """Select the top :code:`k` of :code:`neighbours` by their known scores
+
+        Args:
+            key: The paper
+            kind: :code:`citations` or :code:`references`
+            neighbours: All the neighbours of the paper of that kind
+
+        Returns the heap.
+
+        """
+        with self._lock:
+            heap = heapq.nlargest(self.k, ((self.score(x), x)
+                                           for x in dict.fromkeys(neighbours)))
+            heapq.heapify(heap)
+            self._set_heap((key, kind), heap)
+            return [*heap]
+
+    def set(self, key: int, kind: str, scored: list[tuple[int, int]]):
+        """Set a heap which was built earlier
+
+        Args:
+            key: The paper
+            kind: :code:`citations` or :code:`references`
+            scored: List of :code:`(score, key)` pairs
+
+        """
+        heap = [*scored]
+        heapq.heapify(heap)
+        with self._lock:
+            self._set_heap((key, kind), heap)
+
+    def offer(self, key: int, kind: str, neighbour: int, score: int) -> bool:
+        """Offer :code:`neighbour` with :code:`score` to the heap of :code:`key`
+
+        Args:
+            key: The paper
+            kind: :code:`citations` or :code:`references`
+            neighbour: The neighbour
+            score: The score of the neighbour
+
+        Returns :code:`True` if the heap changed. Nothing is done if there's
+        no heap for :code:`key`. If the score of a neighbour in the heap goes
+        down, neighbours which were dropped earlier only come back when the
+        heap is built again.
+
+        """
+        with self._lock:
+            heap = self._get_heap((key, kind))
+            if heap is None:
+                return False
+            for i, (old_score, x) in enumerate(heap):
+                if x == neighbour:
+                    if old_score == score:
+                        return False
+                    heap[i] = (score, neighbour)
+                    heapq.heapify(heap)
+                    return True
+            if len(heap) < self.k:
+                heapq.heappush(heap, (score, neighbour))
+                return True
+            if (score, neighbour) > heap[0]:
+                heapq.heapreplace(heap, (score, neighbour))
+                return True
+            return False
+
+    def top(self, key: int, kind: str) -> Optional[list[tuple[int, int]]]:
+        """Return the :code:`(score, key)` pairs in the heap of :code:`key` from the highest
+
+        Args:
+            key: The paper
+            kind: :code:`citations` or :code:`references`
+
+        """
+        with self._lock:
+            heap = self._get_heap((key, kind))
+            return None if heap is None else sorted(heap, reverse=True)
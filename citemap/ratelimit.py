@@ -0,0 +1,146 @@
+from typing import Optional
+import time
+import threading
+from contextlib import contextmanager
+
+
+class AdaptiveLimiter:
+    """A token bucket rate limiter with AIMD concurrency control.
+
+    Requests wait in :meth:`acquire` until a token is available in the bucket
+    and fewer than :attr:`concurrency` requests are running. The result of
+    each request is reported with :meth:`release`:
+
+    - A healthy response increases the rate additively by about
+      :code:`increase` requests/s every second and the concurrency by one
+      for each window of :attr:`concurrency` healthy responses.
+    - A throttled response (e.g., :code:`429` or :code:`5xx`) multiplies both
+      by :code:`decrease`. Responses to requests which started before the last
+      backoff don't back off again, so a burst of throttled responses only
+      backs off once.
+
+    Args:
+        rate: Initial requests per second
+        max_rate: Maximum requests per second
+        min_rate: Minimum requests per second
+        max_concurrency: Maximum concurrent requests
+        burst: Size of the token bucket. Defaults to :code:`max_concurrency`
+        increase: Additive increase in requests/s for each second of healthy responses
+        decrease: Multiplicative decrease on a throttled response
+
+
+    """
+
+    def __init__(self, rate: float = 10.0, max_rate: float = 100.0, min_rate: float = 0.2,
+                 max_concurrency: int = 8, burst: Optional[int] = None,
+                 increase: float = 1.0, decrease: float = 0.5):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.max_concurrency = max_concurrency
+        self.increase = increase
+        self.decrease = decrease
+        self._rate = max(min_rate, min(rate, max_rate))
+        self._concurrency = float(max_concurrency)
+        self._burst = burst or max_concurrency
+        self._tokens = float(self._burst)
+        self._updated = time.monotonic()
+        self._last_backoff = 0.0
+        self._running = 0
+        self._cond = threading.Condition()
+        self.throttled = 0
+        self.succeeded = 0
+
+    @property
+    def rate(self) -> float:
+        """Current allowed requests per second"""
+        return self._rate
+
+    @property
+    def concurrency(self) -> int:
+        """Current allowed concurrent requests"""
+        return max(1, int(self._concurrency))
+
+    def _refill(self, now: float):
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """Wait for a token and a free slot
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns the time at which the request was admitted which should be
+        passed to :meth:`release`. Raises :class:`TimeoutError` on timeout.
+
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1 and self._running < self.concurrency:
+                    self._tokens -= 1
+                    self._running += 1
+                    return now
+                if self._running >= self.concurrency:
+                    wait = None
+                else:
+                    wait = (1 - self._tokens) / self._rate
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for the rate limiter")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def release(self, started: float, throttled: bool = False):
+        """Report the result of a request admitted at :code:`started`
+
+        Args:
+            started: The value returned by :meth:`acquire`
+            throttled: Whether the server throttled or failed the request
+
+        """
+        with self._cond:
+            self._running -= 1
+            if throttled:
+                self.throttled += 1
+                if started >= self._last_backoff:
+                    self._last_backoff = time.monotonic()
+                    self._refill(self._last_backoff)
+                    self._rate = max(self.min_rate, self._rate * self.decrease)
+                    self._concurrency = max(1.0, self._concurrency * self.decrease)
+                    self._tokens = min(self._tokens, 0.0)
+            else:
+                self.succeeded += 1
+                self._rate = min(self.max_rate, self._rate + self.increase / self._rate)
+                self._concurrency = min(float(self.max_concurrency),
+                                        self._concurrency + 1 / self._concurrency)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Context manager around :meth:`acquire` and :meth:`release`
+
+        The yielded :code:`dict` has a :code:`throttled` key which should be set
+        to :code:`True` if the request was throttled. An exception raised in the
+        block counts as throttled.
+
+        """
+        started = self.acquire()
+        result = {"throttled": False}
+        try:
+            yield result
+        except Exception:
+            result["throttled"] = True
+            raise
+        finally:
+            self.release(started, result["throttled"])
+
+    def stats(self) -> dict[str, float]:
+        """Return the current rate and concurrency with the response counts"""
+        with self._cond:
+            return {"rate": self._rate, "concurrency": self.concurrency,
+                    "running": self._running, "succeeded": self.succeeded,
+                    "throttled": self.throttled}
@@ -0,0 +1,193 @@
+from typing import Optional
+import json
+import time
+import random
+import threading
+import dataclasses
+from pathlib import Path
+
+from s2cache.semantic_scholar import SemanticScholar
+from s2cache.models import PaperData, Error
+
+from .util import Pathlike
+
+
+class ReplayClient:
+    """A local stand-in for :class:`SemanticScholar` for reproducible benchmarks.
+
+    It implements the :meth:`paper_data`, :meth:`paper_batch`,
+    :meth:`citations` and :attr:`all_papers` surface used by
+    :class:`~citemap.ss.S2` and serves responses recorded earlier from
+    :code:`data_dir`. Latency and errors can be injected to simulate the
+    network.
+
+    Responses are kept in :code:`data_dir/papers.jsonl` one per line as
+    :code:`paperId<TAB>json`. Only the offsets are held in memory and the
+    line is read on each request.
+
+    If :code:`record_client` is given, papers which are not recorded are
+    fetched from it and appended to the recording.
+
+    Args:
+        data_dir: Directory with the recorded responses
+        latency: Seconds to sleep on each request
+        latency_jitter: Maximum random seconds added to :code:`latency`
+        error_rate: Fraction of requests which fail with a transient error
+        seed: Seed for the random number generator
+        record_client: Optional client to record missing responses from
+
+    """
+
+    def __init__(self, data_dir: Pathlike, latency: float = 0.0,
+                 latency_jitter: float = 0.0, error_rate: float = 0.0,
+                 seed: Optional[int] = None,
+                 record_client: Optional[SemanticScholar] = None):
+        self._data_dir = Path(data_dir)
+        if not self._data_dir.exists():
+            self._data_dir.mkdir(parents=True)
+        self._papers_file = self._data_dir.joinpath("papers.jsonl")
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._record_client = record_client
+        self._lock = threading.Lock()
+        self._offsets: dict[str, int] = {}
+        self.requests = 0
+        self.injected_errors = 0
+        self._load_offsets()
+
+    def _load_offsets(self):
+        if not self._papers_file.exists():
+            return
+        with open(self._papers_file, "rb") as f:
+            offset = 0
+            for line in f:
+                paper_id, _, _ = line.partition(b"\t")
+                self._offsets[paper_id.decode()] = offset
+                offset += len(line)
+
+    @property
+    def all_papers(self) -> list[str]:
+        return [*self._offsets.keys()]
+
+    def __contains__(self, paper_id: str) -> bool:
+        return paper_id in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def record(self, paper_id: str, data: PaperData | dict):
+        """Append the response for :code:`paper_id` to the recording
+
+        Args:
+            paper_id: The paper ID
+            data: :class:`PaperData` or its :code:`dict`
+
+        """
+        if not isinstance(data, dict):
+            data = data.asdict() if hasattr(data, "asdict") else dataclasses.asdict(data)
+        line = f"{paper_id}\t{json.dumps(data)}\n".encode()
+        with self._lock:
+            with open(self._papers_file, "ab") as f:
+                offset = f.tell()
+                f.write(line)
+            self._offsets[paper_id] = offset
+
+    def read(self, paper_id: str) -> Optional[dict]:
+        """Read the recorded response for :code:`paper_id` without any injected latency
+
+        Args:
+            paper_id: The paper ID
+
+        """
+        offset = self._offsets.get(paper_id)
+        if offset is None:
+            return None
+        with open(self._papers_file, "rb") as f:
+            f.seek(offset)
+            line = f.readline()
+        return json.loads(line.partition(b"\t")[2])
+
+    def _simulate_network(self) -> Optional[Error]:
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._rng.uniform(0, self.latency_jitter)
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.injected_errors += 1
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return Error(message="Injected error", error="429 Too Many Requests")
+        return None
+
+    def paper_data(self, ID: str, force: bool = False) -> Error | PaperData:
+        """Return the recorded :class:`PaperData` for :code:`ID`
+
+        Args:
+            ID: SSID of the paper
+            force: Ignored. Present for compatibility with :class:`SemanticScholar`
+
+        """
+        maybe_error = self._simulate_network()
+        if maybe_error:
+            return maybe_error
+        data = self.read(ID)
+        if data is None and self._record_client is not None:
+            maybe_data = self._record_client.paper_data(ID)
+            if isinstance(maybe_data, Error):
+                return maybe_data
+            self.record(ID, maybe_data)
+            return maybe_data
+        if data is None:
+            return Error(message=f"Paper {ID} not found")
+        return PaperData(**data)
+
+    def paper_batch(self, IDs: list[str], fields: list[str]) -> list[Optional[dict]] | dict:
+        """Return only :code:`fields` of the recorded details of :code:`IDs`
+
+        Like the paper batch endpoint, it's one request for all the IDs,
+        papers which aren't recorded are :code:`None` and an error is a
+        :code:`dict` with the message and the status code.
+
+        Args:
+            IDs: SSIDs of the papers
+            fields: The fields to return
+
+        """
+        maybe_error = self._simulate_network()
+        if maybe_error:
+            return {"message": "Too Many Requests", "code": "429"}
+        result = []
+        for ID in IDs:
+            data = self.read(ID)
+            if data is None and self._record_client is not None:
+                maybe_data = self._record_client.paper_data(ID)
+                if not isinstance(maybe_data, Error):
+                    self.record(ID, maybe_data)
+                    data = self.read(ID)
+            if data is None:
+                result.append(None)
+            else:
+                result.append({k: v for k, v in data["details"].items() if k in fields})
+        return result
+
+    def citations(self, ID: str, offset: int, limit: Optional[int]) -> Error | list[dict]:
+        """Return the recorded citing papers of :code:`ID` in a range
+
+        Args:
+            ID: SSID of the paper
+            offset: offset
+            limit: limit
+
+        """
+        maybe_error = self._simulate_network()
+        if maybe_error:
+            return maybe_error
+        data = self.read(ID)
+        if data is None:
+            return Error(message=f"Paper {ID} not found")
+        citations = data["citations"]["data"]
+        end = offset + limit if limit else len(citations)
+        return [x["citingPaper"] for x in citations[offset:end]]
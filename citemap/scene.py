@@ -1,11 +1,12 @@
-from typing import Optional
+from typing import Optional, Callable, Any
 import operator
 from functools import reduce, partial
 import warnings
 from dataclasses import dataclass
 from enum import IntEnum
+from concurrent.futures import ThreadPoolExecutor, CancelledError
 
-from PyQt5.QtCore import Qt, QRectF, QPointF
+from PyQt5.QtCore import Qt, QRectF, QPointF, pyqtSignal
 from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QGraphicsScene, QGraphicsItem
 
@@ -16,6 +17,10 @@ from .entry import Entry
 from .link import Arrow, Link
 from .shape import Shape, Shapes
 from .util import Pathlike, save_file, load_file
+from .prefetch import Prefetcher
+from .scheduler import CancelToken, Priority
+from .cursor import NeighbourCursor
+from .spatial import GridIndex
 from . import ss
 
 
@@ -45,18 +50,33 @@ class CiteMap(QGraphicsScene):
     so that a new mindmap can be placed on to it easily if required.
 
     """
+    # Results of interactive fetches as (token, apply, result)
+    _fetched = pyqtSignal(object, object, object)
 
-    def __init__(self, s2: ss.S2, filename: Optional[Pathlike] = None):
+    def __init__(self, s2: ss.S2, filename: Optional[Pathlike] = None,
+                 prefetch_budget: int = 20, prefetch_depth: int = 2,
+                 expand_page_size: int = 5):
         """Initialize the MindMap Scene
 
         Args:
             root_dir: Root directory for PDF files
             store_dir: Root directory to store the mindmap state
             filename: Filename to load
+            prefetch_budget: Maximum papers to prefetch when an entry is selected
+            prefetch_depth: Hops of references and citations to prefetch
+            expand_page_size: Number of parents or children added on each expansion
 
         """
         super().__init__()
         self._s2 = s2
+        self._prefetcher = Prefetcher(s2, max_requests=prefetch_budget, depth=prefetch_depth)
+        self._interaction_token = CancelToken()
+        self._interaction_executor = ThreadPoolExecutor(max_workers=1,
+                                                        thread_name_prefix="interaction")
+        self._fetched.connect(self._apply_fetched)
+        self._expand_page_size = expand_page_size
+        self._refresh_token = CancelToken()
+        self._cursors: dict[tuple[int, str], NeighbourCursor] = {}
         self.filename = filename
         self.default_insert_direction = 'u'
         self.direction_map = {"pos": {"horizontal": "r", "vertical": "d"},
@@ -90,6 +110,9 @@ class CiteMap(QGraphicsScene):
         self.transluscent = set()
         self.entries = {}
         self.links = {}
+        self._outgoing: dict[int, dict[int, Link]] = {}
+        self._incoming: dict[int, dict[int, Link]] = {}
+        self._grid = GridIndex()
         self.selections = []
         self.cur_index = 0
         self.arrows = []
@@ -97,7 +120,6 @@ class CiteMap(QGraphicsScene):
         self.node_positions = []
         self.dragging_items = []
         self.target_item = None
-        self._entry_data_cache: dict[str, str] = {}
         self._collapsed_entry_fields = ss.PaperFields()
         self._collapsed_entry_fields.abstract = False
         self._collapsed_entry_fields.citationCount = True
@@ -160,14 +182,48 @@ class CiteMap(QGraphicsScene):
         coord_a, coord_b = self.coord(a), self.coord(b)
         return (coord_a.x - coord_b.x) ** 2 + (coord_a.y - coord_b.y) ** 2
 
+    @property
+    def grid(self) -> GridIndex:
+        """Index of the bounding rectangles of the entries in scene coordinates"""
+        return self._grid
+
+    def update_entry_rect(self, entry: Entry):
+        """Update the rectangle of :code:`entry` in the :attr:`grid`
+
+        Called via :class:`Shape` and :class:`Entry` when the position or the
+        text of the entry changes.
+
+        Args:
+            entry: The entry
+
+        """
+        if self.entries.get(entry.index) is entry:
+            self._grid.insert(entry.index, entry.shape_item.sceneBoundingRect().getRect())
+
     @property
     def s2(self):
         return self._s2
 
     @s2.setter
     def s2(self, x):
+        self._prefetcher.cancel()
+        self._prefetcher = Prefetcher(x, max_requests=self._prefetcher.max_requests,
+                                      depth=self._prefetcher.depth)
         self._s2 = x
 
+    def entry_selected(self, entry: Entry):
+        """Called via :class:`Shape` when an entry is selected
+
+        Starts prefetching the neighbourhood of the paper so that expanding
+        it doesn't have to wait for the fetches.
+
+        Args:
+            entry: The selected entry
+
+        """
+        if entry.paper_data:
+            self._prefetcher.prefetch(entry.paper_data.paperId)
+
     def init_widgets(self, search_widget, status_bar):
         self.search_widget = search_widget
         self.search_widget.set_mmap(self)
@@ -189,10 +245,28 @@ class CiteMap(QGraphicsScene):
             self.setSceneRect(items_rect)
         self.update()
 
+    def outgoing_links(self, index: int) -> list[Link]:
+        """Links from the entry at :code:`index`"""
+        return [*self._outgoing.get(index, {}).values()]
+
+    def incoming_links(self, index: int) -> list[Link]:
+        """Links to the entry at :code:`index`"""
+        return [*self._incoming.get(index, {}).values()]
+
+    def incident_links(self, index: int) -> list[Link]:
+        """Links from or to the entry at :code:`index`"""
+        return [*self.outgoing_links(index), *self.incoming_links(index)]
+
     def links_zvalue(self, t, value=1):
-        for k in self.links.keys():
-            if t.index in k:
-                self.links[k].setZValue(value)
+        for link in self.incident_links(t.index):
+            link.setZValue(value)
+
+    def check_hide_links(self, indices: int | list[int]):
+        """Show or hide the links of the entries at :code:`indices` as the entries are"""
+        for index in [indices] if isinstance(indices, int) else indices:
+            hidden = self.entries[index].state.hidden
+            for link in self.incident_links(index):
+                link.setVisible(not hidden)
 
     def select_next(self):
         """Select next entry
@@ -233,79 +307,175 @@ class CiteMap(QGraphicsScene):
             gview.ensureVisible(e.shape_item)
 
     def fetch_paper_data(self, paper_id):
-        """Fetch the formatted entry text from the S2 client
+        """Fetch the full paper data from the S2 client
+
+        The data isn't kept in the scene. :attr:`s2` keeps recently used full
+        records in memory and reads the rest from its store.
 
         Args:
             paper_id: 
 
 
         """
-        entry_data = self._s2.get_paper_data(paper_id)
-        # import ipdb; ipdb.set_trace()
-        self._entry_data_cache[paper_id] = entry_data
+        return self._s2.get_paper_data(paper_id)
+
+    def _neighbour_cursor(self, entry: Entry, kind: str) -> NeighbourCursor:
+        key = (entry.index, kind)
+        if key not in self._cursors:
+            paper_id = entry.paper_data.paperId
+            if kind == "citations":
+                cursor = self.s2.citations_cursor(paper_id, self._expand_page_size)
+            else:
+                cursor = self.s2.references_cursor(paper_id, self._expand_page_size)
+            self._cursors[key] = cursor
+        return self._cursors[key]
 
-    def _ensure_paper_metadata(self, entry):
-        item = entry.text_item
-        if item.paper_data.paperId not in self._entry_data_cache:
-            self.fetch_paper_data(item.paper_data.paperId)
-        metadata = self._entry_data_cache[item.paper_data.paperId]
-        return metadata
+    def _fetch_in_background(self, fetch: Callable[[CancelToken], Any],
+                             apply: Callable[[Any], None]):
+        """Run :code:`fetch` off the UI thread and then :code:`apply` its result on it
 
-    def ensure_family(self, entry: Entry) -> tuple[Optional[dict], Optional[dict]]:
-        """Fetch entry data if it's not loaded
+        :code:`fetch` is called with the current interaction token. Results
+        of fetches which were started before an :meth:`abort` are dropped, so
+        any state of the scene should only be changed in :code:`apply`.
 
         Args:
-            entry: The entry
+            fetch: Function which fetches the data
+            apply: Function which updates the scene with the result of :code:`fetch`
+
+        """
+        token = self._interaction_token
+
+        def run():
+            try:
+                result = fetch(token)
+            except CancelledError:
+                return
+            except Exception as err:
+                print(f"Error while fetching: {err}")
+                return
+            self._fetched.emit(token, apply, result)
+
+        self._interaction_executor.submit(run)
+
+    def _apply_fetched(self, token: CancelToken, apply: Callable[[Any], None], result: Any):
+        if not token.cancelled:
+            apply(result)
+
+    def _fetch_step(self, token: CancelToken, func: Callable, *args) -> Any:
+        """Run one step of a background fetch with the scheduler
+
+        Raises :class:`CancelledError` if the interaction was aborted.
 
+        Args:
+            token: The interaction token
+            func: The function to run
+            args: Arguments to :code:`func`
 
         """
-        metadata = self._ensure_paper_metadata(entry)
-        if metadata:
-            # if "data" in metadata["citations"]:
-            #     citations = metadata["citations"]["data"]
-            # else:
-            #     citations = metadata["citations"]
-            # if "data" in metadata["references"]:
-            #     references = metadata["references"]["data"]
-            # else:
-            #     references = metadata["references"]
-            if isinstance(metadata.citations, dict):
-                citations = metadata.citations["data"]
-            else:
-                citations = metadata.citations
-            if isinstance(metadata.references, dict):
-                references = metadata.references["data"]
+        if token.cancelled:
+            raise CancelledError
+        return self.s2.scheduler.submit(func, *args, priority=Priority.interactive,
+                                        token=token).result()
+
+    def add_next_neighbours(self, entry: Entry, kind: str, n: int = 0,
+                            ranked: bool = False,
+                            done: Optional[Callable[[bool], None]] = None):
+        """Add the next :code:`n` citations or references of the entry
+
+        The neighbours are read with a :class:`NeighbourCursor` for each entry,
+        so only the page which is shown is loaded. With :code:`ranked`, the top
+        neighbours from :meth:`ss.S2.top_neighbours` are added instead if
+        there are any, and the cursor skips them in the later pages.
+
+        The neighbours are fetched in the background and added when they
+        arrive, unless the expansion is aborted with :meth:`abort`. The cursor
+        is only moved when they're added, so an aborted page is shown on the
+        next expansion.
+
+        Args:
+            entry: The entry
+            kind: :code:`citations` to add children and :code:`references` to add parents
+            n: Number of neighbours to add. Defaults to :code:`expand_page_size`
+            ranked: Add the top neighbours
+            done: Called after the neighbours are added with :code:`False`
+                  if there were no more neighbours
+
+        """
+        cursor = self._neighbour_cursor(entry, kind)
+        paper_id = entry.paper_data.paperId
+
+        def fetch(token: CancelToken) -> tuple[list[int], Optional[tuple[int, bool]], list]:
+            page = self._fetch_step(token, self.s2.top_neighbours, paper_id, kind)\
+                if ranked else []
+            position = None
+            if not page:
+                page, position = self._fetch_step(token, cursor.peek, n)
+            if token.cancelled:
+                raise CancelledError
+            return page, position, self.s2.get_papers_details(page, token=token)
+
+        def add(result: tuple[list[int], Optional[tuple[int, bool]], list]):
+            page, position, details = result
+            if position is None:
+                cursor.skip(page)
             else:
-                references = metadata.references
-            return citations, references
-        return None, None
+                cursor.advance(position)
+            if entry.index not in self.entries:
+                return
+            relatives = entry.family["children" if kind == "citations" else "parents"]
+            existing = {self.entries[x].paper_data.paperId for x in relatives
+                        if x in self.entries and self.entries[x].paper_data}
+            for ent in details:
+                if ent is None or ent.paperId in existing:
+                    continue
+                if kind == "citations":
+                    self.add_new_child(entry, ent, direction="d")
+                else:
+                    self.add_new_parent(entry, ent, direction="u")
+            if done:
+                done(bool(page))
+
+        self._fetch_in_background(fetch, add)
 
-    def ensure_parents(self, entry):
+    def ensure_parents(self, entry, done: Optional[Callable[[], None]] = None):
         """Make sure that the parents of the entry exist
 
         Args:
             entry: Entry
+            done: Called when the parents have been added
 
 
         """
-        citations, references = self.ensure_family(entry)
-        if references:
-            if not entry.family["parents"]:
-                for ent_id in references[:5]:
-                    ent = self.s2.get_paper_data(ent_id)
-                    self.add_new_parent(entry, ent, direction="u")
-        else:
-            warnings.warn("No references for entry. Need to fetch")
-
-    def ensure_children(self, entry):
-        citations, references = self.ensure_family(entry)
-        if citations:
-            if not entry.family["children"]:
-                for ent_id in citations[:5]:
-                    ent = self.s2.get_paper_data(ent_id)
-                    self.add_new_child(entry, ent, direction="d")
-        else:
-            warnings.warn("No citations for entry. Need to fetch")
+        def check(found: bool):
+            if not found:
+                warnings.warn("No references for entry. Need to fetch")
+            if done:
+                done()
+
+        if not entry.family["parents"]:
+            self.add_next_neighbours(entry, "references", ranked=True, done=check)
+        elif done:
+            done()
+
+    def ensure_children(self, entry, done: Optional[Callable[[], None]] = None):
+        def check(found: bool):
+            if not found:
+                warnings.warn("No citations for entry. Need to fetch")
+            if done:
+                done()
+
+        if not entry.family["children"]:
+            self.add_next_neighbours(entry, "citations", ranked=True, done=check)
+        elif done:
+            done()
+
+    def _select_relatives(self, entry: Entry, relation: str, direction: str):
+        if entry.family[relation]:
+            self.select_one(entry.family[relation])
+            self.toggle_nav_cycle(False)
+            self.toggle_nav_cycle(True, item_inds=entry.family[relation],
+                                  movement=self.inverse_orientmap[direction])
+        self.resize_and_update()
 
     def expand_children(self):
         """Expand children of an entry
@@ -316,13 +486,7 @@ class CiteMap(QGraphicsScene):
             return
 
         entry = selected[0]
-        self.ensure_children(entry)
-        if entry.family["children"]:
-            self.select_one(entry.family['children'])
-            self.toggle_nav_cycle(False)
-            self.toggle_nav_cycle(True, item_inds=entry.family['children'],
-                                  movement=self.inverse_orientmap["d"])
-        self.resize_and_update()
+        self.ensure_children(entry, lambda: self._select_relatives(entry, "children", "d"))
 
     def expand_parents(self):
         """Expand the parents of the entry.
@@ -332,13 +496,47 @@ class CiteMap(QGraphicsScene):
             return
 
         entry = selected[0]
-        self.ensure_parents(entry)
-        if entry.family["parents"]:
-            self.select_one(entry.family['parents'])
-            self.toggle_nav_cycle(False)
-            self.toggle_nav_cycle(True, item_inds=entry.family['parents'],
-                                  movement=self.inverse_orientmap["u"])
-        self.resize_and_update()
+        self.ensure_parents(entry, lambda: self._select_relatives(entry, "parents", "u"))
+
+    def show_more_children(self, n: int = 0):
+        """Add the next :code:`n` children of the selected entry
+
+        Args:
+            n: Number of children. Defaults to :code:`expand_page_size`
+
+        """
+        selected = self.get_selected()
+        if not len(selected) == 1:
+            return
+
+        entry = selected[0]
+
+        def done(found: bool):
+            if not found:
+                self.status_bar.showMessage("No more citations", 2000)
+            self._select_relatives(entry, "children", "d")
+
+        self.add_next_neighbours(entry, "citations", n, done=done)
+
+    def show_more_parents(self, n: int = 0):
+        """Add the next :code:`n` parents of the selected entry
+
+        Args:
+            n: Number of parents. Defaults to :code:`expand_page_size`
+
+        """
+        selected = self.get_selected()
+        if not len(selected) == 1:
+            return
+
+        entry = selected[0]
+
+        def done(found: bool):
+            if not found:
+                self.status_bar.showMessage("No more references", 2000)
+            self._select_relatives(entry, "parents", "u")
+
+        self.add_next_neighbours(entry, "references", n, done=done)
 
     def cycle_check(self, ind):
         if ind not in self.cycle_items:
@@ -387,18 +585,38 @@ class CiteMap(QGraphicsScene):
             self.cycle_index = 0
             self.cycle_items = []
 
-    def go_in_direction(self, direction):
+    def go_in_direction(self, direction, geometric=False):
+        """Select the entry next to the selected one in :code:`direction`
+
+        The first connection in :code:`direction` is selected. If there's
+        none, or with :code:`geometric`, the nearest visible entry in that
+        direction is found from the :attr:`grid`.
+
+        Args:
+            direction: One of :code:`l`, :code:`r`, :code:`u` or :code:`d`
+            geometric: Ignore the connections
+
+        """
         if direction in {"l", "u", "d"}:
             select_func = min
         else:
             select_func = max
         selected = self.get_selected()
+        if not selected:
+            return
         if len(selected) == 1:
             entry = self.get_entry(selected[0])
         else:
             entry = self.get_entry(select_func(x.index for x in selected))
-        if entry.connections[direction]:
+        if entry.connections[direction] and not geometric:
             self.select_one(entry.connections[direction][0])
+            return
+        x, y, width, height = entry.shape_item.sceneBoundingRect().getRect()
+        nearest = self._grid.nearest(x + width / 2, y + height / 2, direction,
+                                     exclude=[entry.index],
+                                     accept=lambda k: self.entries[k].isVisible())
+        if nearest is not None:
+            self.select_one(nearest)
 
     def cycle_between(self, direction, movement=None, cycle=False):
         print(self.movement, movement)
@@ -509,10 +727,10 @@ class CiteMap(QGraphicsScene):
         links_data = data["links"]
         for link in links_data:
             self.add_link(link[0][0], link[0][1], link[1])
-        for t in self.entries.keys():
-            for lk in self.links.keys():
-                if t in lk and self.entries[t].hidden:
-                    self.links[lk].setVisible(False)
+        for t, entry in self.entries.items():
+            if entry.state.hidden:
+                for link in self.incident_links(t):
+                    link.setVisible(False)
     # END: status_bar
 
     def update_pos(self):
@@ -523,11 +741,14 @@ class CiteMap(QGraphicsScene):
             thought.coords = thought.mapToScene(thought.pos())
             thought.shape_coords = (thought.shape_item.pos().x(), thought.shape_item.pos().y())
 
-    def add_entry(self, paper_data: ss.CachePaperData, pos: Coord,
+    def add_entry(self, paper_data: ss.CachePaperData | ss.PaperEntry, pos: Coord,
                   data: Optional[dict] = None,
                   shape: Optional[Shapes] = None) -> Entry:
         """Add the given :class:`ss.Paper` entry data at pos
 
+        Only the light record of the paper is kept with the entry. The heavy
+        fields are loaded from :attr:`s2` when needed.
+
         Args:
             data: Paper data
             pos: Coordinate position
@@ -536,12 +757,16 @@ class CiteMap(QGraphicsScene):
         """
         if not shape:
             shape = Shapes.rounded_rectangle
+        if paper_data:
+            paper_data = self.s2.to_light_data(paper_data)
+            self.s2.pin(paper_data.paperId)
         self.cur_index += 1
         self.entries[self.cur_index] = Entry(self, self.cur_index,
                                              text=self.s2.format_entry(paper_data),
                                              coords=pos, shape=shape,
                                              data=data or {},
                                              paper_data=paper_data)
+        self.update_entry_rect(self.entries[self.cur_index])
         self.resize_and_update()
         return self.entries[self.cur_index]
 
@@ -597,8 +822,7 @@ class CiteMap(QGraphicsScene):
                 t_par.family["children"].remove(t.index)
                 t_par.family[t.side]["children"].remove(t.index)
                 self.fix_family(self.entries[sib])
-                self.removeItem(self.links[(t_par.index, t.index)])
-                self.links.pop((t_par.index, t.index))
+                self.remove_link(t_par.index, t.index)
             # Add to new family.  At addition the positions of
             # all children of attached nodes should be updated.
             t.family["parent"] = target.index
@@ -701,7 +925,7 @@ class CiteMap(QGraphicsScene):
         if f_dir == to_dir:
             children = par.family[f_dir].pop("children")
             for c_ind in children:
-                pos = self.try_place_entry_relative_to(par, f_dir)
+                pos, _ = self.try_place_entry_relative_to(par, f_dir)
                 self.entries[c_ind].shape_item.setPos(pos)
                 if "children" in par.family[f_dir]:
                     par.family[f_dir]["children"].add(c_ind)
@@ -720,10 +944,9 @@ class CiteMap(QGraphicsScene):
                     par.family[direction]["children"].add(c_ind)
                 else:
                     par.family[direction] = {"children": {c_ind}}
-                pos = self.try_place_entry_relative_to(par, direction)
+                pos, _ = self.try_place_entry_relative_to(par, direction)
                 self.entries[c_ind].shape_item.setPos(pos)
                 self.entries[c_ind].side = direction
-                self.removeItem(self.links[(par.index, c_ind)])
                 self.add_link(par.index, c_ind, direction)
                 self.check_hide_links(c_ind)
                 if "children" not in self.entries[c_ind].family[iorient[0]]:
@@ -737,24 +960,6 @@ class CiteMap(QGraphicsScene):
             par.family[idir].pop("children")
             self.fix_family(par)
 
-    def last_child_and_ordinate(self, inds, orientation, axis):
-        if orientation == "horizontal":
-            coo = lambda item: self.coord(item).x
-        else:
-            coo = lambda item: self.coord(item).y
-        if axis == "pos":
-            func = max
-            op = operator.add
-        else:
-            func = min
-            op = operator.sub
-
-        ind_ordinate = [(ind, coo(ind)) for ind in inds]
-        retval = func(ind_ordinate, key=lambda x: x[1])
-        return retval[0], op(retval[1],
-                             self.entries[retval[0]].shape_item.boundingRect().getRect()[
-                                 2 if orientation == "horizontal" else 3])
-
     def drag_and_drop(self, event, pos=None, data=None):
         if not data:
             return
@@ -771,81 +976,53 @@ class CiteMap(QGraphicsScene):
             dirz = dict(zip(dirs, coords))
             possible_directions = [d for d in dirs
                                    if parent.family[d][0] not in {"parent", "siblings"}]
-            dist_dir = [(self.dist(pos, parent.mapToScene(dirz[p])), p)
-                        for p in possible_directions]
-            res = min(dist_dir, key=lambda x: x[0])
-            # res = min(
-            #     [(self.dist(pos, dirz[p]), p) for p in possible_directions],
-            #     key=lambda x: x[0])
-            self.add_new_child(parent, direction=res[1], data=data)
+
+            def sq_dist(direction):
+                point = parent.mapToScene(dirz[direction])
+                return (pos.x() - point.x()) ** 2 + (pos.y() - point.y()) ** 2
+
+            self.add_new_child(parent, data, direction=min(possible_directions, key=sq_dist))
         else:
             self.add_entry(data, pos)
 
     def try_place_entry_relative_to(self, entry, direction):
-        shape_item = entry.shape_item  # shape item for that thought
+        """Find a free position for a new relative of :code:`entry` in :code:`direction`
+
+        The preferred slot is :code:`displacement` away from :code:`entry`.
+        If it overlaps another entry, the nearest free slot along the other
+        axis is found from the :attr:`grid`, so that relatives are stacked
+        next to each other and don't land on unrelated entries. The new entry
+        is assumed to be of the size of :code:`entry`.
 
-        def relatives(entry):
-            return map(lambda x: self.entries[x], entry.connections[direction])
+        Args:
+            entry: The entry
+            direction: One of :code:`l`, :code:`r`, :code:`u` or :code:`d`
 
-        pos = None
+        Returns the position and :code:`pos` or :code:`neg` for the side of
+        the preferred slot on which the position is.
+
+        """
+        shape_item = entry.shape_item
         axis, orientation = self.direction_map[direction]
         displacement = 200
         buffer = 20
-        coords = self.coord(shape_item)
-        x, y = coords.x, coords.y
-        child_axis = None
-        if entry.connections[direction]:
-            entries_in_direction = entry.connections[direction]
-            on_side = None
-            child_axis = None
-            if direction in {"l", "r"}:
-                on_side = [1 if self.coord(c).y < y else 0 for c in relatives(entry)]
-            elif direction in {"u", "d"}:
-                on_side = [1 if self.coord(c).x < x else 0 for c in relatives(entry)]
-            if sum(on_side) < len(on_side)/2:
-                child_axis = "neg"
-            else:
-                child_axis = "pos"
-
-            _orientation = "horizontal" if orientation == "vertical" else "vertical"
-            last_child, lco = self.last_child_and_ordinate(entries_in_direction,
-                                                           _orientation,
-                                                           child_axis)
-            if direction == "l":
-                if child_axis == "neg":
-                    pos = QPointF(x - displacement, lco - buffer)
-                else:
-                    pos = QPointF(x - displacement, lco + buffer)
-            elif direction == "r":
-                if child_axis == "neg":
-                    pos = QPointF(x + displacement +
-                                  shape_item.boundingRect().getRect()[2], lco - buffer)
-                else:
-                    pos = QPointF(x + displacement +
-                                  shape_item.boundingRect().getRect()[2], lco + buffer)
-            elif direction == "u":
-                if child_axis == "neg":
-                    pos = QPointF(lco - buffer, y - displacement)
-                else:
-                    pos = QPointF(lco + buffer, y - displacement)
-            elif direction == "d":
-                if child_axis == "neg":
-                    pos = QPointF(lco - buffer, y + displacement + shape_item.boundingRect().getRect()[3])
-                else:
-                    pos = QPointF(lco + buffer,
-                                  y + displacement + shape_item.boundingRect().getRect()[3])
+        x, y = shape_item.pos().x(), shape_item.pos().y()
+        rect_x, rect_y, width, height = shape_item.boundingRect().getRect()
+        if direction == "l":
+            x -= displacement
+        elif direction == "r":
+            x += displacement + width
+        elif direction == "u":
+            y -= displacement
         else:
-            if orientation == "horizontal":
-                if axis == "neg":  # l
-                    pos = QPointF(x - displacement, y)
-                else:  # r
-                    pos = QPointF(x + displacement + shape_item.boundingRect().getRect()[2], y)
-            else:
-                if axis == "neg":  # u
-                    pos = QPointF(x, y - displacement)
-                else:  # d
-                    pos = QPointF(x, y + displacement + shape_item.boundingRect().getRect()[3])
-        return pos, child_axis or axis
+            y += displacement + height
+        # Slots include half the buffer on each side so that neighbours don't touch
+        preferred = (x + rect_x - buffer / 2, y + rect_y - buffer / 2,
+                     width + buffer, height + buffer)
+        step = (0, height + buffer) if orientation == "horizontal" else (width + buffer, 0)
+        slot, k = self._grid.free_slot(preferred, step, exclude=[entry.index])
+        pos = QPointF(slot[0] - rect_x + buffer / 2, slot[1] - rect_y + buffer / 2)
+        return pos, axis if not k else ("pos" if k > 0 else "neg")
 
     def add_new_parent(self, child, paper_data,
                        data={}, shape=Shapes.rectangle, direction=None):
@@ -888,7 +1065,7 @@ class CiteMap(QGraphicsScene):
                                     relative_direction)
         self.add_link(child.index, parent.index, direction=direction)
 
-    def add_new_child(self, parent: Entry, paper_data: ss.CachePaperData,
+    def add_new_child(self, parent: Entry, paper_data: ss.CachePaperData | ss.PaperEntry,
                       data={}, shape=Shapes.rectangle, direction=None):
         if isinstance(parent, Shape):
             parent = parent.text_item
@@ -914,7 +1091,7 @@ class CiteMap(QGraphicsScene):
     def expand_entries_text(self, entries: list[Entry | int]):
         for entry in entries:
             entry = self.get_entry(entry)
-            paper_data = entry.paper_data
+            paper_data = self.s2.with_abstract(entry.paper_data)
             text = self.s2.format_entry(paper_data, self._expanded_entry_fields)
             entry.set_state_property("text", text)
             entry.set_state_property("collapsed", False)
@@ -935,20 +1112,39 @@ class CiteMap(QGraphicsScene):
             if collapsed:
                 text = self.s2.format_entry(paper_data, self._collapsed_entry_fields)
             else:
-                text = self.s2.format_entry(paper_data, self._expanded_entry_fields)
+                text = self.s2.format_entry(self.s2.with_abstract(paper_data),
+                                            self._expanded_entry_fields)
             entry.set_state_property("text", text)
             entry.set_state_property("collapsed", collapsed)
 
     def add_link(self, t1_ind, t2_ind, direction=None):
+        """Add a link from entry :code:`t1_ind` to :code:`t2_ind`
+
+        An existing link between them is replaced. The link is added to
+        :attr:`links` and to the incoming and outgoing links of the entries.
+
+        """
         if not direction:
             print("cannot insert link without direction")
-        self.links[(t1_ind, t2_ind)] = Link(self.entries[t1_ind],
-                                            self.entries[t2_ind],
-                                            self.entries[t1_ind].color,
-                                            scene=self, direction=direction)
-        self.addItem(self.links[(t1_ind, t2_ind)])
+        if (t1_ind, t2_ind) in self.links:
+            self.remove_link(t1_ind, t2_ind)
+        link = Link(self.entries[t1_ind], self.entries[t2_ind], self.entries[t1_ind].color,
+                    scene=self, direction=direction)
+        self.links[(t1_ind, t2_ind)] = link
+        self._outgoing.setdefault(t1_ind, {})[t2_ind] = link
+        self._incoming.setdefault(t2_ind, {})[t1_ind] = link
+        self.addItem(link)
         self.update()
 
+    def remove_link(self, t1_ind, t2_ind):
+        """Remove the link from entry :code:`t1_ind` to :code:`t2_ind` if there's one"""
+        link = self.links.pop((t1_ind, t2_ind), None)
+        if link is None:
+            return
+        self._outgoing[t1_ind].pop(t2_ind, None)
+        self._incoming[t2_ind].pop(t1_ind, None)
+        self.removeItem(link)
+
     def fix_family(self, entry):
         for c in ["l", "u", "r", "d"]:
             keys = list(entry.family[c].keys())
@@ -1140,7 +1336,64 @@ class CiteMap(QGraphicsScene):
                         for s in entry.family[c]['siblings']:
                             self.select(s)
 
+    def refresh_entries(self, max_age: Optional[float] = None):
+        """Refresh the papers shown in the map in the background
+
+        With :code:`max_age` the stale papers in the cache are refreshed
+        after them. When the refresh is done the entries are updated with
+        the refreshed data on the UI thread, unless it was stopped with
+        :meth:`cancel_refresh`.
+
+        Args:
+            max_age: Also refresh cached papers older than these many seconds
+
+        """
+        paper_ids = [x.paper_data.paperId for x in self.entries.values() if x.paper_data]
+        self.cancel_refresh()
+        token = self._refresh_token
+        result = self._s2.refresh(max_age, paper_ids, token=token)
+        result.add_done_callback(lambda _: self._fetched.emit(token, self._update_entries,
+                                                              paper_ids))
+        return result
+
+    def _update_entries(self, paper_ids: list[str]):
+        """Replace the data of the entries of :code:`paper_ids` and render their text again
+
+        Args:
+            paper_ids: The paper IDs
+
+        """
+        details = dict(zip(paper_ids, self.s2.get_papers_details(paper_ids)))
+        for entry in self.entries.values():
+            paper_data = entry.paper_data and details.get(entry.paper_data.paperId)
+            if paper_data is None:
+                continue
+            entry.paper_data = paper_data
+            if entry.state.collapsed:
+                self.collapse_entries_text([entry])
+            else:
+                self.expand_entries_text([entry])
+
+    def show_metrics(self):
+        """Show a summary of the fetch metrics of :class:`S2` in the status bar"""
+        self.status_bar.showMessage(self._s2.metrics.format(), 0)
+
+    def cancel_refresh(self):
+        """Stop the refresh started by :meth:`refresh_entries`"""
+        self._s2.scheduler.cancel(self._refresh_token)
+        self._refresh_token = CancelToken()
+
     def abort(self):
+        """Abort the current interaction
+
+        The queued fetches of expansions and of the prefetch are cancelled
+        and the results of expansions still in flight are dropped. A refresh
+        keeps running and is stopped with :meth:`cancel_refresh`.
+
+        """
+        self._s2.scheduler.cancel(self._interaction_token)
+        self._interaction_token = CancelToken()
+        self._prefetcher.cancel()
         self.unselect_all()
         self.toggle_nav_cycle(False)
 
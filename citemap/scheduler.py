@@ -0,0 +1,174 @@
+from typing import Optional, Callable, Any
+import threading
+from enum import IntEnum
+from collections import deque
+from concurrent.futures import Future
+
+
+class Priority(IntEnum):
+    """Priority classes of fetches. Lower values run first."""
+    interactive = 0
+    visible = 1
+    prefetch = 2
+    bulk = 3
+
+
+class CancelToken:
+    """A token shared by a group of jobs which can be cancelled together"""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+
+class _Job:
+    def __init__(self, func: Callable, args: tuple, token: Optional[CancelToken]):
+        self.func = func
+        self.args = args
+        self.token = token
+        self.future: Future = Future()
+
+
+class FetchScheduler:
+    """Run fetch jobs on a pool of workers in order of :class:`Priority`.
+
+    Each priority class has its own queue and a limit on how many of its jobs
+    can run at the same time. A free worker always takes the next job of the
+    highest priority class which is under its limit, so an interactive fetch
+    never waits behind queued background fetches. By default :code:`bulk`
+    and :code:`prefetch` jobs can't occupy all the workers.
+
+    Jobs submitted with a :class:`CancelToken` are dropped from the queue
+    once the token is cancelled and their futures are cancelled.
+
+    Args:
+        num_workers: Number of worker threads
+        limits: Maximum concurrent jobs for each priority class
+
+
+    """
+
+    def __init__(self, num_workers: int = 8, limits: Optional[dict[Priority, int]] = None):
+        self.num_workers = num_workers
+        reserved = min(2, num_workers - 1)
+        self._limits = {Priority.interactive: num_workers,
+                        Priority.visible: num_workers,
+                        Priority.prefetch: max(1, num_workers // 4),
+                        Priority.bulk: max(1, num_workers - reserved)}
+        self._limits.update(limits or {})
+        self._queues: dict[Priority, deque[_Job]] = {p: deque() for p in Priority}
+        self._running: dict[Priority, int] = {p: 0 for p in Priority}
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._workers = [threading.Thread(target=self._work, daemon=True,
+                                          name=f"fetch-scheduler-{i}")
+                         for i in range(num_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def limit(self, priority: Priority) -> int:
+        return self._limits[priority]
+
+    def set_limit(self, priority: Priority, limit: int):
+        """Set the maximum concurrent jobs for :code:`priority`
+
+        The limit can't be more than :attr:`num_workers`.
+
+        """
+        with self._cond:
+            self._limits[priority] = max(1, min(limit, self.num_workers))
+            self._cond.notify_all()
+
+    def queued(self, priority: Optional[Priority] = None) -> int:
+        with self._cond:
+            if priority is None:
+                return sum(len(x) for x in self._queues.values())
+            return len(self._queues[priority])
+
+    def submit(self, func: Callable, *args: Any, priority: Priority = Priority.interactive,
+               token: Optional[CancelToken] = None) -> Future:
+        """Queue :code:`func(*args)` with :code:`priority`
+
+        Args:
+            func: The function to call
+            args: Arguments to the function
+            priority: The :class:`Priority` class
+            token: Optional :class:`CancelToken` to cancel the job with
+
+        """
+        job = _Job(func, args, token)
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit after shutdown")
+            self._queues[priority].append(job)
+            self._cond.notify()
+        return job.future
+
+    def cancel(self, token: CancelToken) -> int:
+        """Cancel :code:`token` and drop its queued jobs
+
+        Returns the number of jobs dropped. Running jobs are not interrupted.
+
+        """
+        token.cancel()
+        return self._drop(lambda job: job.token is token)
+
+    def cancel_all(self, priority: Optional[Priority] = None) -> int:
+        """Drop all the queued jobs, or only those of :code:`priority`"""
+        return self._drop(lambda job: True, priority)
+
+    def _drop(self, predicate: Callable[[_Job], bool], priority: Optional[Priority] = None) -> int:
+        dropped = []
+        with self._cond:
+            for p, queue in self._queues.items():
+                if priority is not None and p != priority:
+                    continue
+                keep = deque()
+                for job in queue:
+                    (dropped if predicate(job) else keep).append(job)
+                self._queues[p] = keep
+        for job in dropped:
+            job.future.cancel()
+        return len(dropped)
+
+    def _next_job(self) -> Optional[tuple[Priority, _Job]]:
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue and queue[0].token is not None and queue[0].token.cancelled:
+                queue.popleft().future.cancel()
+            if queue and self._running[priority] < self._limits[priority]:
+                return priority, queue.popleft()
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._shutdown and (item := self._next_job()) is None:
+                    self._cond.wait()
+                if self._shutdown:
+                    return
+                priority, job = item
+                self._running[priority] += 1
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        job.future.set_result(job.func(*job.args))
+                    except BaseException as err:
+                        job.future.set_exception(err)
+            finally:
+                with self._cond:
+                    self._running[priority] -= 1
+                    self._cond.notify_all()
+
+    def shutdown(self):
+        """Stop the workers after cancelling all the queued jobs"""
+        self.cancel_all()
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
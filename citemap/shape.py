@@ -103,12 +103,15 @@ class Shape(QGraphicsEllipseItem):
     def itemChange(self, change, value):
         if change == QGraphicsItem.ItemPositionChange:
             self.text_item._scene.update_pos()
+        if change == QGraphicsItem.ItemPositionHasChanged:
+            self.text_item._scene.update_entry_rect(self.text_item)
         if change == QGraphicsItem.ItemSelectedChange:
             if value:
                 self.setZValue(2)
                 self.make_brush('dark')
                 self.text_item._scene.links_zvalue(self.text_item, 1)
                 self.text_item._scene.cycle_check(self.text_item.index)
+                self.text_item._scene.entry_selected(self.text_item)
             else:
                 self.setZValue(-1)
                 self.make_brush('regular')
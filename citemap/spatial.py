@@ -0,0 +1,178 @@
+from typing import Optional, Hashable, Callable, Iterable, Iterator
+import math
+from collections import defaultdict
+
+
+Rect = tuple[float, float, float, float]
+_directions = {"l": (-1, 0), "r": (1, 0), "u": (0, -1), "d": (0, 1)}
+
+
+class GridIndex:
+    """A uniform grid over the bounding rectangles of items in the scene.
+
+    Each rectangle :code:`(x, y, width, height)` is registered in every cell
+    of side :code:`cell_size` which it overlaps. Collision and neighbour
+    queries then look only at the cells around the query instead of at all
+    the items, so they don't grow with the size of the map as long as the
+    items are spread out.
+
+    Args:
+        cell_size: Side of a grid cell. About the size of an item works best
+
+
+    """
+
+    def __init__(self, cell_size: float = 200):
+        self.cell_size = cell_size
+        self._rects: dict[Hashable, Rect] = {}
+        self._cells: dict[tuple[int, int], set] = defaultdict(set)
+        self._bounds: Optional[tuple[int, int, int, int]] = None
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rects
+
+    def __len__(self) -> int:
+        return len(self._rects)
+
+    def rect(self, key: Hashable) -> Optional[Rect]:
+        return self._rects.get(key)
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _cells_of(self, rect: Rect) -> Iterator[tuple[int, int]]:
+        x, y, width, height = rect
+        x0, y0 = self._cell(x, y)
+        x1, y1 = self._cell(x + width, y + height)
+        for i in range(x0, x1 + 1):
+            for j in range(y0, y1 + 1):
+                yield i, j
+
+    def insert(self, key: Hashable, rect: Rect):
+        """Insert :code:`key` with :code:`rect` or move it if it's already in the index"""
+        rect = tuple(rect)      # type: ignore
+        if self._rects.get(key) == rect:
+            return
+        self.remove(key)
+        self._rects[key] = rect  # type: ignore
+        for cell in self._cells_of(rect):
+            self._cells[cell].add(key)
+        (x0, y0), (x1, y1) = self._cell(rect[0], rect[1]),\
+            self._cell(rect[0] + rect[2], rect[1] + rect[3])
+        if self._bounds is None:
+            self._bounds = (x0, y0, x1, y1)
+        else:
+            bx0, by0, bx1, by1 = self._bounds
+            self._bounds = (min(bx0, x0), min(by0, y0), max(bx1, x1), max(by1, y1))
+
+    def remove(self, key: Hashable):
+        rect = self._rects.pop(key, None)
+        if rect is None:
+            return
+        for cell in self._cells_of(rect):
+            keys = self._cells[cell]
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+    def query(self, rect: Rect, exclude: Iterable[Hashable] = ()) -> set:
+        """Return the keys whose rectangles overlap :code:`rect`
+
+        Rectangles which only touch at the edges don't overlap.
+
+        Args:
+            rect: The query rectangle
+            exclude: Keys to ignore
+
+        """
+        x, y, width, height = rect
+        exclude = set(exclude)
+        result = set()
+        for cell in self._cells_of(rect):
+            for key in self._cells.get(cell, ()):
+                if key in exclude or key in result:
+                    continue
+                kx, ky, kw, kh = self._rects[key]
+                if kx < x + width and x < kx + kw and ky < y + height and y < ky + kh:
+                    result.add(key)
+        return result
+
+    def is_free(self, rect: Rect, exclude: Iterable[Hashable] = ()) -> bool:
+        return not self.query(rect, exclude)
+
+    def free_slot(self, rect: Rect, step: tuple[float, float],
+                  exclude: Iterable[Hashable] = (), max_tries: int = 1000) -> tuple[Rect, int]:
+        """Find the nearest free slot for :code:`rect` along :code:`step`
+
+        The slots :code:`rect` moved by :code:`k * step` are tried for
+        :code:`k = 0, 1, -1, 2, -2, ...` and the first which doesn't overlap
+        another rectangle is returned.
+
+        Args:
+            rect: The preferred rectangle
+            step: Displacement between consecutive slots
+            exclude: Keys to ignore
+            max_tries: Maximum number of slots to try
+
+        Returns the free rectangle and :code:`k`. If no slot is free, :code:`rect` and 0.
+
+        """
+        exclude = set(exclude)
+        x, y, width, height = rect
+        for i in range(max_tries):
+            k = (i + 1) // 2 if i % 2 else -(i // 2)
+            slot = (x + k * step[0], y + k * step[1], width, height)
+            if self.is_free(slot, exclude):
+                return slot, k
+        return rect, 0
+
+    def nearest(self, x: float, y: float, direction: str,
+                exclude: Iterable[Hashable] = (),
+                accept: Optional[Callable[[Hashable], bool]] = None) -> Optional[Hashable]:
+        """Find the nearest item in :code:`direction` from the point :code:`(x, y)`
+
+        Items whose centres are ahead of the point in :code:`direction` are
+        ranked by the distance along the direction plus twice the distance
+        across it, so that items in line are preferred over closer ones to
+        the side. The cells are searched in rings around the point until no
+        closer item can be found.
+
+        Args:
+            x: x coordinate of the point
+            y: y coordinate of the point
+            direction: One of :code:`l`, :code:`r`, :code:`u` or :code:`d`
+            exclude: Keys to ignore
+            accept: Optional filter on the keys, e.g., for visible items
+
+        """
+        if self._bounds is None:
+            return None
+        dx, dy = _directions[direction]
+        exclude = set(exclude)
+        ci, cj = self._cell(x, y)
+        bx0, by0, bx1, by1 = self._bounds
+        max_ring = max(abs(ci - bx0), abs(ci - bx1), abs(cj - by0), abs(cj - by1))
+        seen = set()
+        best, best_score = None, math.inf
+        for ring in range(max_ring + 1):
+            for i in range(ci - ring, ci + ring + 1):
+                for j in range(cj - ring, cj + ring + 1):
+                    if max(abs(i - ci), abs(j - cj)) != ring:
+                        continue
+                    if (i - ci) * dx + (j - cj) * dy < 0:
+                        continue
+                    for key in self._cells.get((i, j), ()):
+                        if key in seen or key in exclude:
+                            continue
+                        seen.add(key)
+                        kx, ky, kw, kh = self._rects[key]
+                        ox, oy = kx + kw / 2 - x, ky + kh / 2 - y
+                        along = ox * dx + oy * dy
+                        if along <= 0 or (accept and not accept(key)):
+                            continue
+                        score = along + 2 * abs(ox * dy - oy * dx)
+                        if score < best_score:
+                            best, best_score = key, score
+            if best_score <= ring * self.cell_size:
+                break
+        return best
@@ -1,17 +1,37 @@
-from typing import Optional
-import json
+from typing import Optional, Callable, Any
+import sys
+import math
+import re
+import time
 import glob
+import threading
+from enum import Enum
 from pathlib import Path
 import dataclasses
 from dataclasses import dataclass
+from concurrent.futures import (Future, CancelledError, as_completed, wait,
+                                FIRST_COMPLETED)
 
 from .util import Pathlike
+from .store import PaperStore
+from .graph import CitationGraph
+from .interner import PaperIds
+from .cache import PaperCache
+from .jsoncache import JsonCache
+from .blobs import BlobStore
+from .cursor import NeighbourCursor
+from .ranking import TopNeighbours
+from .metrics import Metrics
+from .cache import estimate_size
+from .scheduler import FetchScheduler, Priority, CancelToken
+from .ratelimit import AdaptiveLimiter
 from s2cache.semantic_scholar import SemanticScholar
 from s2cache.models import PaperData, PaperDetails, Error
-from s2cache.util import dump_json
 
-from common_pyutil.monitor import Timer
-_timer = Timer()
+# Status codes only count at the start of a field, e.g., "429 Too Many Requests"
+_throttled_pattern = re.compile(r"^\s*(429|5\d\d)\b|too many requests|rate limit|"
+                                r"timed out|timeout|service unavailable|bad gateway",
+                                re.IGNORECASE)
 
 
 @dataclass
@@ -57,17 +77,47 @@ class CachePaperData:
     authors: list[str]
     venue: str
     year: str
-    abstract: str
+    abstract: Optional[str]
     citationCount: int
     influentialCitationCount: int
-    references: list[str]
-    citations: list[str]
+    references: list[int]
+    citations: list[int]
 
     def __post_init__(self):
         self.citationCount = int(self.citationCount)
         self.influentialCitationCount = int(self.influentialCitationCount)
 
 
+class FailureKind(Enum):
+    not_found = "not_found"
+    transient = "transient"
+
+
+@dataclass
+class FailedLookup:
+    """A negative cache entry for a paper which could not be fetched
+
+    Args:
+        kind: Whether the paper doesn't exist or the failure was transient
+        message: The error message
+        attempts: Number of consecutive failures
+        expires: Time after which the paper may be fetched again
+
+    """
+    kind: FailureKind
+    message: str
+    attempts: int = 1
+    expires: float = math.inf
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires
+
+
+heavy_fields = {"abstract", "references", "citations"}
+"""Fields of :class:`CachePaperData` which are not kept in the light records"""
+
+
 def serialize_dataclass(obj):
     if dataclasses.is_dataclass(obj):
         return dataclasses.asdict(obj)
@@ -77,50 +127,865 @@ def serialize_dataclass(obj):
 
 class S2:
     def __init__(self, s2client: SemanticScholar, data_dir: Pathlike,
-                 paper_format_fields: PaperFields, fill_width: Optional[int] = 40):
+                 paper_format_fields: PaperFields, fill_width: Optional[int] = 40,
+                 max_workers: int = 8, cache_max_entries: Optional[int] = None,
+                 cache_max_bytes: Optional[int] = None, failure_ttl: float = 30,
+                 max_failure_ttl: float = 3600,
+                 rate_limiter: Optional[AdaptiveLimiter] = None, fetch_retries: int = 3,
+                 retry_backoff: float = 0.5, heavy_cache_max_entries: int = 256,
+                 rank_by: str = "citationCount", top_k: int = 5,
+                 index_max_entries: Optional[int] = None):
         self._client = s2client
         self._data_dir = Path(data_dir)
         if not self._data_dir.exists():
             self._data_dir.mkdir()
         self._fill_width = fill_width
         self._paper_fields = paper_format_fields
-        self._cache: dict[str, Optional[CachePaperData]] = {}
+        self._store = PaperStore(self._data_dir.joinpath("cache.db"))
+        # A cached paper brings in the IDs and scores of its neighbours. IDs
+        # are only kept in the store when they don't all fit in memory
+        if index_max_entries is None and cache_max_entries:
+            index_max_entries = 64 * cache_max_entries
+        self._ids = PaperIds(self._store if index_max_entries else None, index_max_entries)
+        self._cache = PaperCache(max_entries=cache_max_entries, max_bytes=cache_max_bytes)
+        self._heavy = PaperCache(max_entries=heavy_cache_max_entries)
         self._cache_keys = [x.name for x in dataclasses.fields(CachePaperData)]
+        self._abstracts = BlobStore(self._data_dir.joinpath("abstracts"))
+        self._graph: Optional[CitationGraph] = None
+        self._graph_built_at = 0.0
+        self._json_cache: Optional[JsonCache] = None
+        self._json_cache_lock = threading.Lock()
+        self._json_import_thread: Optional[threading.Thread] = None
+        self._failure_ttl = failure_ttl
+        self._max_failure_ttl = max_failure_ttl
+        self._failures_lock = threading.Lock()
+        self._failures: dict[int, FailedLookup] = {
+            self._ids.intern(paper_id): FailedLookup(FailureKind(kind), message)
+            for paper_id, kind, message, _ in self._store.failures()}
+        self._inflight: dict[int, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._duplicates_avoided = 0
+        self._max_workers = max_workers
+        self._scheduler = FetchScheduler(max_workers)
+        self._limiter = rate_limiter or AdaptiveLimiter(max_concurrency=max_workers)
+        self._fetch_retries = fetch_retries
+        self._retry_backoff = retry_backoff
+        self._metrics = Metrics()
+        self._rank_by = rank_by
+        self._ranking = TopNeighbours(top_k, index_max_entries)
+        self._light_fields = [x.name for x in dataclasses.fields(PaperEntry)
+                              if x.name not in heavy_fields]
 
     def to_cached_data(self, data: PaperData) -> CachePaperData:
         references = self.get_references_from_paper_data(data)
         citations = self.get_citations_from_paper_data(data)
         details = CachePaperData(**{k: v for k, v in dataclasses.asdict(data.details).items()
                                     if k in self._cache_keys})
-        details.references = references
-        details.citations = citations
+        details.references = self._ids.intern_many(references)
+        details.citations = self._ids.intern_many(citations)
+        self._ranking.set_scores(zip(details.references,
+                                     (self._get_linked_paper_score(x, "citedPaper")
+                                      for x in data.references.data)))
+        self._ranking.set_scores(zip(details.citations,
+                                     (self._get_linked_paper_score(x, "citingPaper")
+                                      for x in data.citations.data)))
         return details
 
-    def get_paper_family(self, paper_id: str) -> Optional[CachePaperData]:
-        if paper_id not in self._cache:
-            with _timer:
-                data = self._client.paper_data(paper_id)
-                if not isinstance(data, Error):
-                    self._cache[paper_id] = self.to_cached_data(data)
-                else:
-                    self._cache[paper_id] = None
-            print(f"Fetched paper with {paper_id} in {_timer.time} seconds")
-        return self._cache[paper_id]
+    def _to_record(self, data: CachePaperData) -> dict:
+        """Convert :class:`CachePaperData` to a :code:`dict` with string paper IDs
+
+        The abstract is not included. It's kept in the :class:`BlobStore`.
+
+        """
+        record = dataclasses.asdict(data)
+        record.pop("abstract")
+        record["references"] = self._ids.lookup_many(data.references)
+        record["citations"] = self._ids.lookup_many(data.citations)
+        return record
+
+    def _from_record(self, record: dict) -> CachePaperData:
+        """Inverse of :meth:`_to_record`
+
+        Records imported from earlier versions still have the abstract.
+
+        """
+        data = CachePaperData(**{"abstract": None, **record})
+        data.references = self._ids.intern_many(data.references)
+        data.citations = self._ids.intern_many(data.citations)
+        return data
+
+    def to_light_data(self, data: CachePaperData | PaperEntry) -> PaperEntry:
+        """Return the light display record of :code:`data` without the heavy fields"""
+        if isinstance(data, PaperEntry) and data.abstract is None:
+            return data
+        return PaperEntry(**{k: getattr(data, k) for k in self._light_fields})
+
+    def _key(self, paper_id: str | int) -> int:
+        return paper_id if isinstance(paper_id, int) else self._ids.intern(paper_id)
+
+    @property
+    def ids(self) -> PaperIds:
+        """The :class:`PaperIds` used to intern paper IDs"""
+        return self._ids
+
+    @property
+    def scheduler(self) -> FetchScheduler:
+        """The :class:`FetchScheduler` on which all concurrent fetches are queued"""
+        return self._scheduler
+
+    @property
+    def metrics(self) -> Metrics:
+        """Latencies and counts of cache lookups and fetches.
+
+        Latencies are recorded for :code:`cache_hit`, :code:`network_fetch`,
+        :code:`parse` and :code:`to_cached_data`, and the counters are
+        :code:`hits`, :code:`misses`, :code:`requests`, :code:`throttled`,
+        :code:`errors` and :code:`bytes_fetched`.
+
+        """
+        return self._metrics
+
+    @property
+    def rate_limiter(self) -> AdaptiveLimiter:
+        """The :class:`AdaptiveLimiter` around the client requests"""
+        return self._limiter
+
+    @property
+    def store(self) -> PaperStore:
+        return self._store
+
+    @property
+    def graph_index_dir(self) -> Path:
+        return self._data_dir.joinpath("graph")
+
+    @property
+    def graph(self) -> Optional[CitationGraph]:
+        """The :class:`CitationGraph` index if it has been built"""
+        if self._graph is None and CitationGraph.exists(self.graph_index_dir):
+            self._graph = CitationGraph.load(self.graph_index_dir)
+            built_at = self._store.get_meta("graph_built_at")
+            self._graph_built_at = float(built_at) if built_at is not None else\
+                self.graph_index_dir.joinpath("ids.npy").stat().st_mtime
+        return self._graph
+
+    def build_graph_index(self) -> CitationGraph:
+        """Build the :class:`CitationGraph` index from all the papers in the store
+
+        The index is saved in :attr:`graph_index_dir` and used for looking up
+        references and citations of a paper.
+
+        """
+        built_at = time.time()
+        self._graph = CitationGraph.build(lambda: ((k, v["references"], v["citations"])
+                                                   for k, v in self._store.items()))
+        self._graph.save(self.graph_index_dir)
+        self._store.set_meta("graph_built_at", str(built_at))
+        self._graph_built_at = built_at
+        return self._graph
+
+    def _graph_node(self, paper_id: str) -> Optional[int]:
+        """Return the node of :code:`paper_id` in the :attr:`graph` if its row is current
+
+        The row of a paper which was fetched again after the index was
+        built, e.g., by :meth:`refresh`, is stale and the store is read instead.
+
+        """
+        graph = self.graph
+        if graph is None:
+            return None
+        node = graph.node(paper_id)
+        if node is None or not graph.has_data[node]:
+            return None
+        if (self._store.fetched_at(paper_id) or 0) > self._graph_built_at:
+            return None
+        return node
+
+    def get_family_from_index(self, paper_id: str | int) ->\
+            Optional[tuple[list[int], list[int]]]:
+        """Get the citations and references of a paper from the :attr:`graph` index
+
+        Args:
+            paper_id: The paper ID
+
+        Returns :code:`None` if there's no index, the paper is not in it or
+        its row is stale.
+
+        """
+        if isinstance(paper_id, int):
+            paper_id = self._ids.lookup(paper_id)
+        node = self._graph_node(paper_id)
+        if node is None:
+            return None
+        graph: CitationGraph = self._graph  # type: ignore
+        return (self._ids.intern_many(graph.paper_ids(graph.citation_nodes(node))),
+                self._ids.intern_many(graph.paper_ids(graph.reference_nodes(node))))
+
+    def get_neighbours_page(self, paper_id: str | int, kind: str,
+                            offset: int, limit: int) -> list[int]:
+        """Get :code:`limit` citations or references of a paper from :code:`offset`
+
+        The page is sliced from the :attr:`graph` index, unless the row of
+        the paper is stale, or the cached data of the paper. If the cache has fewer citations than the
+        :code:`citationCount` of the paper, the rest are requested from the
+        client if it can page through citations.
+
+        Args:
+            paper_id: The paper ID
+            kind: One of :code:`citations` or :code:`references`
+            offset: Offset of the page
+            limit: Size of the page
+
+        """
+        if kind not in {"citations", "references"}:
+            raise ValueError(f"Unknown kind of neighbours {kind}")
+        key = self._key(paper_id)
+        node = self._graph_node(self._ids.lookup(key))
+        if node is not None:
+            graph: CitationGraph = self._graph  # type: ignore
+            nodes = graph.citation_nodes(node) if kind == "citations"\
+                else graph.reference_nodes(node)
+            page = self._ids.intern_many(graph.paper_ids(nodes[offset:offset+limit]))
+        else:
+            data = self.get_paper_data(key)
+            if data is None:
+                return []
+            page = getattr(data, kind)[offset:offset+limit]
+        if len(page) < limit and kind == "citations" and hasattr(self._client, "citations"):
+            page.extend(self._fetch_citations_page(key, offset + len(page), limit - len(page)))
+        return page
+
+    def _fetch_citations_page(self, key: int, offset: int, limit: int) -> list[int]:
+        light = self._cache.get(key)
+        if light is None or not light.citationCount or light.citationCount <= offset:
+            return []
+        result = self._request(self._client.citations, self._ids.lookup(key), offset, limit)
+        if isinstance(result, Error):
+            print(f"Got error for citations of {self._ids.lookup(key)}\n{result}")
+            return []
+        paper_ids = [x["paperId"] if isinstance(x, dict) else x.paperId for x in result]
+        return self._ids.intern_many([x for x in paper_ids if x])
+
+    def citations_cursor(self, paper_id: str | int, page_size: int = 5) -> NeighbourCursor:
+        """Return a :class:`NeighbourCursor` over the citations of :code:`paper_id`
+
+        Args:
+            paper_id: The paper ID
+            page_size: Default number of citations in a page
+
+        """
+        key = self._key(paper_id)
+        return NeighbourCursor(lambda offset, limit:
+                               self.get_neighbours_page(key, "citations", offset, limit),
+                               page_size)
+
+    def references_cursor(self, paper_id: str | int, page_size: int = 5) -> NeighbourCursor:
+        """Return a :class:`NeighbourCursor` over the references of :code:`paper_id`
+
+        Args:
+            paper_id: The paper ID
+            page_size: Default number of references in a page
+
+        """
+        key = self._key(paper_id)
+        return NeighbourCursor(lambda offset, limit:
+                               self.get_neighbours_page(key, "references", offset, limit),
+                               page_size)
+
+    @property
+    def cache_stats(self) -> dict[str, int]:
+        """Hit, miss and eviction counts of the memory caches
+
+        The counts of the cache of light records are reported as they are
+        and those of the cache of full records with a :code:`heavy_` prefix,
+        along with the numbers of interned IDs, scores and top neighbour heaps
+        in memory.
+
+        """
+        stats = self._cache.stats()
+        stats.update({f"heavy_{k}": v for k, v in self._heavy.stats().items()})
+        stats["interned_ids"] = len(self._ids)
+        stats["ranking_scores"] = self._ranking.num_scores
+        stats["ranking_heaps"] = len(self._ranking)
+        return stats
+
+    def is_cached(self, paper_id: str | int) -> bool:
+        """Whether the full data of :code:`paper_id` is in memory or the store"""
+        key = self._key(paper_id)
+        return key in self._heavy or self._ids.lookup(key) in self._store
+
+    def pin(self, paper_id: str | int):
+        """Keep the light record of :code:`paper_id` in memory until it's unpinned
+
+        Used for papers which are shown in the scene.
+
+        Args:
+            paper_id: The paper ID
+
+        """
+        self._cache.pin(self._key(paper_id))
+
+    def unpin(self, paper_id: str | int):
+        self._cache.unpin(self._key(paper_id))
+
+    def _get_cached(self, key: int) -> Optional[CachePaperData] | object:
+        """Get the full data of :code:`key` from memory or the store
+
+        The full records are kept in a small LRU cache of
+        :code:`heavy_cache_max_entries` and read from the store otherwise.
+        During a background import of the JSON cache, records which have
+        been scanned already are read from it without waiting for the import.
+
+        Returns :attr:`PaperCache._missing` if it's in neither.
+
+        """
+        data = self._heavy.get(key, PaperCache._missing)
+        if data is PaperCache._missing:
+            paper_id = self._ids.lookup(key)
+            record = self._store.get(paper_id)
+            json_cache = self._json_cache
+            if record is None and json_cache is not None:
+                with self._json_cache_lock:
+                    if self._json_cache is not None:
+                        record = self._json_cache.get(paper_id)
+            if record is not None:
+                data = self._from_record(record)
+                self._heavy[key] = data
+                if key not in self._cache:
+                    self._cache[key] = self.to_light_data(data)
+        return data
+
+    def _import_json_cache(self):
+        json_cache = self._json_cache
+        if json_cache is None:
+            return
+        num_papers = self._store.import_json(json_cache)
+        print(f"Imported {num_papers} papers from JSON cache")
+        self._store.set_meta("json_imported", "1")
+        self._store.set_meta("build_complete", "1")
+        self.build_graph_index()
+        with self._json_cache_lock:
+            self._json_cache = None
+            json_cache.close()
+
+    def wait_for_json_import(self, timeout: Optional[float] = None):
+        """Wait for a background import started by :meth:`load_or_build_citation_cache`"""
+        if self._json_import_thread is not None:
+            self._json_import_thread.join(timeout)
+
+    def _put_many(self, items: list[tuple[str, CachePaperData]]):
+        """Write the papers to the store and their abstracts to the :class:`BlobStore`
+
+        The top neighbours of the papers are updated as well.
+
+        """
+        self._abstracts.put_many((paper_id, data.abstract) for paper_id, data in items
+                                 if data.abstract is not None)
+        self._store.put_many((paper_id, self._to_record(data)) for paper_id, data in items)
+        self._rank_neighbours(items)
+
+    def _load_top_neighbours(self, keys: list[int], kind: str):
+        stored = self._store.get_top_neighbours(self._ids.lookup_many(keys), kind)
+        for paper_id, scored in stored.items():
+            self._ranking.set(self._ids.intern(paper_id), kind,
+                              [(score, self._ids.intern(x)) for score, x in scored])
+
+    def _scored_ids(self, scored: list[tuple[int, int]]) -> list[tuple[int, str]]:
+        return [(score, self._ids.lookup(x)) for score, x in scored]
+
+    def _rank_neighbours(self, items: list[tuple[str, CachePaperData]]):
+        """Update the :class:`TopNeighbours` index with :code:`items`
+
+        The top citations and references of each paper are selected from its
+        neighbours and each paper is offered to the heaps of its neighbours.
+        Changed heaps are written to the store.
+
+        Args:
+            items: List of :code:`(paper_id, data)`
+
+        """
+        rows = []
+        scores = {}
+        for paper_id, data in items:
+            key = self._ids.intern(paper_id)
+            scores[key] = getattr(data, self._rank_by) or 0
+            self._ranking.set_scores([(key, scores[key])])
+            for kind in ("citations", "references"):
+                heap = self._ranking.build(key, kind, getattr(data, kind))
+                rows.append((paper_id, kind, self._scored_ids(heap)))
+        for kind, inverse in (("references", "citations"), ("citations", "references")):
+            offers: dict[int, list[int]] = {}
+            for paper_id, data in items:
+                for x in getattr(data, kind):
+                    offers.setdefault(x, []).append(self._ids.intern(paper_id))
+            self._load_top_neighbours([x for x in offers if (x, inverse) not in self._ranking],
+                                      inverse)
+            for x, keys in offers.items():
+                changed = [self._ranking.offer(x, inverse, key, scores[key]) for key in keys]
+                if any(changed):
+                    rows.append((self._ids.lookup(x), inverse,
+                                 self._scored_ids(self._ranking.top(x, inverse) or [])))
+        self._store.put_top_neighbours(rows)
+
+    def top_neighbours(self, paper_id: str | int, kind: str) -> list[int]:
+        """Return the top citations or references of :code:`paper_id` by :code:`rank_by`
+
+        The ranking uses the scores of the neighbours which are known
+        locally, so only the top :code:`top_k` neighbours need to be fetched.
+        If the heap isn't known, e.g., for a paper of which only the light
+        record has been fetched, it's built from the full data of the paper,
+        which is fetched if it's not cached.
+
+        Args:
+            paper_id: The paper ID
+            kind: :code:`citations` or :code:`references`
+
+        Returns an empty list if the data of the paper can't be fetched.
+
+        """
+        key = self._key(paper_id)
+        if (key, kind) not in self._ranking:
+            self._load_top_neighbours([key], kind)
+        if (key, kind) not in self._ranking:
+            data = self.get_paper_data(key)
+            if data is None:
+                return []
+            if (key, kind) not in self._ranking:
+                self._rank_neighbours([(self._ids.lookup(key), data)])
+        return [x for _, x in self._ranking.top(key, kind) or []]
 
-    def get_paper_data(self, paper_id: str) -> Optional[CachePaperData]:
-        if paper_id not in self._cache:
+    def _store_cached_data(self, key: int, data: CachePaperData) -> CachePaperData:
+        """Store :code:`data` and return it without the abstract as it's kept in memory"""
+        self._put_many([(self._ids.lookup(key), data)])
+        data = dataclasses.replace(data, abstract=None)
+        self._heavy[key] = data
+        self._cache[key] = self.to_light_data(data)
+        return data
+
+    def get_paper_family(self, paper_id: str | int) -> Optional[CachePaperData]:
+        return self.get_paper_data(paper_id)
+
+    def get_abstract(self, paper_id: str | int) -> Optional[str]:
+        """Load the abstract of :code:`paper_id` on demand
+
+        Abstracts are read from the :class:`BlobStore`, or from the full data
+        for papers imported from earlier versions.
+
+        Args:
+            paper_id: The paper ID
+
+        """
+        key = self._key(paper_id)
+        abstract = self._abstracts.get(self._ids.lookup(key))
+        if abstract is not None:
+            return abstract
+        data = self.get_paper_data(key)
+        return data.abstract if data else None
+
+    def with_abstract(self, entry: PaperEntry | CachePaperData) -> PaperEntry | CachePaperData:
+        """Return a copy of :code:`entry` with the abstract loaded
+
+        The copy is meant only for display so that the abstract isn't kept
+        in memory with the light record.
+
+        Args:
+            entry: The light record
+
+        """
+        if entry.abstract is not None:
+            return entry
+        return dataclasses.replace(entry, abstract=self.get_abstract(entry.paperId))
+
+    def _is_throttled(self, error: Error) -> bool:
+        """Whether :code:`error` is a :code:`429`, a :code:`5xx` or a timeout
+
+        Other exceptions and errors, e.g., those of data which couldn't be
+        parsed, are not. Fields which are JSON or long are dumps of the
+        response and are not searched.
+
+        """
+        if error.error == "timeout":
+            return True
+        if error.error == "exception":
+            return False
+        return any(_throttled_pattern.search(x) for x in (error.message, error.error)
+                   if isinstance(x, str) and len(x) <= 200
+                   and not x.lstrip().startswith(("{", "[")))
+
+    def _error_from_exception(self, err: Exception) -> Error:
+        name = type(err).__name__
+        if isinstance(err, (TimeoutError, ConnectionError)) or "Timeout" in name\
+           or "ConnectionError" in name:
+            return Error(message=str(err) or name, error="timeout")
+        return Error(message=str(err), error="exception")
+
+    def _request(self, func: Callable, *args: Any) -> Any:
+        """Call the client :code:`func` through the :attr:`rate_limiter`
+
+        Throttled requests (:code:`429`, :code:`5xx`, timeouts) are retried up
+        to :code:`fetch_retries` times as the limiter backs off, waiting
+        :code:`retry_backoff` seconds before the first retry and twice as long
+        before each next one. Other errors are not retried. Exceptions are
+        returned as :class:`Error`.
+
+        """
+        for attempt in range(self._fetch_retries + 1):
+            if attempt:
+                time.sleep(self._retry_backoff * 2 ** (attempt - 1))
+            started = self._limiter.acquire()
+            result: Any = Error(message="No response", error="exception")
+            try:
+                with self._metrics.timer("network_fetch"):
+                    result = func(*args)
+            except Exception as err:
+                result = self._error_from_exception(err)
+            finally:
+                throttled = isinstance(result, Error) and self._is_throttled(result)
+                self._limiter.release(started, throttled)
+            self._metrics.incr("requests")
+            if not throttled:
+                break
+            self._metrics.incr("throttled")
+        if isinstance(result, Error):
+            self._metrics.incr("errors")
+        return result
+
+    def _fetch_paper(self, paper_id: str) -> CachePaperData | Error:
+        """Fetch paper from the client and convert it to :class:`CachePaperData`
+
+        The request goes through :meth:`_request`.
+
+        Args:
+            paper_id: The paper ID
+
+        Returns an :class:`Error` if the client returned an error or raised
+        an exception.
+
+        """
+        maybe_data = self._request(self._client.paper_data, paper_id)
+        if isinstance(maybe_data, Error):
+            return maybe_data
+        try:
+            with self._metrics.timer("parse"):
+                data = PaperData(**dataclasses.asdict(maybe_data))
+            with self._metrics.timer("to_cached_data"):
+                cached_data = self.to_cached_data(data)
+            self._metrics.incr("bytes_fetched", estimate_size(cached_data))
+            return cached_data
+        except Exception as err:
+            self._metrics.incr("errors")
+            return Error(message=str(err), error="exception")
+
+    def _fetch_details(self, paper_ids: list[str]) -> dict[str, Optional[PaperEntry]] | Error:
+        """Fetch only the light fields of :code:`paper_ids` in one request
+
+        Uses the :code:`paper_batch` endpoint of the client. Papers which
+        don't exist are :code:`None`. Error responses are turned into
+        :class:`Error` inside the request, so that throttled batches are
+        retried and reported to the :attr:`rate_limiter`.
+
+        The abstracts are requested as well and written to the
+        :class:`BlobStore`, so that showing them doesn't fetch the full data.
+
+        Args:
+            paper_ids: List of paper IDs
+
+        """
+        def paper_batch(paper_ids: list[str], fields: list[str]) -> list | Error:
+            result = self._client.paper_batch(paper_ids, fields)
+            if isinstance(result, dict):
+                return Error(message=str(result.get("message") or result.get("error") or result),
+                             error=str(result.get("code", "batch")))
+            return result
+
+        result = self._request(paper_batch, paper_ids, [*self._light_fields, "abstract"])
+        if isinstance(result, Error):
+            return result
+        self._abstracts.put_many((paper_id, x["abstract"])
+                                 for paper_id, x in zip(paper_ids, result)
+                                 if x and x.get("abstract") is not None)
+        return {paper_id: (PaperEntry(**{k: x.get(k) for k in self._light_fields})
+                           if x else None)
+                for paper_id, x in zip(paper_ids, result)}
+
+    def _failure_kind(self, error: Error) -> FailureKind:
+        text = f"{error.message} {error.error}".lower()
+        if "not found" in text:
+            return FailureKind.not_found
+        return FailureKind.transient
+
+    def _record_failure(self, key: int, error: Error):
+        """Add paper :code:`key` to the negative cache.
+
+        Papers which are not found are persisted in the store and never
+        requested again. Transient failures expire after :code:`failure_ttl`
+        which is doubled on each consecutive failure up to :code:`max_failure_ttl`.
+
+        Args:
+            key: The interned paper ID
+            error: The error from the client
+
+        """
+        kind = self._failure_kind(error)
+        with self._failures_lock:
+            previous = self._failures.get(key)
+            if kind == FailureKind.not_found:
+                failure = FailedLookup(kind, error.message)
+                self._store.put_failure(self._ids.lookup(key), kind.value,
+                                        error.message, time.time())
+            else:
+                attempts = previous.attempts + 1 if previous else 1
+                ttl = min(self._failure_ttl * 2 ** (attempts - 1), self._max_failure_ttl)
+                failure = FailedLookup(kind, error.message, attempts, time.time() + ttl)
+            self._failures[key] = failure
+
+    def _clear_failure(self, key: int):
+        """Remove paper :code:`key` from the negative cache after it was fetched
+
+        A persisted :code:`not_found` failure is removed from the store as well.
+
+        """
+        with self._failures_lock:
+            failure = self._failures.pop(key, None)
+        if failure is not None and failure.kind == FailureKind.not_found:
+            self._store.remove_failure(self._ids.lookup(key))
+
+    def get_failure(self, paper_id: str | int) -> Optional[FailedLookup]:
+        """Return the :class:`FailedLookup` for :code:`paper_id` if it's in the negative cache
+
+        Args:
+            paper_id: The paper ID
+
+        """
+        return self._failures.get(self._key(paper_id))
+
+    @property
+    def duplicates_avoided(self) -> int:
+        """Number of fetches avoided by waiting on an in-flight fetch of the same paper"""
+        return self._duplicates_avoided
+
+    def _fetch_and_store(self, key: int) -> Optional[CachePaperData]:
+        failure = self._failures.get(key)
+        if failure and not failure.expired:
+            return None
+        data = self._fetch_paper(self._ids.lookup(key))
+        if isinstance(data, Error):
+            self._record_failure(key, data)
+            return None
+        self._clear_failure(key)
+        return self._store_cached_data(key, data)
+
+    def _fetch_single_flight(self, key: int) -> Optional[CachePaperData]:
+        """Fetch paper :code:`key` unless it's already being fetched.
+
+        Concurrent callers for the same paper wait on the :class:`Future` of
+        the first caller instead of fetching it again.
+
+        Args:
+            key: The interned paper ID
+
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._duplicates_avoided += 1
+                owner = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+        if not owner:
+            return future.result()
+        try:
+            if key in self._heavy:
+                data = self._heavy.get(key)
+            else:
+                data = self._fetch_and_store(key)
+            future.set_result(data)
+            return data
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def get_paper_data(self, paper_id: str | int) -> Optional[CachePaperData]:
+        key = self._key(paper_id)
+        start = time.perf_counter()
+        data = self._get_cached(key)
+        if data is PaperCache._missing:
+            self._metrics.incr("misses")
+            data = self._fetch_single_flight(key)
+        else:
+            self._metrics.incr("hits")
+            self._metrics.observe("cache_hit", time.perf_counter() - start)
+        return data
+
+    def get_papers_data(self, paper_ids: list[str | int],
+                        priority: Priority = Priority.interactive,
+                        token: Optional[CancelToken] = None) -> list[Optional[CachePaperData]]:
+        """Get data for many papers at once.
+
+        Papers not in the cache are fetched concurrently on the
+        :attr:`scheduler` so that the total latency is about that of the
+        slowest fetch.
+
+        Args:
+            paper_ids: List of paper IDs
+            priority: :class:`Priority` of the fetches
+            token: Optional :class:`CancelToken` to cancel the fetches with
+
+        Returns the data in the same order as :code:`paper_ids`. Papers whose
+        fetch was cancelled are :code:`None`.
+
+        """
+        keys = [self._key(x) for x in paper_ids]
+        missing = [x for x in dict.fromkeys(keys) if x not in self._heavy]
+        futures = {x: self._scheduler.submit(self.get_paper_data, x,
+                                             priority=priority, token=token)
+                   for x in missing}
+        fetched = {}
+        for key, future in futures.items():
+            try:
+                fetched[key] = future.result()
+            except CancelledError:
+                fetched[key] = None
+        return [fetched[x] if x in fetched else self.get_paper_data(x) for x in keys]
+
+    def get_papers_details(self, paper_ids: list[str | int],
+                           priority: Priority = Priority.interactive,
+                           token: Optional[CancelToken] = None,
+                           batch_size: int = 500) -> list[Optional[PaperEntry]]:
+        """Get the light display records of many papers.
+
+        Unlike :meth:`get_papers_data` the abstract, references and citations
+        of the papers are not fetched. Papers which are not cached are
+        requested in batches of :code:`batch_size` with the
+        :code:`paper_batch` endpoint of the client, e.g.,
+        :class:`~citemap.client.Client`. Only their light records and
+        abstracts are cached, so a later :meth:`get_paper_data` still fetches
+        the full data but :meth:`get_abstract` doesn't.
+
+        If the client doesn't have a batch endpoint, the full data is fetched.
+
+        Args:
+            paper_ids: List of paper IDs
+            priority: :class:`Priority` of the requests
+            token: Optional :class:`CancelToken` to cancel the requests with
+            batch_size: Maximum papers in a request
+
+        Returns the :class:`PaperEntry` records in the same order as
+        :code:`paper_ids`. Papers which couldn't be fetched are :code:`None`.
+
+        """
+        keys = [self._key(x) for x in paper_ids]
+        result: dict[int, Optional[PaperEntry]] = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            data = self._cache.get(key, PaperCache._missing)
+            if data is PaperCache._missing:
+                data = self._get_cached(key)
+                if data is not PaperCache._missing:
+                    data = self.to_light_data(data)  # type: ignore
+            failure = self._failures.get(key)
+            if data is not PaperCache._missing:
+                result[key] = data
+            elif failure and not failure.expired:
+                result[key] = None
+            else:
+                missing.append(key)
+        if not hasattr(self._client, "paper_batch"):
+            fetched = self.get_papers_data(missing, priority, token)  # type: ignore
+            result.update({key: data and self.to_light_data(data)
+                           for key, data in zip(missing, fetched)})
+            return [result[x] for x in keys]
+        futures = {}
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i+batch_size]
+            futures[self._scheduler.submit(self._fetch_details, self._ids.lookup_many(batch),
+                                           priority=priority, token=token)] = batch
+        for future, batch in futures.items():
+            try:
+                details = future.result()
+            except CancelledError:
+                details = {}
+            if isinstance(details, Error):
+                print(f"Got error for batch of {len(batch)} papers\n{details}")
+                details = {}
+            for key in batch:
+                entry = details.get(self._ids.lookup(key))
+                if entry is not None:
+                    entry = self.to_light_data(entry)
+                    self._cache[key] = entry
+                    self._clear_failure(key)
+                elif self._ids.lookup(key) in details:
+                    self._record_failure(key, Error(message="Not found"))
+                result[key] = entry
+        return [result[x] for x in keys]
+
+    def fetched_at(self, paper_id: str | int) -> Optional[float]:
+        """Time at which :code:`paper_id` was fetched. :code:`0` if it's not known"""
+        return self._store.fetched_at(self._ids.lookup(self._key(paper_id)))
+
+    def _refresh_paper(self, key: int) -> bool:
+        data = self._fetch_paper(self._ids.lookup(key))
+        if isinstance(data, Error):
+            return False
+        self._clear_failure(key)
+        self._store_cached_data(key, data)
+        return True
+
+    def refresh(self, max_age: Optional[float] = None,
+                paper_ids: Optional[list[str | int]] = None,
+                num_workers: int = 2, limit: Optional[int] = None,
+                token: Optional[CancelToken] = None) -> Future:
+        """Fetch stale papers again and update them in place in the cache
+
+        The papers fetched more than :code:`max_age` seconds ago, or with an
+        unknown fetch time, are refreshed from the oldest, along with
+        :code:`paper_ids`, e.g., the papers shown in the scene, which are
+        refreshed first. It runs in a background thread and at most
+        :code:`num_workers` fetches are queued as :code:`bulk` jobs on the
+        :attr:`scheduler` at a time. Papers which fail to refresh keep their
+        existing data.
+
+        Args:
+            max_age: Refresh papers older than these many seconds
+            paper_ids: Papers to refresh regardless of their age
+            num_workers: Maximum concurrent fetches
+            limit: Maximum number of stale papers to refresh
+            token: Optional :class:`CancelToken` to stop the refresh with
+
+        Returns a :class:`Future` with the number of papers refreshed.
+
+        """
+        keys = [self._key(x) for x in paper_ids or []]
+        if max_age is not None:
+            keys.extend(self._ids.intern_many(self._store.stale(time.time() - max_age, limit)))
+        keys = [*dict.fromkeys(keys)]
+        token = token or CancelToken()
+        result: Future = Future()
+
+        def run():
+            refreshed = 0
+            pending: set[Future] = set()
             try:
-                with _timer:
-                    maybe_data = self._client.paper_data(paper_id)
-                    data = PaperData(**dataclasses.asdict(maybe_data))
-                print(f"Fetched paper with {paper_id} in {_timer.time} seconds")
-                self._cache[paper_id] = self.to_cached_data(data)
-                return self._cache[paper_id]
-            except Exception:
-                if isinstance(maybe_data, Error):
-                    print(f"Got error for {paper_id}\n{maybe_data}")
-                self._cache[paper_id] = None
-        return self._cache[paper_id]
+                for key in keys:
+                    if token.cancelled:
+                        break
+                    if len(pending) >= num_workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        refreshed += sum(not x.cancelled() and x.result() for x in done)
+                    pending.add(self._scheduler.submit(self._refresh_paper, key,
+                                                       priority=Priority.bulk, token=token))
+                done, _ = wait(pending)
+                refreshed += sum(not x.cancelled() and x.result() for x in done)
+                result.set_result(refreshed)
+            except BaseException as err:
+                result.set_exception(err)
+
+        threading.Thread(target=run, daemon=True, name="refresh").start()
+        return result
 
     def parse_data(self, data):
         entry = {}
@@ -180,47 +1045,141 @@ class S2:
                 text.append(f"{k.capitalize()}: {filled}")
         return "\n".join(text)
 
+    def _get_linked_paper_id(self, paper, key: str) -> str:
+        # Newer versions of :mod:`s2cache` give dataclasses instead of dicts
+        if isinstance(paper, dict):
+            return paper[key]['paperId']
+        return getattr(paper, key).paperId
+
+    def _get_linked_paper_score(self, paper, key: str) -> Optional[int]:
+        linked = paper[key] if isinstance(paper, dict) else getattr(paper, key)
+        if isinstance(linked, dict):
+            return linked.get(self._rank_by)
+        return getattr(linked, self._rank_by, None)
+
     def get_citations_from_paper_data(self, paper_data: PaperData):
-        return [paper['citingPaper']['paperId']
+        return [self._get_linked_paper_id(paper, 'citingPaper')
                 for paper in paper_data.citations.data]
 
     def get_references_from_paper_data(self, paper_data: PaperData):
-        return [paper['citedPaper']['paperId']
+        return [self._get_linked_paper_id(paper, 'citedPaper')
                 for paper in paper_data.references.data]
 
-    def load_or_build_citation_cache(self, force: bool = False):
+    def _print_build_progress(self, done: int, total: int, start: float):
+        elapsed = time.time() - start
+        rate = done / elapsed if elapsed else 0
+        eta = (total - done) / rate if rate else float("inf")
+        print(f"{done} out of {total} done. {rate:.2f} papers/s, ETA {eta:.0f} seconds")
+
+    def load_or_build_citation_cache(self, force: bool = False,
+                                     num_workers: Optional[int] = None,
+                                     checkpoint_every: int = 100,
+                                     background: bool = False):
         """Build a cache of citation data.
 
         The data is fetched from :class:`SemanticScholar` and only
         the :code:`paperId`s of references and citations are stored
         in this cache.
 
+        The cache is kept in a :class:`PaperStore` in :code:`data_dir` and
+        papers are read from it lazily when requested. An existing JSON
+        :code:`cache` file from earlier versions is imported into the store
+        the first time. The JSON file is read incrementally with
+        :class:`JsonCache`, and with :code:`background` the import runs in a
+        separate thread. Papers are served from the JSON file while the
+        import is in progress.
+
+        Papers are fetched as :code:`bulk` jobs on the :attr:`scheduler` with
+        at most :code:`num_workers` at a time and written to
+        the store every :code:`checkpoint_every` papers. An interrupted build
+        resumes from where it stopped and skips the papers already stored.
+        Papers which fail with transient errors are queued once more after the
+        others, and if any of them still fail the build isn't marked complete
+        so that they're fetched again the next time.
+
+        The :class:`CitationGraph` index is built after the import or the
+        build, or if it's missing for a complete cache.
+
         Args:
             force: Update or force rebuild the cache
+            num_workers: Number of concurrent fetches. Can't be more than :code:`max_workers`
+            checkpoint_every: Write to the store after these many papers
+            background: Import the JSON cache in a background thread
 
 
         """
-        cache_file = self._data_dir.joinpath("cache")
-        if cache_file.exists():
-            with open(cache_file) as f:
-                cache = json.load(f)
-            for k, v in cache.items():
-                self._cache[k] = CachePaperData(**v)
+        json_cache_file = self._data_dir.joinpath("cache")
+        if not force and self._store.get_meta("build_complete"):
+            if self.graph is None:
+                self.build_graph_index()
+            return
+        if not force and json_cache_file.exists() and not self._store.get_meta("json_imported"):
+            self._json_cache = JsonCache(json_cache_file)
+            if background:
+                self._json_import_thread = threading.Thread(target=self._import_json_cache,
+                                                            daemon=True)
+                self._json_import_thread.start()
+            else:
+                self._import_json_cache()
+            return
         else:
-            print("Cache not found. Building")
+            print("Cache not found or incomplete. Building")
             paper_ids = self._client.all_papers
-            for i, paper_id in enumerate(paper_ids):
-                try:
-                    maybe_data = self._client.paper_data(paper_id)
-                    data = PaperData(**dataclasses.asdict(maybe_data))
-                except Exception:
-                    if isinstance(maybe_data, Error):
-                        print(f"Got error for {paper_id}\n{maybe_data}")
-                        continue
-                self._cache[paper_id] = self.to_cached_data(data)
-                print(f"{i} out of {len(paper_ids)} done")
-        with open(self._data_dir.joinpath("cache"), "w") as f:
-            dump_json(self._cache, f)
+            if not force:
+                existing = set(self._store.keys())
+                paper_ids = [x for x in paper_ids if x not in existing and not
+                             ((failure := self.get_failure(x)) and
+                              failure.kind == FailureKind.not_found)]
+            total = len(paper_ids)
+            done = 0
+            pending: list[tuple[str, CachePaperData]] = []
+            start = time.time()
+            bulk_limit = self._scheduler.limit(Priority.bulk)
+            if num_workers:
+                self._scheduler.set_limit(Priority.bulk, num_workers)
+            token = CancelToken()
+            failed = paper_ids
+            try:
+                # Papers with transient failures are queued once more at the end
+                for requeued in (False, True):
+                    futures = {self._scheduler.submit(self._fetch_paper, x,
+                                                      priority=Priority.bulk, token=token): x
+                               for x in failed}
+                    failed = []
+                    for future in as_completed(futures):
+                        data = future.result()
+                        key = self._ids.intern(futures[future])
+                        if isinstance(data, Error):
+                            self._record_failure(key, data)
+                            if self._failures[key].kind == FailureKind.transient:
+                                failed.append(futures[future])
+                                if not requeued:
+                                    continue
+                        else:
+                            self._clear_failure(key)
+                            pending.append((futures[future], data))
+                        done += 1
+                        if done % checkpoint_every == 0:
+                            self._put_many(pending)
+                            pending = []
+                            self._print_build_progress(done, total, start)
+                    if not failed:
+                        break
+            except KeyboardInterrupt:
+                print("Interrupted. Saving fetched papers", file=sys.stderr)
+                raise
+            finally:
+                self._scheduler.cancel(token)
+                self._scheduler.set_limit(Priority.bulk, bulk_limit)
+                self._put_many(pending)
+            self._print_build_progress(done, total, start)
+            if failed:
+                print(f"{len(failed)} papers failed with transient errors. "
+                      "They'll be fetched again on the next build")
+                self.build_graph_index()
+                return
+        self._store.set_meta("build_complete", "1")
+        self.build_graph_index()
 
     # def get_metadata(self, paper_id: str):
     #     if paper_id not in self._cache:
@@ -0,0 +1,300 @@
+from typing import Optional, Iterable, Iterator
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+from .util import Pathlike
+from .jsoncache import JsonCache
+
+
+class PaperStore:
+    """A persistent keyed store for paper data backed by SQLite.
+
+    One row is stored per :code:`paperId` with the data serialized as JSON
+    and the time at which it was fetched. The database is opened in WAL mode
+    so that reads don't block the incremental writes made while fetching
+    papers.
+
+    Args:
+        db_file: Path to the SQLite database file
+
+    """
+
+    def __init__(self, db_file: Pathlike):
+        self._db_file = Path(db_file)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self._db_file, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS papers "
+                               "(paperId TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                               "fetched_at REAL NOT NULL DEFAULT 0)")
+            columns = [x[1] for x in self._conn.execute("PRAGMA table_info(papers)")]
+            if "fetched_at" not in columns:
+                self._conn.execute("ALTER TABLE papers ADD COLUMN "
+                                   "fetched_at REAL NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS papers_fetched_at "
+                               "ON papers (fetched_at)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta "
+                               "(key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS failures "
+                               "(paperId TEXT PRIMARY KEY, kind TEXT NOT NULL, "
+                               "message TEXT NOT NULL, failed_at REAL NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS top_neighbours "
+                               "(paperId TEXT NOT NULL, kind TEXT NOT NULL, data TEXT NOT NULL, "
+                               "PRIMARY KEY (paperId, kind))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS ids "
+                               "(key INTEGER PRIMARY KEY, paperId TEXT UNIQUE NOT NULL)")
+            self._conn.commit()
+
+    @property
+    def db_file(self) -> Path:
+        return self._db_file
+
+    def __contains__(self, paper_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("SELECT 1 FROM papers WHERE paperId = ?",
+                                        (paper_id,))
+            return cursor.fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def keys(self) -> Iterator[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT paperId FROM papers").fetchall()
+        return (x[0] for x in rows)
+
+    def items(self, batch_size: int = 1000) -> Iterator[tuple[str, dict]]:
+        """Iterate over all the papers in the store
+
+        The rows are read :code:`batch_size` at a time so that the whole
+        store is never held in memory.
+
+        Args:
+            batch_size: Number of rows to read at a time
+
+        """
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute("SELECT rowid, paperId, data FROM papers "
+                                          "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                          (last_rowid, batch_size)).fetchall()
+            if not rows:
+                return
+            for rowid, paper_id, data in rows:
+                yield paper_id, json.loads(data)
+            last_rowid = rows[-1][0]
+
+    def get(self, paper_id: str) -> Optional[dict]:
+        """Get the data for :code:`paper_id` if it's in the store
+
+        Args:
+            paper_id: The paper ID
+
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM papers WHERE paperId = ?",
+                                     (paper_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, paper_id: str, data: dict):
+        """Insert or replace the data for :code:`paper_id`
+
+        Args:
+            paper_id: The paper ID
+            data: A JSON serializable dictionary
+
+        """
+        self.put_many([(paper_id, data)])
+
+    def put_many(self, items: Iterable[tuple[str, dict]], fetched_at: Optional[float] = None,
+                 replace: bool = True):
+        """Insert or replace data for many papers in a single transaction
+
+        Args:
+            items: Iterable of :code:`(paper_id, data)` tuples
+            fetched_at: Time at which the data was fetched. Defaults to now.
+                        :code:`0` means unknown
+            replace: Replace papers which are already in the store
+
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        rows = [(k, json.dumps(v), fetched_at) for k, v in items]
+        conflict = "REPLACE" if replace else "IGNORE"
+        with self._lock:
+            self._conn.executemany(f"INSERT OR {conflict} INTO papers (paperId, data, fetched_at) "
+                                   "VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def fetched_at(self, paper_id: str) -> Optional[float]:
+        """Return the time at which :code:`paper_id` was fetched if it's in the store"""
+        with self._lock:
+            row = self._conn.execute("SELECT fetched_at FROM papers WHERE paperId = ?",
+                                     (paper_id,)).fetchone()
+        return row[0] if row else None
+
+    def stale(self, before: float, limit: Optional[int] = None) -> list[str]:
+        """Return the papers fetched before :code:`before` from the oldest
+
+        Args:
+            before: A UNIX timestamp
+            limit: Maximum number of papers to return
+
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT paperId FROM papers WHERE fetched_at < ? "
+                                      "ORDER BY fetched_at LIMIT ?",
+                                      (before, -1 if limit is None else limit)).fetchall()
+        return [x[0] for x in rows]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                               (key, value))
+            self._conn.commit()
+
+    def put_failure(self, paper_id: str, kind: str, message: str, failed_at: float):
+        """Record a failed lookup for :code:`paper_id`
+
+        Args:
+            paper_id: The paper ID
+            kind: The kind of failure
+            message: The error message
+            failed_at: Time of failure as a UNIX timestamp
+
+        """
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO failures "
+                               "(paperId, kind, message, failed_at) VALUES (?, ?, ?, ?)",
+                               (paper_id, kind, message, failed_at))
+            self._conn.commit()
+
+    def remove_failure(self, paper_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM failures WHERE paperId = ?", (paper_id,))
+            self._conn.commit()
+
+    def failures(self) -> list[tuple[str, str, str, float]]:
+        """Return all the recorded failures as :code:`(paper_id, kind, message, failed_at)`"""
+        with self._lock:
+            return self._conn.execute("SELECT paperId, kind, message, failed_at "
+                                      "FROM failures").fetchall()
+
+    def put_top_neighbours(self, items: Iterable[tuple[str, str, list[tuple[int, str]]]]):
+        """Insert or replace the top neighbours of papers
+
+        Args:
+            items: Iterable of :code:`(paper_id, kind, [(score, neighbour_id), ...])`
+
+        """
+        rows = [(paper_id, kind, json.dumps(scored)) for paper_id, kind, scored in items]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO top_neighbours "
+                                   "(paperId, kind, data) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def get_top_neighbours(self, paper_ids: list[str], kind: str,
+                           batch_size: int = 500) -> dict[str, list[tuple[int, str]]]:
+        """Get the top neighbours of :code:`kind` for the papers which have them
+
+        Args:
+            paper_ids: List of paper IDs
+            kind: :code:`citations` or :code:`references`
+            batch_size: Number of papers to query at a time
+
+        """
+        result = {}
+        for i in range(0, len(paper_ids), batch_size):
+            batch = paper_ids[i:i+batch_size]
+            query = ("SELECT paperId, data FROM top_neighbours WHERE kind = ? AND "
+                     f"paperId IN ({', '.join('?' * len(batch))})")
+            with self._lock:
+                rows = self._conn.execute(query, (kind, *batch)).fetchall()
+            result.update((paper_id, [tuple(x) for x in json.loads(data)])
+                          for paper_id, data in rows)
+        return result
+
+    def intern_ids(self, paper_ids: list[str], create: bool = True,
+                   batch_size: int = 500) -> dict[str, int]:
+        """Return the persistent :code:`int` keys of :code:`paper_ids`
+
+        Used by :class:`~citemap.interner.PaperIds` for the IDs which aren't in memory.
+
+        Args:
+            paper_ids: List of paper IDs
+            create: Add the paper IDs which don't have a key yet
+            batch_size: Number of papers to query at a time
+
+        """
+        result = {}
+        with self._lock:
+            if create:
+                self._conn.executemany("INSERT OR IGNORE INTO ids (paperId) VALUES (?)",
+                                       ((x,) for x in paper_ids))
+                self._conn.commit()
+            for i in range(0, len(paper_ids), batch_size):
+                batch = paper_ids[i:i+batch_size]
+                query = ("SELECT paperId, key FROM ids WHERE "
+                         f"paperId IN ({', '.join('?' * len(batch))})")
+                result.update(self._conn.execute(query, batch).fetchall())
+        return result
+
+    def lookup_ids(self, keys: list[int], batch_size: int = 500) -> dict[int, str]:
+        """Inverse of :meth:`intern_ids`
+
+        Args:
+            keys: List of keys
+            batch_size: Number of keys to query at a time
+
+        """
+        result = {}
+        with self._lock:
+            for i in range(0, len(keys), batch_size):
+                batch = keys[i:i+batch_size]
+                query = f"SELECT key, paperId FROM ids WHERE key IN ({', '.join('?' * len(batch))})"
+                result.update(self._conn.execute(query, batch).fetchall())
+        return result
+
+    def import_json(self, json_cache: JsonCache | Pathlike, batch_size: int = 1000) -> int:
+        """Import an existing JSON cache file into the store.
+
+        The file is the :code:`dict` of :code:`paperId` to paper data as was
+        written by :meth:`S2.load_or_build_citation_cache`. It's read
+        incrementally with :class:`JsonCache` and written :code:`batch_size`
+        records at a time. Papers which are already in the store, e.g., those
+        fetched while the import is running, are kept.
+
+        Args:
+            json_cache: The JSON cache file or a :class:`JsonCache` for it
+            batch_size: Number of records to write in one transaction
+
+        Returns the number of papers imported.
+
+        """
+        if not isinstance(json_cache, JsonCache):
+            json_cache = JsonCache(json_cache)
+        num_papers = 0
+        batch = []
+        for item in json_cache.items():
+            batch.append(item)
+            if len(batch) == batch_size:
+                self.put_many(batch, fetched_at=0, replace=False)
+                num_papers += len(batch)
+                batch = []
+        self.put_many(batch, fetched_at=0, replace=False)
+        return num_papers + len(batch)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
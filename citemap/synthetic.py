@@ -0,0 +1,301 @@
+from typing import Iterator
+import sys
+import json
+import math
+import random
+import hashlib
+import argparse
+from array import array
+from pathlib import Path
+
+from .util import Pathlike
+from .replay import ReplayClient
+
+
+_syllables = ["ka", "ri", "mo", "len", "sa", "to", "vi", "nar", "pe", "lu", "gra", "di",
+              "em", "os", "tri", "ph", "qu", "an", "el", "con", "ver", "ti", "ma", "ne",
+              "ro", "xi", "ba", "cu", "ly", "fo", "ges", "ham"]
+
+
+def _make_words(rng: random.Random, num_words: int, max_syllables: int = 4) -> list[str]:
+    words = set()
+    while len(words) < num_words:
+        words.add("".join(rng.choices(_syllables, k=rng.randint(1, max_syllables))))
+    return sorted(words)
+
+
+def _zipf_weights(n: int, s: float = 1.0) -> list[float]:
+    """Cumulative Zipf weights for :func:`random.choices`"""
+    weights = []
+    total = 0.0
+    for i in range(n):
+        total += 1 / (i + 1) ** s
+        weights.append(total)
+    return weights
+
+
+def _clip(x: float, low: int, high: int) -> int:
+    return max(low, min(high, int(x)))
+
+
+class SyntheticCorpus:
+    """A reproducible synthetic citation graph for benchmarks at scale.
+
+    Papers are numbered in order of publication and each paper references
+    earlier ones. As in Price's model, a reference goes to a uniformly random
+    earlier paper with probability :code:`uniform_fraction` and otherwise to
+    the cited paper of a random earlier reference, so that papers are cited
+    in proportion to how often they already are and citation counts follow a
+    power law. The number of references of a paper is log-normal with mean
+    :code:`mean_references` and the number of papers published each year
+    grows exponentially from :code:`start_year` to :code:`end_year`.
+
+    Only the graph is held in memory, in flat :class:`array` s of indices.
+    Titles, authors, venues and abstracts are generated from the seed and
+    the index of a paper when it's requested, so a paper always gets the
+    same text. Citations and references carry only the ID, year and counts
+    of the linked paper, which is all that :class:`~citemap.ss.S2` reads from
+    them.
+
+    Args:
+        num_papers: Number of papers
+        seed: Seed for the random number generator
+        mean_references: Mean number of references of a paper
+        uniform_fraction: Fraction of references to uniformly random papers
+        start_year: Year of the first paper
+        end_year: Year of the last paper
+        abstract_fraction: Fraction of papers which have an abstract
+
+
+    """
+
+    def __init__(self, num_papers: int, seed: int = 0, mean_references: float = 15,
+                 uniform_fraction: float = 0.2, start_year: int = 1970,
+                 end_year: int = 2024, abstract_fraction: float = 0.85):
+        self.num_papers = num_papers
+        self.seed = seed
+        self.mean_references = mean_references
+        self.uniform_fraction = uniform_fraction
+        self.start_year = start_year
+        self.end_year = end_year
+        self.abstract_fraction = abstract_fraction
+        rng = random.Random(seed)
+        self._vocab = _make_words(rng, 5000)
+        self._vocab_weights = _zipf_weights(len(self._vocab))
+        self._first_names = [x.capitalize() for x in _make_words(rng, 300, 3)]
+        self._last_names = [x.capitalize() for x in _make_words(rng, 1000, 4)]
+        self._venues = [" ".join(x.capitalize() for x in rng.choices(self._vocab[:500], k=3))
+                        for _ in range(300)]
+        self._num_authors = max(10, num_papers // 2)
+        self._ref_offsets, self._refs = self._build_references(rng)
+        self._cite_offsets, self._cites = self._build_citations()
+
+    def _build_references(self, rng: random.Random) -> tuple[array, array]:
+        sigma = 0.8
+        mu = math.log(self.mean_references) - sigma ** 2 / 2
+        offsets = array("q", [0])
+        refs = array("i")
+        for i in range(self.num_papers):
+            num_refs = min(i, int(rng.lognormvariate(mu, sigma)))
+            chosen: set[int] = set()
+            tries = 0
+            while len(chosen) < num_refs and tries < 4 * num_refs:
+                if not refs or rng.random() < self.uniform_fraction:
+                    chosen.add(int(rng.random() * i))
+                else:
+                    chosen.add(refs[int(rng.random() * len(refs))])
+                tries += 1
+            refs.extend(sorted(chosen))
+            offsets.append(len(refs))
+        return offsets, refs
+
+    def _build_citations(self) -> tuple[array, array]:
+        counts = array("q", [0]) * (self.num_papers + 1)
+        for j in self._refs:
+            counts[j + 1] += 1
+        for i in range(self.num_papers):
+            counts[i + 1] += counts[i]
+        offsets = array("q", counts)
+        cites = array("i", [0]) * len(self._refs)
+        for i in range(self.num_papers):
+            for j in self.references(i):
+                cites[counts[j]] = i
+                counts[j] += 1
+        return offsets, cites
+
+    def __len__(self) -> int:
+        return self.num_papers
+
+    @property
+    def num_citations(self) -> int:
+        return len(self._refs)
+
+    def paper_id(self, i: int) -> str:
+        """A 40 character hex ID like those of Semantic Scholar"""
+        return hashlib.sha1(f"{self.seed}:{i}".encode()).hexdigest()
+
+    @property
+    def paper_ids(self) -> Iterator[str]:
+        return (self.paper_id(i) for i in range(self.num_papers))
+
+    def references(self, i: int) -> array:
+        return self._refs[self._ref_offsets[i]:self._ref_offsets[i + 1]]
+
+    def citations(self, i: int) -> array:
+        return self._cites[self._cite_offsets[i]:self._cite_offsets[i + 1]]
+
+    def year(self, i: int) -> int:
+        """Year of paper :code:`i` when publications grow by 5% a year"""
+        span = self.end_year - self.start_year
+        growth = 0.05
+        t = math.log(1 + i / self.num_papers * (math.exp(growth * span) - 1)) / growth
+        return min(self.end_year, self.start_year + int(t))
+
+    def _words(self, rng: random.Random, mean: float, std: float,
+               low: int, high: int) -> list[str]:
+        return rng.choices(self._vocab, cum_weights=self._vocab_weights,
+                           k=_clip(rng.gauss(mean, std), low, high))
+
+    def details(self, i: int) -> dict:
+        """Details of paper :code:`i` in the format of :class:`PaperDetails`"""
+        paper_id = self.paper_id(i)
+        rng = random.Random(int(paper_id[:16], 16))
+        title = " ".join(self._words(rng, 10, 3, 3, 25)).capitalize()
+        authors = []
+        for _ in range(_clip(1 + rng.expovariate(1 / 3), 1, 50)):
+            k = int(rng.random() ** 3 * self._num_authors)
+            authors.append({"authorId": str(k),
+                            "name": f"{self._first_names[k % len(self._first_names)]} "
+                            f"{self._last_names[k % len(self._last_names)]}"})
+        abstract = None
+        if rng.random() < self.abstract_fraction:
+            abstract = " ".join(self._words(rng, 170, 60, 40, 400)).capitalize() + "."
+        num_citations = self._cite_offsets[i + 1] - self._cite_offsets[i]
+        return {"paperId": paper_id,
+                "corpusId": i,
+                "url": f"https://www.semanticscholar.org/paper/{paper_id}",
+                "title": title,
+                "authors": authors,
+                "abstract": abstract,
+                "venue": self._venues[int(rng.random() ** 2 * len(self._venues))],
+                "year": str(self.year(i)),
+                "referenceCount": self._ref_offsets[i + 1] - self._ref_offsets[i],
+                "citationCount": num_citations,
+                "influentialCitationCount": int(num_citations * rng.random() * 0.2)}
+
+    def _linked(self, j: int) -> dict:
+        num_citations = self._cite_offsets[j + 1] - self._cite_offsets[j]
+        return {"paperId": self.paper_id(j), "corpusId": j, "url": "", "title": "",
+                "authors": [], "abstract": None, "venue": "", "year": str(self.year(j)),
+                "citationCount": num_citations,
+                "influentialCitationCount": num_citations // 10}
+
+    def paper_data(self, i: int) -> dict:
+        """Data of paper :code:`i` in the format of :class:`PaperData`"""
+        return {"details": self.details(i),
+                "references": {"offset": 0, "next": None,
+                               "data": [{"citedPaper": self._linked(j)}
+                                        for j in self.references(i)]},
+                "citations": {"offset": 0, "next": None,
+                              "data": [{"citingPaper": self._linked(j)}
+                                       for j in self.citations(i)]}}
+
+    def cache_record(self, i: int) -> dict:
+        """Data of paper :code:`i` in the format of :class:`~citemap.ss.CachePaperData`
+
+        References and citations are paper IDs as in the JSON cache.
+
+        """
+        details = self.details(i)
+        return {"paperId": details["paperId"],
+                "title": details["title"],
+                "authors": details["authors"],
+                "venue": details["venue"],
+                "year": details["year"],
+                "abstract": details["abstract"],
+                "citationCount": details["citationCount"],
+                "influentialCitationCount": details["influentialCitationCount"],
+                "references": [self.paper_id(j) for j in self.references(i)],
+                "citations": [self.paper_id(j) for j in self.citations(i)]}
+
+    def write_replay(self, data_dir: Pathlike) -> ReplayClient:
+        """Write the responses for all the papers and return a :class:`ReplayClient` for them
+
+        Args:
+            data_dir: Directory of the recording. An existing recording is overwritten.
+
+        """
+        data_dir = Path(data_dir)
+        if not data_dir.exists():
+            data_dir.mkdir(parents=True)
+        with open(data_dir.joinpath("papers.jsonl"), "w") as f:
+            for i in range(self.num_papers):
+                f.write(f"{self.paper_id(i)}\t{json.dumps(self.paper_data(i))}\n")
+        return ReplayClient(data_dir)
+
+    def write_cache(self, cache_file: Pathlike):
+        """Write all the papers as a JSON cache file
+
+        The file is written one record at a time in the format which
+        :class:`~citemap.ss.S2` imports from :code:`data_dir/cache`.
+
+        Args:
+            cache_file: The cache file
+
+        """
+        with open(cache_file, "w") as f:
+            f.write("{")
+            for i in range(self.num_papers):
+                f.write(f'{"," if i else ""}\n"{self.paper_id(i)}": '
+                        f"{json.dumps(self.cache_record(i))}")
+            f.write("\n}\n")
+
+
+def generate_corpus(data_dir: Pathlike, num_papers: int, seed: int = 0,
+                    replay: bool = True, cache: bool = True,
+                    **kwargs) -> SyntheticCorpus:
+    """Generate a :class:`SyntheticCorpus` and write it to :code:`data_dir`
+
+    The recording for :class:`ReplayClient` is written to
+    :code:`data_dir/replay` and the JSON cache to :code:`data_dir/cache`.
+
+    Args:
+        data_dir: The output directory
+        num_papers: Number of papers
+        seed: Seed for the random number generator
+        replay: Write the recording for :class:`ReplayClient`
+        cache: Write the JSON cache
+        kwargs: Other arguments for :class:`SyntheticCorpus`
+
+    """
+    data_dir = Path(data_dir)
+    if not data_dir.exists():
+        data_dir.mkdir(parents=True)
+    corpus = SyntheticCorpus(num_papers, seed, **kwargs)
+    if replay:
+        corpus.write_replay(data_dir.joinpath("replay"))
+    if cache:
+        corpus.write_cache(data_dir.joinpath("cache"))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic citation corpus")
+    parser.add_argument("data_dir", type=str, help="The output directory")
+    parser.add_argument("--num-papers", "-n", type=int, default=1000, help="Number of papers")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--mean-references", type=float, default=15,
+                        help="Mean number of references of a paper")
+    parser.add_argument("--no-replay", action="store_true",
+                        help="Don't write the recording for the replay client")
+    parser.add_argument("--no-cache", action="store_true", help="Don't write the JSON cache")
+    args = parser.parse_args()
+    corpus = generate_corpus(args.data_dir, args.num_papers, args.seed,
+                             replay=not args.no_replay, cache=not args.no_cache,
+                             mean_references=args.mean_references)
+    print(f"Generated {len(corpus)} papers with {corpus.num_citations} citations",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,11 @@
 import os
 import sys
+import json
 import argparse
 import configparser
 from pathlib import Path
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import (QGraphicsView, QApplication, QMainWindow, QGraphicsScene,
                              QStatusBar, QGridLayout, QAction)
 from PyQt5.QtGui import QKeySequence
@@ -45,6 +46,10 @@ def main():
                         default=str(default_config_dir),
                         help="Load the config file from this directory")
     parser.add_argument("--file", "-f", type=str, default="", help="Open this saved file")
+    parser.add_argument("--metrics", type=int, default=0,
+                        help="Show the fetch metrics in the status bar every these many seconds")
+    parser.add_argument("--dump-metrics", type=str, default="",
+                        help="Write a snapshot of the fetch metrics to this file on exit")
     args = parser.parse_args()
     filename = None
     if os.path.exists(args.file):
@@ -56,7 +61,16 @@ def main():
     config = load_config("config.yaml")
     window = AppWindow(view, "Mind Map", config)
     window.show()
-    sys.exit(app.exec_())
+    scene = view.scene()
+    if args.metrics:
+        timer = QTimer()
+        timer.timeout.connect(scene.show_metrics)
+        timer.start(args.metrics * 1000)
+    status = app.exec_()
+    if args.dump_metrics:
+        with open(args.dump_metrics, "w") as f:
+            json.dump(scene.s2.metrics.snapshot(), f, indent=2)
+    sys.exit(status)
 
 
 if __name__ == '__main__':
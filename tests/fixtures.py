@@ -32,3 +32,50 @@ def s2client():
 @pytest.fixture
 def default_fields():
     return PaperFields()
+
+
+class FakeClient:
+    """A stand-in for :class:`SemanticScholar` which serves a small in memory graph
+
+    Each paper references the next :code:`fanout` papers and is cited by the
+    previous ones. Every call to :meth:`paper_data` sleeps for :code:`latency` seconds.
+
+    """
+    def __init__(self, num_papers=20, fanout=5, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self.ids = [f"{i:040x}" for i in range(num_papers)]
+        self.fanout = fanout
+
+    @property
+    def all_papers(self):
+        return self.ids
+
+    def _details(self, i):
+        return {"paperId": self.ids[i], "title": f"Paper {i}",
+                "authors": [{"authorId": str(i), "name": f"Author {i}"}],
+                "abstract": f"Abstract {i}", "venue": "Venue", "year": "2020",
+                "url": "", "corpusId": i, "citationCount": i,
+                "influentialCitationCount": 0}
+
+    def paper_data(self, ID, force=False):
+        import time
+        from s2cache.models import PaperData, Error
+        self.calls.append(ID)
+        time.sleep(self.latency)
+        if ID not in self.ids:
+            return Error(message="Not found")
+        i = self.ids.index(ID)
+        n = len(self.ids)
+        refs = [{"citedPaper": self._details(j)}
+                for j in range(i + 1, min(n, i + 1 + self.fanout))]
+        cites = [{"citingPaper": self._details(j)}
+                 for j in range(max(0, i - self.fanout), i)]
+        return PaperData(details=self._details(i),
+                         references={"offset": 0, "data": refs},
+                         citations={"offset": 0, "data": cites})
+
+
+@pytest.fixture
+def fake_client():
+    return FakeClient()
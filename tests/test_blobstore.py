@@ -0,0 +1,33 @@
+from citemap import ss
+from citemap.blobs import BlobStore
+
+
+def test_abstracts_in_blob_store(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    for ID in fake_client.ids[:4]:
+        s2.get_paper_data(ID)
+    ID = fake_client.ids[2]
+    assert "abstract" not in s2.store.get(ID)
+    assert s2.get_paper_data(ID).abstract is None
+    blobs = BlobStore(tmp_path.joinpath("abstracts"))
+    assert len(blobs) == 4
+    blobs.put(ID, "Updated abstract")
+    assert blobs.get(ID) == "Updated abstract"
+    blobs.close()
+    fake_client.calls.clear()
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    assert s2.get_abstract(ID) == "Updated abstract"
+    assert s2.get_abstract(fake_client.ids[3]) == "Abstract 3"
+    assert not fake_client.calls
+
+
+def test_empty_abstracts_in_blob_store(tmp_path, fake_client, default_fields, monkeypatch):
+    details = fake_client._details
+    monkeypatch.setattr(fake_client, "_details", lambda i: {**details(i), "abstract": ""})
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    ID = fake_client.ids[2]
+    s2.get_paper_data(ID)
+    fake_client.calls.clear()
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    assert s2.get_abstract(ID) == ""
+    assert not fake_client.calls
@@ -0,0 +1,30 @@
+from citemap.cache import PaperCache
+
+
+def test_lru_eviction_skips_pinned():
+    cache = PaperCache(max_entries=3)
+    cache.pin("a")
+    for key in "abcde":
+        cache[key] = key
+    assert len(cache) == 3 and "a" in cache and "d" in cache and "e" in cache
+    assert cache.get("d") == "d"
+    cache["f"] = "f"
+    assert "e" not in cache and "d" in cache
+    cache.unpin("a")
+    cache["g"] = "g"
+    assert "a" in cache and "d" not in cache
+    assert cache.stats()["evictions"] == 4
+
+
+def test_pinned_keys_count_towards_budget():
+    cache = PaperCache(max_entries=2)
+    cache["a"] = 1
+    cache.pin("a")
+    cache.pin("b")
+    cache["b"] = 2
+    cache["c"] = 3
+    assert "c" not in cache and len(cache) == 2
+    assert cache.pop("a") == 1 and len(cache) == 1
+    cache.unpin("b")
+    cache.unpin("a")
+    assert cache.stats()["pinned"] == 0
@@ -0,0 +1,42 @@
+from citemap import ss
+from citemap.replay import ReplayClient
+
+
+def test_neighbour_cursor(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    ID = fake_client.ids[10]
+    cursor = s2.citations_cursor(ID, page_size=2)
+    assert s2.ids.lookup_many(cursor.next_page()) == fake_client.ids[5:7]
+    assert s2.ids.lookup_many(cursor.next_page(4)) == fake_client.ids[7:10]
+    assert cursor.exhausted
+    assert cursor.next_page() == []
+    assert s2.ids.lookup_many(s2.references_cursor(ID, page_size=2)) == fake_client.ids[11:16]
+    s2.load_or_build_citation_cache()
+    fake_client.calls.clear()
+    assert s2.ids.lookup_many(s2.get_neighbours_page(ID, "references", 1, 2)) ==\
+        fake_client.ids[12:14]
+    assert not fake_client.calls
+
+
+def test_neighbour_cursor_pages_from_client(tmp_path, fake_client, default_fields):
+    recorder = ReplayClient(tmp_path.joinpath("replay"), record_client=fake_client)
+    for ID in fake_client.ids:
+        recorder.paper_data(ID)
+    client = ReplayClient(tmp_path.joinpath("replay"))
+    s2 = ss.S2(client, tmp_path.joinpath("data"), default_fields)
+    ID = fake_client.ids[10]
+    s2.get_paper_data(ID)
+    s2._heavy[s2.ids.get(ID)].citations = s2.get_paper_data(ID).citations[:2]
+    cursor = s2.citations_cursor(ID, page_size=4)
+    assert s2.ids.lookup_many([*cursor]) == fake_client.ids[5:10]
+
+
+def test_neighbour_cursor_skips_ranked(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields, top_k=2)
+    ID = fake_client.ids[10]
+    top = s2.top_neighbours(ID, "citations")
+    cursor = s2.citations_cursor(ID, page_size=2)
+    cursor.skip(top)
+    assert s2.ids.lookup_many(cursor.next_page()) == fake_client.ids[5:7]
+    assert s2.ids.lookup_many(cursor.next_page()) == fake_client.ids[7:8]
+    assert cursor.exhausted
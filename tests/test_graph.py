@@ -0,0 +1,32 @@
+from citemap import ss
+from citemap.graph import CitationGraph
+
+
+def test_build_streams_papers(tmp_path):
+    papers = [("b", ["c", "d"], ["a"]), ("a", ["b"], []), ("c", [], ["b", "e"])]
+    passes = []
+
+    def stream():
+        passes.append(1)
+        return iter(papers)
+
+    graph = CitationGraph.build(stream)
+    assert len(passes) == 2
+    assert len(graph) == 5
+    assert graph.family("b") == (["a"], ["c", "d"])
+    assert graph.family("d") is None
+    graph.save(tmp_path)
+    graph = CitationGraph.load(tmp_path)
+    assert graph.family("c") == (["b", "e"], [])
+    assert "f" not in graph
+
+
+def test_graph_index(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    s2.load_or_build_citation_cache()
+    assert s2.graph is not None
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    for ID in fake_client.ids:
+        data = s2.get_paper_data(ID)
+        assert s2.get_family_from_index(ID) == (data.citations, data.references)
+    assert s2.get_family_from_index("0" * 39 + "z") is None
@@ -0,0 +1,30 @@
+import time
+
+from citemap.metrics import Histogram, Metrics
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for _ in range(99):
+        histogram.observe(0.001)
+    histogram.observe(1.0)
+    assert histogram.count == 100
+    assert 0.001 <= histogram.percentile(50) < 0.002
+    assert histogram.percentile(100) == 1.0
+    assert histogram.summary()["max"] == 1.0
+    assert Histogram().percentile(50) == 0.0
+
+
+def test_metrics_snapshot():
+    metrics = Metrics()
+    with metrics.timer("fetch"):
+        time.sleep(0.01)
+    metrics.incr("hits")
+    metrics.incr("bytes", 100)
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {"hits": 1, "bytes": 100}
+    assert snapshot["latency"]["fetch"]["count"] == 1
+    assert snapshot["latency"]["fetch"]["p50"] >= 0.01
+    assert metrics.latency("parse") is None
+    metrics.reset()
+    assert metrics.snapshot()["counters"] == {}
@@ -0,0 +1,42 @@
+from citemap import ss
+from citemap.replay import ReplayClient
+from citemap.ranking import TopNeighbours
+
+
+def test_top_neighbours(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields, top_k=2)
+    ID = fake_client.ids[10]
+    s2.get_paper_data(ID)
+    assert s2.ids.lookup_many(s2.top_neighbours(ID, "references")) == fake_client.ids[15:13:-1]
+    assert s2.ids.lookup_many(s2.top_neighbours(ID, "citations")) == fake_client.ids[9:7:-1]
+    assert s2.top_neighbours(fake_client.ids[0], "citations") == []
+    fake_client.calls.clear()
+    s2 = ss.S2(fake_client, tmp_path, default_fields, top_k=2)
+    assert s2.ids.lookup_many(s2.top_neighbours(ID, "citations")) == fake_client.ids[9:7:-1]
+    assert not fake_client.calls
+
+
+def test_top_neighbours_of_light_records(tmp_path, fake_client, default_fields):
+    recorder = ReplayClient(tmp_path.joinpath("replay"), record_client=fake_client)
+    for ID in fake_client.ids:
+        recorder.paper_data(ID)
+    s2 = ss.S2(ReplayClient(tmp_path.joinpath("replay")), tmp_path.joinpath("data"),
+               default_fields, top_k=2)
+    ID = fake_client.ids[10]
+    assert s2.get_papers_details([ID])[0].paperId == ID
+    assert not s2.is_cached(ID)
+    assert s2.ids.lookup_many(s2.top_neighbours(ID, "citations")) == fake_client.ids[9:7:-1]
+    assert s2.is_cached(ID)
+
+
+def test_top_neighbours_offer():
+    ranking = TopNeighbours(k=2)
+    ranking.set_scores([(1, 10), (2, 20), (3, 5)])
+    ranking.build(0, "citations", [1, 2, 3, 4])
+    assert ranking.top(0, "citations") == [(20, 2), (10, 1)]
+    assert not ranking.offer(0, "citations", 5, 1)
+    assert ranking.offer(0, "citations", 6, 15)
+    assert ranking.top(0, "citations") == [(20, 2), (15, 6)]
+    assert ranking.offer(0, "citations", 2, 3)
+    assert ranking.top(0, "citations") == [(15, 6), (3, 2)]
+    assert not ranking.offer(1, "citations", 6, 15)
@@ -0,0 +1,51 @@
+import time
+import threading
+
+from citemap.ratelimit import AdaptiveLimiter
+
+
+def test_limiter_backs_off_and_recovers():
+    limiter = AdaptiveLimiter(rate=400, max_rate=800, max_concurrency=8)
+    started = limiter.acquire()
+    limiter.release(started, throttled=True)
+    assert limiter.rate == 200
+    assert limiter.concurrency == 4
+    # A response to a request admitted before the backoff doesn't back off again
+    limiter.release(limiter.acquire() - 1, throttled=True)
+    assert limiter.rate == 200
+    for _ in range(50):
+        limiter.release(limiter.acquire())
+    assert limiter.rate > 200
+    assert limiter.concurrency == 8
+
+
+def test_limiter_paces_requests():
+    limiter = AdaptiveLimiter(rate=50, max_rate=50, max_concurrency=2, burst=1, increase=0)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.release(limiter.acquire())
+    assert time.monotonic() - start >= 0.09
+
+
+def test_limiter_bounds_concurrency():
+    limiter = AdaptiveLimiter(rate=1000, max_rate=1000, max_concurrency=2)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def request():
+        with limiter.slot():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.pop()
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) <= 2
+    assert limiter.stats()["succeeded"] == 8
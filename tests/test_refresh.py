@@ -0,0 +1,35 @@
+import time
+
+from citemap import ss
+from citemap.blobs import BlobStore
+
+
+def test_refresh_stale_papers(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    for ID in fake_client.ids[:6]:
+        s2.get_paper_data(ID)
+    s2.store.put_many([(fake_client.ids[1], s2.store.get(fake_client.ids[1]))], fetched_at=0)
+    s2.store.put_many([(fake_client.ids[2], s2.store.get(fake_client.ids[2]))],
+                      fetched_at=time.time() - 100)
+    assert s2.fetched_at(fake_client.ids[1]) == 0
+    fake_client.calls.clear()
+    refreshed = s2.refresh(max_age=50, paper_ids=[fake_client.ids[4]], num_workers=1)
+    assert refreshed.result(timeout=10) == 3
+    assert fake_client.calls == [fake_client.ids[4], fake_client.ids[1], fake_client.ids[2]]
+    assert s2.fetched_at(fake_client.ids[1]) > time.time() - 50
+    assert s2.store.stale(time.time() - 50) == []
+
+
+def test_refresh_updates_index_and_abstracts(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    s2.load_or_build_citation_cache()
+    size = BlobStore(tmp_path.joinpath("abstracts")).size
+    ID = fake_client.ids[10]
+    fake_client.fanout = 2
+    assert s2.refresh(paper_ids=fake_client.ids[8:12]).result(timeout=10) == 4
+    assert BlobStore(tmp_path.joinpath("abstracts")).size == size
+    assert s2.ids.lookup_many(s2.get_neighbours_page(ID, "references", 0, 5)) ==\
+        fake_client.ids[11:13]
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    assert s2.get_family_from_index(ID) is None
+    assert len(s2.get_family_from_index(fake_client.ids[5])[1]) == 5
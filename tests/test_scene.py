@@ -0,0 +1,126 @@
+import os
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import pytest
+from PyQt5.QtCore import QPointF
+from PyQt5.QtWidgets import QApplication, QGraphicsView
+
+from citemap import ss, CiteMap
+
+
+@pytest.fixture
+def scene(tmp_path, fake_client, default_fields):
+    app = QApplication.instance() or QApplication([])
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    scene = CiteMap(s2)
+    view = QGraphicsView(scene)
+    yield scene
+    del view, app
+
+
+def test_children_placed_in_free_slots(scene, fake_client):
+    s2, ids = scene.s2, fake_client.ids
+    root = scene.add_entry(s2.get_paper_data(ids[5]), QPointF(0, 0))
+    pos, _ = scene.try_place_entry_relative_to(root, "r")
+    other = scene.add_entry(s2.get_paper_data(ids[6]), pos)
+    for i in range(3):
+        scene.add_new_child(root, s2.get_paper_data(ids[7 + i]), direction="r")
+    assert len(scene.grid) == 5
+    rects = [x.shape_item.sceneBoundingRect() for x in scene.entries.values()]
+    assert not any(a.intersects(b) for i, a in enumerate(rects) for b in rects[i+1:])
+
+    other.shape_item.setPos(QPointF(-1000, 0))
+    assert scene.grid.rect(other.index) == other.shape_item.sceneBoundingRect().getRect()
+    scene.get_selected = lambda: [root.shape_item]
+    scene.go_in_direction("l", geometric=True)
+    assert other.shape_item.isSelected()
+
+
+def test_link_incidence(scene, fake_client):
+    s2, ids = scene.s2, fake_client.ids
+    root = scene.add_entry(s2.get_paper_data(ids[5]), QPointF(0, 0))
+    for i in range(3):
+        scene.add_new_child(root, s2.get_paper_data(ids[6 + i]), direction="r")
+    child = scene.entries[2]
+    assert len(scene.outgoing_links(root.index)) == 3
+    assert scene.incoming_links(child.index) == [scene.links[(root.index, child.index)]]
+    assert scene.incident_links(child.index) == scene.incoming_links(child.index)
+
+    scene.links_zvalue(child, 5)
+    assert scene.links[(root.index, child.index)].zValue() == 5
+    assert scene.links[(root.index, 3)].zValue() != 5
+
+    scene.add_link(root.index, child.index, "l")
+    assert len(scene.links) == 3
+    assert scene.links[(root.index, child.index)] in scene.outgoing_links(root.index)
+    child.check_hide(True)
+    scene.check_hide_links(child.index)
+    assert not scene.links[(root.index, child.index)].isVisible()
+
+    scene.remove_link(root.index, child.index)
+    assert (root.index, child.index) not in scene.links
+    assert len(scene.outgoing_links(root.index)) == 2
+    assert scene.incident_links(child.index) == []
+
+
+def _wait_for(app, condition, timeout=5):
+    start = time.time()
+    while not condition() and time.time() - start < timeout:
+        app.processEvents()
+        time.sleep(0.01)
+    return condition()
+
+
+def test_expansion_off_ui_thread(scene, fake_client):
+    app = QApplication.instance()
+    s2, ids = scene.s2, fake_client.ids
+    root = scene.add_entry(s2.get_paper_data(ids[10]), QPointF(0, 0))
+    fake_client.latency = 0.2
+    found = []
+    start = time.time()
+    scene.add_next_neighbours(root, "citations", 2, done=found.append)
+    assert time.time() - start < 0.1
+    assert not root.family["children"]
+    assert _wait_for(app, lambda: found)
+    assert found == [True] and len(root.family["children"]) == 2
+
+    scene.add_next_neighbours(root, "citations", 2, done=found.append)
+    scene.abort()
+    time.sleep(0.5)
+    app.processEvents()
+    assert found == [True] and len(root.family["children"]) == 2
+
+
+def test_aborted_expansion_is_shown_again(scene, fake_client):
+    app = QApplication.instance()
+    s2, ids = scene.s2, fake_client.ids
+    root = scene.add_entry(s2.get_paper_data(ids[10]), QPointF(0, 0))
+    expected = s2.ids.lookup_many(s2.citations_cursor(ids[10]).next_page(2))
+    fake_client.latency = 0.2
+    found = []
+    scene.add_next_neighbours(root, "citations", 2, done=found.append)
+    scene.abort()
+    time.sleep(0.5)
+    app.processEvents()
+    assert not found and not root.family["children"]
+
+    fake_client.latency = 0
+    scene.add_next_neighbours(root, "citations", 2, done=found.append)
+    assert _wait_for(app, lambda: found)
+    children = [scene.entries[x].paper_data.paperId for x in root.family["children"]]
+    assert children == expected
+
+
+def test_refresh_updates_entries(scene, fake_client, monkeypatch):
+    app = QApplication.instance()
+    s2, ids = scene.s2, fake_client.ids
+    root = scene.add_entry(s2.get_paper_data(ids[10]), QPointF(0, 0))
+    assert "Paper 10" in root.state.text
+    details = fake_client._details
+    monkeypatch.setattr(fake_client, "_details",
+                        lambda i: {**details(i), "title": f"Revised {i}"})
+    assert scene.refresh_entries().result(timeout=10) == 1
+    assert _wait_for(app, lambda: "Revised 10" in root.state.text)
+    assert root.paper_data.title == "Revised 10"
@@ -0,0 +1,39 @@
+import time
+import threading
+
+from citemap.scheduler import FetchScheduler, Priority, CancelToken
+
+
+def test_interactive_runs_before_queued_bulk():
+    scheduler = FetchScheduler(num_workers=2, limits={Priority.bulk: 1})
+    order = []
+    gate = threading.Event()
+
+    def job(name):
+        order.append(name)
+        gate.wait()
+
+    bulk = [scheduler.submit(job, f"bulk-{i}", priority=Priority.bulk) for i in range(5)]
+    interactive = scheduler.submit(job, "interactive")
+    time.sleep(0.05)
+    assert scheduler.queued(Priority.bulk) == 4
+    assert sorted(order) == ["bulk-0", "interactive"]
+    gate.set()
+    interactive.result(timeout=1)
+    for future in bulk:
+        future.result(timeout=1)
+    scheduler.shutdown()
+
+
+def test_cancel_token():
+    scheduler = FetchScheduler(num_workers=1)
+    gate = threading.Event()
+    blocker = scheduler.submit(gate.wait)
+    token = CancelToken()
+    futures = [scheduler.submit(time.sleep, 0, priority=Priority.prefetch, token=token)
+               for _ in range(3)]
+    assert scheduler.cancel(token) == 3
+    gate.set()
+    blocker.result(timeout=1)
+    assert all(x.cancelled() for x in futures)
+    scheduler.shutdown()
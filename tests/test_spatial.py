@@ -0,0 +1,42 @@
+from citemap.spatial import GridIndex
+
+
+def test_query_and_move():
+    index = GridIndex(cell_size=100)
+    index.insert(1, (0, 0, 150, 50))
+    index.insert(2, (300, 0, 50, 50))
+    assert index.query((100, 20, 10, 10)) == {1}
+    assert index.query((150, 0, 100, 50)) == set()
+    assert index.is_free((0, 0, 10, 10), exclude=[1])
+    index.insert(1, (290, 10, 20, 20))
+    assert index.query((0, 0, 150, 50)) == set()
+    assert index.query((305, 15, 1, 1)) == {1, 2}
+    index.remove(2)
+    assert 2 not in index and len(index) == 1
+
+
+def test_free_slot():
+    index = GridIndex(cell_size=100)
+    for i, y in enumerate([0, 60, -60]):
+        index.insert(i, (200, y, 100, 50))
+    slot, k = index.free_slot((200, 0, 100, 50), (0, 60))
+    assert (slot, k) == ((200, 120, 100, 50), 2)
+    index.insert(3, slot)
+    slot, k = index.free_slot((200, 0, 100, 50), (0, 60))
+    assert (slot, k) == ((200, -120, 100, 50), -2)
+
+
+def test_nearest_in_direction():
+    index = GridIndex(cell_size=100)
+    index.insert("self", (0, 0, 100, 50))
+    index.insert("left", (-300, 0, 100, 50))
+    index.insert("up-left", (-150, -200, 100, 50))
+    index.insert("far-left", (-2000, 10, 100, 50))
+    index.insert("right", (400, 300, 100, 50))
+    assert index.nearest(50, 25, "l", exclude=["self"]) == "left"
+    assert index.nearest(50, 25, "l", exclude=["self"],
+                         accept=lambda k: k != "left") == "up-left"
+    assert index.nearest(50, 25, "r", exclude=["self"]) == "right"
+    assert index.nearest(50, 25, "d", exclude=["self"]) == "right"
+    assert index.nearest(50, 25, "u", exclude=["self"]) == "up-left"
+    assert index.nearest(-1950, 35, "l", exclude=["far-left"]) is None
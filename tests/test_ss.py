@@ -1,4 +1,18 @@
+import gzip
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from citemap import ss
+from citemap.replay import ReplayClient
+from citemap.jsoncache import JsonCache
+from citemap.prefetch import Prefetcher
+from citemap.ratelimit import AdaptiveLimiter
+from citemap.cache import estimate_size
+from citemap.dataset import import_dataset
+
+from fixtures import FakeClient
 
 
 def test_get_paper_data(s2client, default_fields):
@@ -15,3 +29,430 @@ def test_get_paper_data_with_other_fields(s2client, default_fields):
     s2 = ss.S2(s2client, fields)
     ID = "5d9e7dbf28382eb3d8e1bbd2cae6a1c8d223ce4a"
     data = s2.get_paper_data(ID)
+
+
+def test_get_papers_data_concurrent(tmp_path, fake_client, default_fields):
+    client = fake_client
+    client.latency = 0.2
+    s2 = ss.S2(client, tmp_path, default_fields)
+    ids = client.ids[:5]
+    start = time.time()
+    data = s2.get_papers_data(ids)
+    assert time.time() - start < 0.6
+    assert [x.paperId for x in data] == ids
+    assert sorted(client.calls) == sorted(ids)
+
+
+def test_paper_store_persists_and_imports_json(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    ID = fake_client.ids[3]
+    s2.get_paper_data(ID)
+    assert ID in s2.store
+    fake_client.calls.clear()
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    assert s2.get_paper_data(ID).paperId == ID
+    assert not fake_client.calls
+
+    legacy_dir = tmp_path.joinpath("legacy")
+    legacy_dir.mkdir()
+    with open(legacy_dir.joinpath("cache"), "w") as f:
+        json.dump({ID: s2.store.get(ID)}, f)
+    s2 = ss.S2(fake_client, legacy_dir, default_fields)
+    s2.load_or_build_citation_cache()
+    assert len(s2.store) == 1
+    assert s2.ids.lookup_many(s2.get_paper_data(ID).references) == fake_client.ids[4:9]
+
+
+def test_build_citation_cache_resumes(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    done = fake_client.ids[:7]
+    for ID in done:
+        s2.get_paper_data(ID)
+    fake_client.calls.clear()
+    s2.load_or_build_citation_cache(num_workers=4, checkpoint_every=3)
+    assert sorted(fake_client.calls) == sorted(fake_client.ids[7:])
+    assert len(s2.store) == len(fake_client.ids)
+    fake_client.calls.clear()
+    s2.load_or_build_citation_cache()
+    assert not fake_client.calls
+
+
+def test_build_incomplete_with_transient_failures(tmp_path, fake_client, default_fields,
+                                                   monkeypatch):
+    paper_data = fake_client.paper_data
+    failing = {fake_client.ids[3]: 2, fake_client.ids[4]: 1}
+
+    def flaky_paper_data(ID, force=False):
+        if failing.get(ID):
+            failing[ID] -= 1
+            fake_client.calls.append(ID)
+            return ss.Error(message="Internal error", error="exception")
+        return paper_data(ID, force)
+
+    monkeypatch.setattr(fake_client, "paper_data", flaky_paper_data)
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    s2.load_or_build_citation_cache()
+    assert fake_client.calls.count(fake_client.ids[4]) == 2
+    assert len(s2.store) == len(fake_client.ids) - 1
+    assert not s2.store.get_meta("build_complete")
+    fake_client.calls.clear()
+    s2.load_or_build_citation_cache()
+    assert fake_client.calls == [fake_client.ids[3]]
+    assert len(s2.store) == len(fake_client.ids)
+    assert s2.store.get_meta("build_complete")
+
+
+def test_paper_ids_interned(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    ID = fake_client.ids[3]
+    data = s2.get_paper_data(ID)
+    key = s2.ids.get(ID)
+    assert s2.ids.lookup(key) == ID
+    assert all(isinstance(x, int) for x in data.references + data.citations)
+    assert s2.get_paper_data(key) is data
+    assert s2.store.get(ID)["references"] == fake_client.ids[4:9]
+
+
+def test_cache_eviction_keeps_pinned(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields, cache_max_entries=3)
+    pinned = fake_client.ids[0]
+    s2.pin(pinned)
+    for ID in fake_client.ids[:6]:
+        s2.get_paper_data(ID)
+    stats = s2.cache_stats
+    assert stats["entries"] == 3
+    assert stats["evictions"] == 3
+    fake_client.calls.clear()
+    details = s2.get_papers_details([pinned, fake_client.ids[1]])
+    assert [x.paperId for x in details] == [pinned, fake_client.ids[1]]
+    assert s2.cache_stats["hits"] == 1
+    assert not fake_client.calls
+
+
+def test_bounded_index(tmp_path, default_fields):
+    client = FakeClient(num_papers=300, fanout=20)
+    s2 = ss.S2(client, tmp_path, default_fields, cache_max_entries=4,
+               heavy_cache_max_entries=2, index_max_entries=60)
+    first = s2.get_paper_data(client.ids[0])
+    for ID in client.ids[100:200:10]:
+        s2.get_paper_data(ID)
+    stats = s2.cache_stats
+    assert stats["entries"] == 4 and stats["heavy_entries"] == 2
+    assert stats["interned_ids"] <= 60
+    assert stats["ranking_scores"] <= 60 and stats["ranking_heaps"] <= 60
+    assert s2.ids.lookup_many(first.references) == client.ids[1:21]
+    assert s2.ids.intern(client.ids[5]) == first.references[4]
+    top = s2.top_neighbours(client.ids[0], "references")
+    assert s2.ids.lookup_many(top) == client.ids[20:15:-1]
+
+
+def test_light_records(tmp_path, default_fields):
+    client = FakeClient(num_papers=300, fanout=100)
+    s2 = ss.S2(client, tmp_path, default_fields, heavy_cache_max_entries=2)
+    ID = client.ids[150]
+    full = s2.get_paper_data(ID)
+    light = s2.get_papers_details([ID])[0]
+    assert light.abstract is None
+    assert estimate_size(light) * 10 < estimate_size(full)
+    for x in client.ids[:3]:
+        s2.get_paper_data(x)
+    client.calls.clear()
+    assert s2.with_abstract(light).abstract == "Abstract 150"
+    assert light.abstract is None
+    assert not client.calls
+
+
+def test_negative_cache(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields, failure_ttl=0.1)
+    missing_id = "f" * 40
+    assert s2.get_paper_data(missing_id) is None
+    assert s2.get_failure(missing_id).kind == ss.FailureKind.not_found
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    fake_client.calls.clear()
+    assert s2.get_paper_data(missing_id) is None
+    assert not fake_client.calls
+
+    ID = fake_client.ids[2]
+    paper_data = fake_client.paper_data
+    fake_client.paper_data = lambda *args, **kwargs: 1 / 0
+    s2 = ss.S2(fake_client, tmp_path.joinpath("transient"), default_fields, failure_ttl=0.1)
+    assert s2.get_paper_data(ID) is None
+    assert s2.get_failure(ID).kind == ss.FailureKind.transient
+    fake_client.paper_data = paper_data
+    assert s2.get_paper_data(ID) is None
+    time.sleep(0.15)
+    assert s2.get_paper_data(ID).paperId == ID
+    assert s2.get_failure(ID) is None
+
+    fake_client.ids.append(missing_id)
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    assert s2.refresh(paper_ids=[missing_id]).result(timeout=10) == 1
+    assert s2.get_failure(missing_id) is None
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    assert s2.get_failure(missing_id) is None
+    assert s2.get_paper_data(missing_id).paperId == missing_id
+
+
+def test_single_flight(tmp_path, fake_client, default_fields):
+    fake_client.latency = 0.2
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    ID = fake_client.ids[5]
+    with ThreadPoolExecutor(4) as executor:
+        results = [*executor.map(s2.get_paper_data, [ID] * 4)]
+    assert all(x is results[0] for x in results)
+    assert fake_client.calls.count(ID) == 1
+    assert s2.duplicates_avoided == 3
+
+
+def test_replay_client(tmp_path, fake_client, default_fields):
+    recorder = ReplayClient(tmp_path.joinpath("replay"), record_client=fake_client)
+    for ID in fake_client.ids:
+        recorder.paper_data(ID)
+    client = ReplayClient(tmp_path.joinpath("replay"), latency=0.01, error_rate=0.5, seed=1)
+    assert client.all_papers == fake_client.ids
+    limiter = AdaptiveLimiter(rate=1000, max_rate=1000, min_rate=100)
+    s2 = ss.S2(client, tmp_path.joinpath("data"), default_fields, failure_ttl=0,
+               rate_limiter=limiter, fetch_retries=0)
+    data = s2.get_papers_data(fake_client.ids)
+    assert client.injected_errors
+    assert sum(x is None for x in data) == client.injected_errors
+    s2.load_or_build_citation_cache(num_workers=4)
+    client.error_rate = 0
+    s2.load_or_build_citation_cache(force=True)
+    assert len(s2.store) == len(fake_client.ids)
+    ID = fake_client.ids[4]
+    assert s2.ids.lookup_many(s2.get_paper_data(ID).references) ==\
+        [x["citedPaper"]["paperId"] for x in recorder.read(ID)["references"]["data"]]
+
+
+def test_json_cache_streaming(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path.joinpath("fetched"), default_fields)
+    s2.get_papers_data(fake_client.ids)
+    cache = dict(s2.store.items())
+    cache["e" * 40] = None
+    cache[fake_client.ids[0]]["title"] = 'A "quoted" {title} with \\ and [brackets]'
+    data_dir = tmp_path.joinpath("legacy")
+    data_dir.mkdir()
+    with open(data_dir.joinpath("cache"), "w") as f:
+        json.dump(cache, f, indent=2)
+    json_cache = JsonCache(data_dir.joinpath("cache"))
+    assert dict(json_cache.items()) == {k: v for k, v in cache.items() if v}
+
+    with open(data_dir.joinpath("cache"), "w", encoding="utf-8") as f:
+        json.dump({**cache, "d" * 40: {"title": "Ünïcode ✓"}}, f, ensure_ascii=False)
+    json_cache = JsonCache(data_dir.joinpath("cache"), chunk_size=64)
+    assert dict(json_cache.items())["d" * 40]["title"] == "Ünïcode ✓"
+    assert json_cache.get(fake_client.ids[0]) == cache[fake_client.ids[0]]
+    with open(data_dir.joinpath("cache"), "w") as f:
+        json.dump(cache, f, indent=2)
+
+    fake_client.calls.clear()
+    s2 = ss.S2(fake_client, data_dir, default_fields)
+    s2.load_or_build_citation_cache(background=True)
+    s2.wait_for_json_import()
+    assert len(s2.store) == len(fake_client.ids)
+    assert s2.get_paper_data(fake_client.ids[0]).title == cache[fake_client.ids[0]]["title"]
+    assert not fake_client.calls
+
+
+def _legacy_json_cache(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path.joinpath("fetched"), default_fields)
+    s2.get_papers_data(fake_client.ids)
+    cache = {k: {**v, "title": f"Legacy {k}"} for k, v in s2.store.items()}
+    data_dir = tmp_path.joinpath("legacy")
+    data_dir.mkdir()
+    with open(data_dir.joinpath("cache"), "w") as f:
+        json.dump(cache, f)
+    fake_client.calls.clear()
+    return data_dir
+
+
+def test_json_cache_read_before_scan(tmp_path, fake_client, default_fields, monkeypatch):
+    data_dir = _legacy_json_cache(tmp_path, fake_client, default_fields)
+    s2 = ss.S2(fake_client, data_dir, default_fields)
+    import_json = s2.store.import_json
+    scan, scanned = threading.Event(), threading.Event()
+
+    def blocked_import(json_cache):
+        scan.wait(5)
+        json_cache.scan()
+        scanned.set()
+        return import_json(json_cache)
+
+    monkeypatch.setattr(s2.store, "import_json", blocked_import)
+    s2.load_or_build_citation_cache(background=True)
+    # Records which haven't been scanned are fetched instead of waiting for the import
+    ID = fake_client.ids[0]
+    assert s2.get_paper_data(ID).title == "Paper 0"
+    assert fake_client.calls == [ID]
+    scan.set()
+    assert scanned.wait(5)
+    # Scanned records are read from the file before they're imported
+    assert s2.get_paper_data(fake_client.ids[1]).title == f"Legacy {fake_client.ids[1]}"
+    assert fake_client.calls == [ID]
+    s2.wait_for_json_import()
+    assert len(s2.store) == len(fake_client.ids)
+    assert s2.store.get(ID)["title"] == "Paper 0"
+
+
+def test_prefetch_budget(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    ID = fake_client.ids[10]
+    s2.get_paper_data(ID)
+    fake_client.calls.clear()
+    prefetcher = Prefetcher(s2, max_requests=20, per_hop=2, depth=2)
+    prefetcher.prefetch(ID).result()
+    # The 4 top ranked papers in the first hop and 6 new ones in the second
+    assert len(fake_client.calls) == prefetcher.fetched == 10
+    assert all(s2.is_cached(x) for x in fake_client.ids[8:10] + fake_client.ids[14:16])
+    assert not s2.is_cached(fake_client.ids[5])
+
+    s2 = ss.S2(fake_client, tmp_path.joinpath("budget"), default_fields)
+    s2.get_paper_data(ID)
+    fake_client.calls.clear()
+    Prefetcher(s2, max_requests=3, per_hop=2, depth=2).prefetch(ID).result()
+    assert len(fake_client.calls) == 3
+
+
+def test_throttled_fetches_are_retried(tmp_path, fake_client, default_fields):
+    recorder = ReplayClient(tmp_path.joinpath("replay"), record_client=fake_client)
+    for ID in fake_client.ids:
+        recorder.paper_data(ID)
+    client = ReplayClient(tmp_path.joinpath("replay"), error_rate=0.3, seed=1)
+    limiter = AdaptiveLimiter(rate=1000, max_rate=1000, max_concurrency=4)
+    s2 = ss.S2(client, tmp_path.joinpath("data"), default_fields, rate_limiter=limiter,
+               fetch_retries=10, retry_backoff=0)
+    s2.load_or_build_citation_cache()
+    assert client.injected_errors
+    assert limiter.throttled == client.injected_errors
+    assert len(s2.store) == len(fake_client.ids)
+
+
+def test_only_throttled_fetches_are_retried(tmp_path, fake_client, default_fields):
+    limiter = AdaptiveLimiter(rate=1000, max_rate=1000, max_concurrency=4)
+    s2 = ss.S2(fake_client, tmp_path, default_fields, rate_limiter=limiter,
+               fetch_retries=2, retry_backoff=0.05)
+    calls = []
+
+    def broken(ID):
+        calls.append(ID)
+        raise KeyError(ID)
+
+    fake_client.paper_data = broken
+    assert s2.get_paper_data(fake_client.ids[1]) is None
+    assert len(calls) == 1
+    assert limiter.throttled == 0 and limiter.concurrency == 4
+
+    dump = '{"citationCount": 503, "title": "Rate limit timeout"}'
+    fake_client.paper_data = lambda ID: calls.append(ID) or\
+        ss.Error(message="Could not parse data", error=dump)
+    assert s2.get_paper_data(fake_client.ids[2]) is None
+    assert len(calls) == 2 and limiter.throttled == 0
+
+    def timeout(ID):
+        calls.append(ID)
+        raise TimeoutError("timed out")
+
+    fake_client.paper_data = timeout
+    start = time.time()
+    assert s2.get_paper_data(fake_client.ids[3]) is None
+    assert len(calls) == 5
+    assert time.time() - start >= 0.15
+    assert limiter.throttled == 3
+
+
+def test_get_papers_details(tmp_path, fake_client, default_fields):
+    recorder = ReplayClient(tmp_path.joinpath("replay"), record_client=fake_client)
+    for ID in fake_client.ids:
+        recorder.paper_data(ID)
+    client = ReplayClient(tmp_path.joinpath("replay"))
+    s2 = ss.S2(client, tmp_path.joinpath("data"), default_fields)
+    full = s2.get_paper_data(fake_client.ids[0])
+    IDs = [*fake_client.ids[:12], "f" * 40]
+    requests = client.requests
+    details = s2.get_papers_details(IDs, batch_size=5)
+    assert client.requests - requests == 3
+    assert details[0] == s2.to_light_data(full)
+    assert isinstance(details[1], ss.PaperEntry)
+    assert [x.paperId for x in details[:-1]] == IDs[:-1]
+    assert details[-1] is None
+    assert s2.get_failure("f" * 40).kind == ss.FailureKind.not_found
+    assert sorted(s2.format_entry(details[1]).split("\n")) ==\
+        sorted(s2.format_entry(s2.get_paper_data(IDs[1])).split("\n"))
+    requests = client.requests
+    s2.get_papers_details(IDs, batch_size=5)
+    assert s2.get_abstract(IDs[2]) == "Abstract 2"
+    assert client.requests == requests
+    assert not s2.is_cached(IDs[2])
+
+
+def test_throttled_batches_are_retried(tmp_path, fake_client, default_fields):
+    recorder = ReplayClient(tmp_path.joinpath("replay"), record_client=fake_client)
+    for ID in fake_client.ids:
+        recorder.paper_data(ID)
+    client = ReplayClient(tmp_path.joinpath("replay"), error_rate=1.0)
+    limiter = AdaptiveLimiter(rate=100, max_concurrency=4)
+    s2 = ss.S2(client, tmp_path.joinpath("data"), default_fields, rate_limiter=limiter,
+               fetch_retries=2, retry_backoff=0)
+    assert s2.get_papers_details(fake_client.ids[:3]) == [None] * 3
+    assert client.requests == 3 and limiter.throttled == 3
+    client.error_rate = 0.0
+    assert [x.paperId for x in s2.get_papers_details(fake_client.ids[:3])] ==\
+        fake_client.ids[:3]
+
+
+def test_import_dataset(tmp_path, fake_client, default_fields):
+    shards = tmp_path.joinpath("shards")
+    shards.mkdir()
+    n = len(fake_client.ids)
+    papers = []
+    edges = []
+    for i, ID in enumerate(fake_client.ids):
+        details = fake_client._details(i)
+        papers.append({"corpusid": 1000 + i, "url": f"https://www.semanticscholar.org/p/{ID}",
+                       "title": details["title"], "authors": details["authors"],
+                       "venue": details["venue"], "year": details["year"],
+                       "citationcount": i, "influentialcitationcount": 0})
+        edges.extend({"citingcorpusid": 1000 + i, "citedcorpusid": 1000 + j}
+                     for j in range(i + 1, min(n, i + 1 + fake_client.fanout)))
+    for name, rows in [("papers", papers), ("citations", edges)]:
+        for part in range(2):
+            with gzip.open(shards.joinpath(f"{name}-{part}.jsonl.gz"), "wt") as f:
+                f.writelines(json.dumps(x) + "\n" for x in rows[part::2])
+    with gzip.open(shards.joinpath("abstracts-0.jsonl.gz"), "wt") as f:
+        f.write(json.dumps({"corpusid": 1010, "abstract": "Abstract 10"}) + "\n")
+    data_dir = tmp_path.joinpath("data")
+    num_papers = import_dataset(data_dir, [fake_client.ids[10]],
+                                sorted(shards.glob("papers-*")),
+                                sorted(shards.glob("citations-*")),
+                                [shards.joinpath("abstracts-0.jsonl.gz")],
+                                hops=1, num_workers=2)
+    assert num_papers == 11
+    s2 = ss.S2(fake_client, data_dir, default_fields)
+    assert sorted(s2.store.keys()) == fake_client.ids[5:16]
+    data = s2.get_paper_data(fake_client.ids[10])
+    assert sorted(s2.ids.lookup_many(data.references)) == fake_client.ids[11:16]
+    assert sorted(s2.ids.lookup_many(data.citations)) == fake_client.ids[5:10]
+    assert s2.get_abstract(fake_client.ids[10]) == "Abstract 10"
+    assert not fake_client.calls
+
+
+def test_metrics(tmp_path, fake_client, default_fields):
+    s2 = ss.S2(fake_client, tmp_path, default_fields)
+    for ID in fake_client.ids[:3]:
+        s2.get_paper_data(ID)
+    s2.get_paper_data(fake_client.ids[0])
+    s2.get_paper_data("f" * 40)
+    snapshot = s2.metrics.snapshot()
+    counters = snapshot["counters"]
+    assert counters["hits"] == 1
+    assert counters["misses"] == 4
+    assert counters["requests"] == 4
+    assert counters["errors"] == 1
+    assert counters["bytes_fetched"] > 0
+    latency = snapshot["latency"]
+    assert latency["network_fetch"]["count"] == 4
+    assert latency["parse"]["count"] == latency["to_cached_data"]["count"] == 3
+    assert latency["cache_hit"]["count"] == 1
+    json.dumps(snapshot)
+    assert "hits 1" in s2.metrics.format()
@@ -0,0 +1,47 @@
+import json
+
+from citemap import ss
+from citemap.replay import ReplayClient
+from citemap.ratelimit import AdaptiveLimiter
+from citemap.synthetic import SyntheticCorpus, generate_corpus
+from citemap.benchmark import run_benchmarks
+
+
+def test_synthetic_corpus(tmp_path, default_fields):
+    corpus = generate_corpus(tmp_path.joinpath("corpus"), 300, seed=1)
+    again = SyntheticCorpus(300, seed=1)
+    assert again.paper_data(42) == corpus.paper_data(42)
+    assert SyntheticCorpus(300, seed=2).paper_id(42) != corpus.paper_id(42)
+    counts = sorted((corpus.details(i)["citationCount"] for i in range(300)), reverse=True)
+    assert sum(counts) == corpus.num_citations
+    assert counts[0] > 5 * corpus.num_citations / 300
+    for i in range(300):
+        assert all(j < i for j in corpus.references(i))
+        assert all(j > i for j in corpus.citations(i))
+
+    client = ReplayClient(tmp_path.joinpath("corpus", "replay"))
+    assert client.all_papers == [*corpus.paper_ids]
+    s2 = ss.S2(client, tmp_path.joinpath("s2"), default_fields, fetch_retries=0,
+               rate_limiter=AdaptiveLimiter(rate=1000, min_rate=100))
+    ID = corpus.paper_id(10)
+    data = s2.get_paper_data(ID)
+    assert data.title == corpus.details(10)["title"]
+    assert s2.ids.lookup_many(data.citations) == [corpus.paper_id(j)
+                                                      for j in corpus.citations(10)]
+
+    s2 = ss.S2(client, tmp_path.joinpath("corpus"), default_fields)
+    s2.load_or_build_citation_cache()
+    assert len(s2.store) == 300
+    assert s2.get_paper_data(ID).title == data.title
+
+
+def test_benchmarks(tmp_path):
+    report = run_benchmarks(tmp_path, [100], ["get_paper_data", "format_entry"],
+                            num_ops=10, isolate=False)
+    assert [x["benchmark"] for x in report["results"]] == \
+        ["get_paper_data:cold", "get_paper_data:warm", "format_entry"]
+    for result in report["results"]:
+        assert result["ops"] == 10
+        assert result["p50"] <= result["p99"]
+        assert result["peak_rss_mb"] > 0
+    json.dumps(report)